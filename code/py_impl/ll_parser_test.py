@@ -32,7 +32,7 @@ def main():
             la.TokenDefinition('int', reg_int),
             la.TokenDefinition('+', reg_add),
             la.TokenDefinition('*', reg_mul),
-            la.TokenDefinition('white', reg_whites),
+            la.TokenDefinition('white', reg_whites, channel=la.CHANNEL_SKIP),
             la.TokenDefinition('(', reg_left_para),
             la.TokenDefinition(')', reg_right_para),
             la.TokenDefinition('$', reg_eof),
@@ -42,7 +42,6 @@ def main():
     )
 
     program_token_list = lexical_analyzer.parse(program_str)
-    program_token_list = [t for t in program_token_list if t.token_type != 'white']
 
     print('Tokens:')
     for i in program_token_list:
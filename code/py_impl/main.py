@@ -39,7 +39,7 @@ analyzer = la.LexicalAnalyzer(
     token_definitions=[
         la.TokenDefinition(token_type="binary", regular_expr=binary_expr),
         la.TokenDefinition(token_type="add", regular_expr=add_expr),
-        la.TokenDefinition(token_type="white", regular_expr=whitespaces_expr),
+        la.TokenDefinition(token_type="white", regular_expr=whitespaces_expr, channel=la.CHANNEL_SKIP),
     ]
 )
 
@@ -50,6 +50,4 @@ b1001110 + b1001+b1111111 + b00000000
 )
 
 for p in pairs:
-    if p.token_type == "white":
-        continue
     print(p)
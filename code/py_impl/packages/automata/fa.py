@@ -432,6 +432,16 @@ class FA[LabelType, CharType]:
         # update state and return True
         return frozenset(new_states)
 
+    def peek_next(
+        self, prev_states: frozenset[FANode[LabelType, CharType]], next_input: CharType
+    ) -> frozenset[FANode[LabelType, CharType]] | None:
+        """
+        Return the states this FA would move to from ``prev_states`` with given input, ``None`` if stuck.
+
+        Unlike ``move_next()``, the current state of this FA is not changed.
+        """
+        return self._move_next(prev_states=prev_states, next_input=next_input)
+
     def move_next_str(self, input_sequence: list[CharType]) -> bool:
         """
         Input a consecutive string into FA
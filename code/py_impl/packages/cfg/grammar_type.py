@@ -12,7 +12,7 @@ from rich.pretty import pretty_repr
 
 from loguru import logger
 
-from .type import Piece, NonTerminal, Terminal, Derivation
+from .type import Piece, NonTerminal, Terminal, Derivation, Production, CFGSystem
 
 
 class ChomskyGrammarError(Exception):
@@ -74,6 +74,14 @@ class EpsilonStartSymbolAtRHS(ChomskyGrammarError):
         super().__init__(name, message)
 
 
+class NotContextFree(ChomskyGrammarError):
+    def __init__(self, production: "ChomskyProduction | None" = None):
+        message = "This operation requires a context-free grammar, every left-hand side must be a single non-terminal"
+        if production is not None:
+            message += f" (Production: {production})"
+        super().__init__(name="not_context_free", message=message)
+
+
 class ChomskyProduction:
     """
     This class is used to represent a general chomsky grammar, and
@@ -236,7 +244,25 @@ class ChomskyGrammarSystem:
         # check epsilon rules
         self.check_is_epsilon_rules_valid()
 
+    def is_context_free(self) -> bool:
+        """
+        Return True if every left-hand side of this grammar is a single non-terminal.
+        """
+        for p in self.productions:
+            if p.lhs_len != 1 or not isinstance(p.source[0], NonTerminal):
+                return False
+        return True
+
     def check_is_epsilon_rules_valid(self):
+        """
+        Check the epsilon rules of this grammar.
+
+        For a context-free grammar, all epsilon rules are valid since they could be removed by
+        `eliminate_epsilon_rules()`. Otherwise only S->e is allowed, and S must not appear at any right-hand side.
+        """
+        if self.is_context_free():
+            return
+
         has_epsilon_s_rule: bool = False
         entry_in_rhs: bool = False
 
@@ -256,28 +282,58 @@ class ChomskyGrammarSystem:
         if has_epsilon_s_rule == True and entry_in_rhs:
             raise EpsilonStartSymbolAtRHS()
 
-    def eliminate_epsilon_rules(self):
+    def to_cfg_system(self) -> CFGSystem:
+        """
+        Convert this grammar to `CFGSystem`.
+
+        Raise `NotContextFree` if this grammar is not context-free.
         """
-        Eliminate the epsilon rules by modifying productions of
-        this grammar.
+        production_list: list[Production] = []
+        for p in self.productions:
+            if p.lhs_len != 1 or not isinstance(p.source[0], NonTerminal):
+                raise NotContextFree(production=p)
+            pieces = list(p.target) if not p.is_rhs_epsilon() else None
+            production_list.append(Production(source=p.source[0], target=Derivation(pieces=pieces)))
 
-        Deprecated.
+        return CFGSystem(production_list, entry=self.entry)
+
+    @classmethod
+    def from_cfg_system(cls, cfg_system: CFGSystem) -> "ChomskyGrammarSystem":
+        """
+        Create a grammar from `CFGSystem`.
         """
+        productions = [
+            ChomskyProduction([prod.source], prod.target.pieces or [])
+            for prod in cfg_system.production_list
+        ]
+        return cls(
+            entry=cfg_system.entry,
+            productions=productions,
+            pieces=list(cfg_system.used_pieces),
+        )
 
-        def replace_epsilon_nonterminal_in_rhs(nt: NonTerminal):
-            nonlocal self
-            for p in self.productions:
-                pass
+    def eliminate_epsilon_rules(self) -> "ChomskyGrammarSystem":
+        """
+        Return an equivalent grammar without epsilon rules, except S->e when the
+        entry is nullable (a new entry is introduced if S appears at some right-hand side).
 
-        mutated: bool = True
-        while mutated:
-            mutated = False
+        Only context-free grammar is supported, raise `NotContextFree` otherwise.
+        Use `CFGSystem.eliminate_epsilon()` if parse trees need to be restored.
+        """
+        return ChomskyGrammarSystem.from_cfg_system(
+            self.to_cfg_system().eliminate_epsilon().cfg
+        )
 
-            curr_epsilon_rule: ChomskyProduction | None = None
-            for p in self.productions:
-                if len(p.target) == 0:
-                    curr_epsilon_rule = p
-                    break
+    def eliminate_unit_productions(self) -> "ChomskyGrammarSystem":
+        """
+        Return an equivalent grammar without unit productions (A->B).
+
+        Only context-free grammar is supported, raise `NotContextFree` otherwise.
+        Use `CFGSystem.eliminate_unit_productions()` if parse trees need to be restored.
+        """
+        return ChomskyGrammarSystem.from_cfg_system(
+            self.to_cfg_system().eliminate_unit_productions().cfg
+        )
 
     def __repr__(self) -> str:
         prod_str = (
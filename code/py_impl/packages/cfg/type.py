@@ -1,5 +1,7 @@
+import hashlib
+import json
 from dataclasses import dataclass
-from loguru import logger
+from typing import Callable, Iterable, Iterator
 
 __all__ = [
     "Piece",
@@ -8,18 +10,39 @@ __all__ = [
     "CFGSystem",
     "Production",
     "Derivation",
+    "EPSILON_BIT",
+    "SymbolTable",
+    "OriginInput",
+    "OriginChild",
+    "OriginProduction",
+    "OriginTemplate",
+    "GrammarTransform",
 ]
 
+EPSILON_BIT: int = 1
+"""
+Terminal sets are stored as int bitmasks, the terminal with index i in ``CFGSystem.terminal_list`` uses bit i.
+Bit 0 is reserved for epsilon (``None``). When used as LR lookahead, it also represents the end of input.
+"""
+
 
 class Piece:
+    __slots__ = ("name", "id", "_hash")
+
     def __init__(self, name: str):
         self.name: str = name
+        # id in the SymbolTable of a CFG, -1 means this piece is not interned
+        self.id: int = -1
+        self._hash: int = hash(name)
 
     # here we actually promise terminal and non-terminal will NEVER has same name
     def __hash__(self):
-        return hash(self.name)
+        return self._hash
 
     def __eq__(self, other):
+        # interned pieces are compared by identity in most cases
+        if self is other:
+            return True
         if other is None:
             return False
 
@@ -30,11 +53,11 @@ class Piece:
 
 
 class Terminal(Piece):
-    pass
+    __slots__ = ()
 
 
 class NonTerminal(Piece):
-    pass
+    __slots__ = ()
 
 
 @dataclass
@@ -68,45 +91,290 @@ class Production:
         return repr_str
 
 
+@dataclass(frozen=True)
+class OriginInput:
+    """
+    Origin template that refers to the ``index``-th input of the node being restored.
+    """
+    index: int
+
+
+@dataclass(frozen=True)
+class OriginChild:
+    """
+    Origin template that restores the ``child``-th child of the node, passing ``args`` as its inputs.
+
+    Children of a helper non-terminal take inputs, children of an original piece take none.
+    """
+    child: int
+    args: tuple["OriginTemplate", ...] = ()
+
+
+@dataclass(frozen=True)
+class OriginProduction:
+    """
+    Origin template that builds a node of an original ``production``, ``args`` give its children in order.
+    """
+    production: Production
+    args: tuple["OriginTemplate", ...] = ()
+
+
+type OriginTemplate = OriginInput | OriginChild | OriginProduction
+"""
+Describe how a node of a transformed production is restored into nodes of the original productions.
+
+Helper non-terminals introduced by a transformation take the already restored nodes on their left as inputs, and return
+the node of the original production they finally complete.
+"""
+
+
+def _map_origin_template(
+        template: OriginTemplate,
+        child_fn: Callable[[int, tuple[OriginTemplate, ...]], OriginTemplate],
+        input_fn: Callable[[int], OriginTemplate] = OriginInput,
+) -> OriginTemplate:
+    """
+    Rebuild a template, replacing every OriginChild by ``child_fn(child, mapped_args)`` and every OriginInput by
+    ``input_fn(index)``.
+    """
+    if isinstance(template, OriginInput):
+        return input_fn(template.index)
+    mapped_args = tuple(_map_origin_template(arg, child_fn, input_fn) for arg in template.args)
+    if isinstance(template, OriginChild):
+        return child_fn(template.child, mapped_args)
+    return OriginProduction(template.production, mapped_args)
+
+
+class GrammarTransform:
+    """
+    A transformed CFG, together with the provenance of each of its productions.
+
+    ``origin_templates[i]`` tells how a node of ``cfg.production_list[i]`` is restored into nodes of the original
+    productions. Checkout ``ParseTree.restore_origin()``.
+    """
+
+    cfg: "CFGSystem"
+    origin_templates: list[OriginTemplate]
+
+    # the transform that made the CFG this transform starts from, None if it starts from the original CFG.
+    previous: "GrammarTransform | None"
+
+    # id of production in cfg.production_list -> index
+    _production_index: dict[int, int]
+
+    def __init__(
+            self,
+            cfg: "CFGSystem",
+            origin_templates: list[OriginTemplate],
+            previous: "GrammarTransform | None" = None,
+    ):
+        assert len(cfg.production_list) == len(origin_templates)
+        self.cfg = cfg
+        self.origin_templates = origin_templates
+        self.previous = previous
+        self._production_index = {id(prod): index for index, prod in enumerate(cfg.production_list)}
+
+    def then(self, transform: "GrammarTransform") -> "GrammarTransform":
+        """
+        Chain a transform made on ``self.cfg`` after this one.
+
+        The returned transform leads from the CFG this transform starts from to ``transform.cfg``, restoring a parse
+        tree with it goes through both transforms.
+        """
+        previous = self if transform.previous is None else self.then(transform.previous)
+        return GrammarTransform(transform.cfg, transform.origin_templates, previous)
+
+    def get_origin_template(self, production: Production) -> OriginTemplate:
+        """
+        Return the origin template of a production in the transformed CFG.
+
+        Raise ValueError if the production is not in the transformed CFG.
+        """
+        index = self._production_index.get(id(production))
+        if index is None:
+            index = self.cfg.production_list.index(production)
+        return self.origin_templates[index]
+
+
+class SymbolTable:
+    """
+    Intern table of the pieces used by a CFG.
+
+    Each name maps to exactly one piece instance, which carries an integer ``id``:
+
+    - Terminals are numbered ``1..T`` in name order, same as their index in ``CFGSystem.terminal_list``. Id 0 is
+      reserved for epsilon, which also represents the end of input in LR lookahead.
+    - NonTerminals are numbered ``0..N-1`` in name order, in their own id space.
+
+    Token types from the lexical analyzer are the names of terminals, so ``get_terminal(token_type)`` maps a token to
+    its interned terminal without allocating.
+    """
+
+    terminals: list[Terminal | None]
+    non_terminals: list[NonTerminal]
+
+    # name -> interned piece
+    _pieces: dict[str, Piece]
+
+    def __init__(self, pieces: Iterable[Piece]):
+        self.terminals = [None]
+        self.non_terminals = []
+        self._pieces = {}
+
+        # sort by name to make the numbering stable
+        for piece in sorted(set(pieces), key=lambda p: p.name):
+            interned = type(piece)(piece.name)
+            if isinstance(piece, Terminal):
+                interned.id = len(self.terminals)
+                self.terminals.append(interned)
+            else:
+                interned.id = len(self.non_terminals)
+                self.non_terminals.append(interned)
+            self._pieces[piece.name] = interned
+
+    def __len__(self) -> int:
+        return len(self._pieces)
+
+    def __contains__(self, piece: Piece) -> bool:
+        return piece.name in self._pieces
+
+    def intern(self, piece: Piece | None) -> Piece | None:
+        """
+        Return the interned instance of a piece. ``None`` is returned as is.
+
+        Raise KeyError if the piece is not in this table.
+        """
+        if piece is None:
+            return None
+        return self._pieces[piece.name]
+
+    def get_terminal(self, token_type: str) -> Terminal | None:
+        """
+        Return the interned terminal of a token type, ``None`` if no such terminal in this table.
+        """
+        piece = self._pieces.get(token_type)
+        if not isinstance(piece, Terminal):
+            return None
+        return piece
+
+    def get_terminal_id(self, token_type: str) -> int:
+        """
+        Return id of the terminal of a token type, -1 if no such terminal in this table.
+        """
+        piece = self._pieces.get(token_type)
+        if not isinstance(piece, Terminal):
+            return -1
+        return piece.id
+
+
+class _LazyAnalysis:
+    """
+    Descriptor of an analysis result of CFGSystem.
+
+    The value is generated by calling the generator method of the instance on first access, and cached until
+    ``CFGSystem.invalidate_analysis()`` is called.
+    """
+
+    def __init__(self, generator_name: str):
+        self.generator_name = generator_name
+        self.attr_name = ""
+
+    def __set_name__(self, owner, name: str):
+        self.attr_name = "_" + name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = instance.__dict__.get(self.attr_name)
+        if value is None:
+            getattr(instance, self.generator_name)()
+            value = instance.__dict__[self.attr_name]
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.attr_name] = value
+
+
 class CFGSystem:
+    """
+    Context-Free Grammar system.
+
+    Construction only interns the pieces of productions, which is O(size of grammar). The analyses (production dict,
+    nullable, FIRST and FOLLOW sets) are generated on first access and cached. Assigning ``production_list`` or
+    calling ``add_production()`` invalidates the cached analyses.
+    """
+
+    production_dict: dict[NonTerminal, set[Production]] = _LazyAnalysis("generate_production_dict")
+    """generated production dict, key is source, value is set of Derivation"""
+    occurrences: dict[Piece, list[tuple[Production, int]]] = _LazyAnalysis("generate_production_dict")
+    """
+    index from each piece to where it appears in the right-hand side of productions,
+    value is list of (production, position)
+    """
+
+    nullable_set: set[NonTerminal] = _LazyAnalysis("generate_nullable_set")
+    """non-terminals that could be derived into epsilon"""
+    first_masks: dict[Piece, int] = _LazyAnalysis("generate_first_set")
+    """
+    store first set of each piece, as bitmask. Checkout EPSILON_BIT
+    """
+    first_sets: dict[Piece, set[Terminal | None]] = _LazyAnalysis("generate_first_set")
+    """
+    store first set of each piece, decoded from first_masks
+    """
+    suffix_first_masks: dict[int, list[int]] = _LazyAnalysis("generate_suffix_first_masks")
+    """
+    FIRST set of every suffix of every production as bitmask, key is id of the production in production_list.
+    Value[i] is the FIRST mask of ``target.pieces[i:]``, the last value is EPSILON_BIT (empty suffix).
+    Checkout get_suffix_first_mask()
+    """
+    follow_masks: dict[Piece, int] = _LazyAnalysis("generate_follow_set")
+    """
+    store follow set of each piece, as bitmask
+    """
+    follow_sets: dict[Piece, set[Terminal]] = _LazyAnalysis("generate_follow_set")
+    """
+    store follow set, decoded from follow_masks
+    """
+
     def __init__(
         self, production_list: list[Production], entry: Piece | None = None
     ) -> None:
-        self.production_list = production_list
-        """list to store all productions in this CFG system."""
-
-        self.used_pieces: set[Piece] = set()
-
         self.entry = entry
         """
         indicate the parsing entry of this CFG.
         Could be NonTerminal or Terminal, usually to be NonTerminal
         """
-        self.production_dict: dict[NonTerminal, set[Production]] = {}
-        """generated production dict, key is source, value is set of Derivation"""
+        self.symbols: SymbolTable
+        """intern table of pieces in this CFG, all pieces in productions and entry are the interned instances"""
         self.used_pieces: set[Piece] = set()
         """The pieces used in this CFG"""
 
-        self.first_sets: dict[Piece, set[Terminal | None]] = {}
-        """
-        store first set of each piece
-        """
-        self.follow_sets: dict[Piece, set[Terminal]] = {}
-        """
-        store follow set
+        self.terminal_list: list[Terminal | None] = [None]
+        """all terminals of this CFG, index 0 is None (epsilon), index of each terminal is its bit in masks"""
+        self.terminal_index: dict[Terminal, int] = {}
+        """index of each terminal in terminal_list"""
+
+        self._production_list: list[Production] = []
+        self.production_list = production_list
+
+    @property
+    def production_list(self) -> list[Production]:
         """
+        list to store all productions in this CFG system.
 
-        self._recur_runtime_set: set[Piece] = set()
-        """a tmp set used to record the parameter stack of recursive runtime"""
-        self._recur_piece_detected_in_calc_follow: Piece | None = None
-        """store the piece that led to recursive circular if exists"""
-        self._is_recur_when_calc_follow: bool = True
-        """Temp value used internally"""
+        Do not modify this list in place, assign a new list or use ``add_production()`` instead, so that the cached
+        analyses are invalidated.
+        """
+        return self._production_list
 
-        # init used_pieces
-        for prod in self.production_list:
+    @production_list.setter
+    def production_list(self, production_list: list[Production]) -> None:
+        # collect pieces used by the productions
+        input_pieces: set[Piece] = set()
+        for prod in production_list:
             # add source
-            self.used_pieces.add(prod.source)
+            input_pieces.add(prod.source)
 
             # add target
             if prod.target.pieces is None:  # skip epsilon pieces
@@ -115,18 +383,51 @@ class CFGSystem:
                 # None should not be included in used_pieces
                 if t is None:
                     continue
-                self.used_pieces.add(t)
+                input_pieces.add(t)
 
         # check if entry is in the used pieces
-        if (self.entry is not None) and (self.entry not in self.used_pieces):
+        if (self.entry is not None) and (self.entry not in input_pieces):
             raise RuntimeError(
                 "Defined CFG entry must in the used pieces of this CFG. "
                 f"Current entry {self.entry} not in set of used pieces."
             )
 
-        self.generate_production_dict()
-        self.generate_first_set()
-        self.generate_follow_set()
+        # intern all pieces, productions are rebuilt on the interned instances
+        self.symbols = SymbolTable(input_pieces)
+        self._production_list = [self._intern_production(prod) for prod in production_list]
+        self.entry = self.symbols.intern(self.entry)
+        self.used_pieces = set(self.symbols.terminals[1:]) | set(self.symbols.non_terminals)
+
+        # terminal index is the same as terminal id
+        self.terminal_list = self.symbols.terminals
+        self.terminal_index = {t: t.id for t in self.terminal_list[1:]}
+
+        self.invalidate_analysis()
+
+    def add_production(self, production: Production) -> None:
+        """
+        Add a production to this CFG, the cached analyses are invalidated.
+
+        Notice: symbol ids are re-numbered, pieces got from this CFG before should be interned again.
+        """
+        self.production_list = self._production_list + [production]
+
+    def invalidate_analysis(self) -> None:
+        """
+        Drop all cached analyses, they will be generated again on next access.
+        """
+        for attr in vars(CFGSystem).values():
+            if isinstance(attr, _LazyAnalysis):
+                self.__dict__.pop(attr.attr_name, None)
+
+    def _intern_production(self, prod: Production) -> Production:
+        """
+        Return a copy of the production built on interned pieces.
+        """
+        pieces = prod.target.pieces
+        if pieces is not None:
+            pieces = [self.symbols.intern(piece) for piece in pieces]
+        return Production(source=self.symbols.intern(prod.source), target=Derivation(pieces=pieces))
 
     def get_grammar_type(self):
         """
@@ -137,6 +438,7 @@ class CFGSystem:
     def generate_production_dict(self):
         # init dict
         self.production_dict = {}
+        self.occurrences = {}
 
         for prod in self.production_list:
             source = prod.source
@@ -148,6 +450,12 @@ class CFGSystem:
             # add new derivation to set
             self.production_dict[source].add(prod)
 
+            # index where each piece occurs
+            if prod.target.pieces is None:
+                continue
+            for pos, piece in enumerate(prod.target.pieces):
+                self.occurrences.setdefault(piece, []).append((prod, pos))
+
     def get_all_derivation(self, source: NonTerminal) -> set[Derivation]:
         """
         Return a set of all derivations of the received `source`.
@@ -161,17 +469,171 @@ class CFGSystem:
 
         return derivations
 
+    def generate_nullable_set(self) -> None:
+        """
+        Find all non-terminals that could be derived into epsilon.
+
+        Each production keeps a count of its right-hand side pieces that are not known to be nullable yet. Once a
+        non-terminal is found nullable, only the productions it occurs in are visited. O(size of grammar).
+        """
+        self.nullable_set = set()
+
+        # count of pieces not known to be nullable, for each production
+        remaining_count: dict[int, int] = {}
+        worklist: list[NonTerminal] = []
+
+        for prod in self.production_list:
+            count = 0 if prod.target.pieces is None else len(prod.target.pieces)
+            remaining_count[id(prod)] = count
+            if count == 0 and prod.source not in self.nullable_set:
+                self.nullable_set.add(prod.source)
+                worklist.append(prod.source)
+
+        while len(worklist) > 0:
+            piece = worklist.pop()
+            for prod, pos in self.occurrences.get(piece, []):
+                remaining_count[id(prod)] -= 1
+                if remaining_count[id(prod)] == 0 and prod.source not in self.nullable_set:
+                    self.nullable_set.add(prod.source)
+                    worklist.append(prod.source)
+
+    def terminal_bit(self, terminal: Terminal | None) -> int:
+        """
+        Return the bit of a terminal in masks. ``None`` returns EPSILON_BIT, terminal not in this CFG returns 0.
+        """
+        if terminal is None:
+            return EPSILON_BIT
+        # interned terminal carries its index directly
+        if terminal.id > 0 and self.terminal_list[terminal.id] is terminal:
+            return 1 << terminal.id
+        index = self.terminal_index.get(terminal)
+        if index is None:
+            return 0
+        return 1 << index
+
+    def mask_to_set(self, mask: int) -> set[Terminal | None]:
+        """
+        Convert a terminal bitmask into a set of terminals. EPSILON_BIT is converted to ``None``.
+        """
+        res_set: set[Terminal | None] = set()
+        index = 0
+        while mask:
+            if mask & 1:
+                res_set.add(self.terminal_list[index])
+            mask >>= 1
+            index += 1
+        return res_set
+
     def generate_first_set(self) -> None:
-        # enable recursive tracking (circular recursive)
+        """
+        Calculate FIRST set of all used pieces with a worklist fixpoint algorithm.
+
+        FIRST(X) flows into FIRST(A) for every production A -> ...X... where all pieces before X are nullable. Those
+        edges are found through the occurrence index, then only the pieces whose FIRST set changed are propagated.
+        """
+        self.first_masks = {}
+
+        # direct FIRST contributions
+        for piece in self.used_pieces:
+            if isinstance(piece, Terminal):
+                self.first_masks[piece] = self.terminal_bit(piece)
+            else:
+                self.first_masks[piece] = 0
+
+        # length of the longest nullable prefix of each production
+        nullable_prefix_len: dict[int, int] = {}
+        for prod in self.production_list:
+            prefix_len = 0
+            if prod.target.pieces is not None:
+                for piece in prod.target.pieces:
+                    if piece not in self.nullable_set:
+                        break
+                    prefix_len += 1
+            nullable_prefix_len[id(prod)] = prefix_len
+
+        worklist: list[Piece] = [p for p in self.used_pieces if isinstance(p, Terminal)]
+        in_worklist: set[Piece] = set(worklist)
+
+        while len(worklist) > 0:
+            piece = worklist.pop()
+            in_worklist.discard(piece)
+            piece_first_mask = self.first_masks[piece]
+
+            for prod, pos in self.occurrences.get(piece, []):
+                # only flows into source if all pieces before it are nullable
+                if pos > nullable_prefix_len[id(prod)]:
+                    continue
+
+                source_first_mask = self.first_masks[prod.source]
+                new_mask = source_first_mask | piece_first_mask
+                if new_mask != source_first_mask:
+                    self.first_masks[prod.source] = new_mask
+                    if prod.source not in in_worklist:
+                        worklist.append(prod.source)
+                        in_worklist.add(prod.source)
 
-        self._recur_runtime_set_first = set()
-        self._recur_piece_detected_in_calc_first = None
-        self._is_recur_when_calc_first = True
+        # mark epsilon
+        for piece in self.nullable_set:
+            self.first_masks[piece] |= EPSILON_BIT
 
-        while self._is_recur_when_calc_first:
-            for piece in self.used_pieces:
-                self.calc_first_set(piece)
-            self._is_recur_when_calc_first = False
+        self.first_sets = {piece: self.mask_to_set(mask) for piece, mask in self.first_masks.items()}
+
+    def generate_suffix_first_masks(self) -> None:
+        """
+        Calculate FIRST set of every suffix of every production in one right-to-left pass over each production.
+
+        Must call generate_first_set() before calling this method.
+        """
+        self.suffix_first_masks = {}
+
+        for prod in self.production_list:
+            pieces = prod.target.pieces or []
+            suffix_masks = [EPSILON_BIT] * (len(pieces) + 1)
+
+            # FIRST(X rest) is FIRST(X), plus FIRST(rest) if X is nullable
+            rest_mask = EPSILON_BIT
+            for pos in range(len(pieces) - 1, -1, -1):
+                piece_mask = self.first_masks[pieces[pos]]
+                if piece_mask & EPSILON_BIT:
+                    # nullable only if the rest is nullable too
+                    rest_mask |= piece_mask & ~EPSILON_BIT
+                else:
+                    rest_mask = piece_mask
+                suffix_masks[pos] = rest_mask
+
+            self.suffix_first_masks[id(prod)] = suffix_masks
+
+    def get_suffix_first_mask(self, production: Production, offset: int) -> int:
+        """
+        Return FIRST set of ``production.target.pieces[offset:]`` as bitmask in O(1).
+
+        EPSILON_BIT is set if the suffix is nullable, the empty suffix (offset at the end) gives EPSILON_BIT.
+
+        Notice:
+
+        - ``production`` should be one in production_list, otherwise the mask is calculated from scratch.
+        """
+        suffix_masks = self.suffix_first_masks.get(id(production))
+        if suffix_masks is None:
+            pieces = production.target.pieces or []
+            return self.calc_first_mask_of_pieces(pieces[offset:])
+        return suffix_masks[offset]
+
+    def calc_first_mask_of_pieces(self, pieces: list[Piece]) -> int:
+        """
+        Calculate FIRST set of a custom pieces, as bitmask.
+
+        EPSILON_BIT is set only if all pieces are nullable.
+        """
+        res_mask = 0
+        for piece in pieces:
+            piece_mask = self.first_masks[piece]
+            res_mask |= piece_mask
+            # current piece could not be derived into epsilon, the pieces after it do not count.
+            if not (piece_mask & EPSILON_BIT):
+                return res_mask & ~EPSILON_BIT
+
+        return res_mask | EPSILON_BIT
 
     def calc_first_set_of_pieces(self, pieces: list[Piece]) -> set[Piece | None]:
         """
@@ -190,224 +652,676 @@ class CFGSystem:
                 "Pieces could not be empty when calculating its FIRST set."
             )
 
-        # the flag indicates if all previous scanned piece could be None.
-        contains_epsilon_until_now: bool = True
-        # store the result of calculated first set
-        res_first_set: set[Terminal | None] = set()
+        return self.mask_to_set(self.calc_first_mask_of_pieces(pieces))
 
-        for piece in pieces:
-            # retrieve first set for this piece
-            first_set_for_current_piece = self.first_sets[piece]
+    def calc_first_set(self, piece: Piece) -> set[Terminal | None]:
+        """
+        Return the first set of a piece.
 
-            # Add the first set of current piece to the result if previous pieces could all be derived into epsilon
-            if contains_epsilon_until_now:
-                res_first_set.update(first_set_for_current_piece)
-            else:
-                break
-
-            # if current piece could not be derived into epsilon, update flag to false.
-            if not (None in first_set_for_current_piece):
-                contains_epsilon_until_now = False
-
-        # if not all pieces could be converted into epsilon, then epsilon not in ret_first_set
-        if not contains_epsilon_until_now:
-            try:
-                res_first_set.remove(None)
-            except KeyError:
-                pass
-        else:
-            res_first_set.add(None)
+        Please ensure call ``generate_first_set()`` before calling this method.
+        """
+        return self.first_sets[piece]
+
+    def generate_follow_set(self) -> None:
+        """
+        Calculate the follow set of all used pieces with a worklist fixpoint algorithm.
+
+        For every occurrence A -> ...X rest, FIRST(rest) is added to FOLLOW(X) directly, and if rest is nullable,
+        FOLLOW(A) flows into FOLLOW(X). Then only the pieces whose FOLLOW set changed are propagated.
+
+        Must call generate_first_set() before calling this method.
+        """
+        self.follow_masks = {piece: 0 for piece in self.used_pieces}
+
+        # edges that FOLLOW(key) flows into FOLLOW(value)
+        flows_into: dict[Piece, set[Piece]] = {}
+
+        for prod in self.production_list:
+            if prod.target.pieces is None:
+                continue
 
-        return res_first_set
+            # FOLLOW(X) gets FIRST of the pieces after X, and FOLLOW(source) if those pieces are nullable
+            suffix_masks = self.suffix_first_masks[id(prod)]
+            for pos, cur_piece in enumerate(prod.target.pieces):
+                rest_first_mask = suffix_masks[pos + 1]
+                # epsilon is not needed in follow set
+                self.follow_masks[cur_piece] |= rest_first_mask & ~EPSILON_BIT
+                if (rest_first_mask & EPSILON_BIT) and cur_piece != prod.source:
+                    flows_into.setdefault(prod.source, set()).add(cur_piece)
+
+        worklist: list[Piece] = list(self.used_pieces)
+        in_worklist: set[Piece] = set(worklist)
+
+        while len(worklist) > 0:
+            piece = worklist.pop()
+            in_worklist.discard(piece)
+            piece_follow_mask = self.follow_masks[piece]
+
+            for target in flows_into.get(piece, ()):
+                target_follow_mask = self.follow_masks[target]
+                new_mask = target_follow_mask | piece_follow_mask
+                if new_mask != target_follow_mask:
+                    self.follow_masks[target] = new_mask
+                    if target not in in_worklist:
+                        worklist.append(target)
+                        in_worklist.add(target)
+
+        self.follow_sets = {piece: self.mask_to_set(mask) for piece, mask in self.follow_masks.items()}
+
+    def calc_follow_set(self, piece: Piece) -> set[Terminal]:
+        """
+        Return the follow set of a piece.
 
-    def calc_first_set(
-        self, piece: Piece, enable_recur_detect: bool = True
-    ) -> set[Terminal | None]:
+        Please ensure call ``generate_follow_set()`` before calling this method.
         """
-        Calculate the first set of a piece.
+        return self.follow_sets[piece]
 
-        This method currently do NOT support CFG system that may cause Left Recursive.
+    def fingerprint(self) -> str:
         """
-        try:
-            return self.first_sets[piece]
-        except KeyError:
-            pass
+        Return the content hash of this CFG over its productions and entry, as hex string.
 
-        # circular dependency detected, return empty set first
-        if enable_recur_detect and (piece in self._recur_runtime_set_first):
-            self._recur_piece_detected_in_calc_first = piece
-            self._is_recur_when_calc_first = True
-            return set()
-        self._recur_runtime_set_first.add(piece)
+        Pieces are identified by kind and name, and the order of productions counts, since parse tables refer to
+        productions by index. Equal CFGs built in different processes have the same fingerprint.
+        """
 
-        # if piece is terminal, return set with only itself inside.
-        if isinstance(piece, Terminal):
-            self.first_sets[piece] = {piece}
-            return {piece}
+        def encode(piece: Piece | None) -> list[str] | None:
+            if piece is None:
+                return None
+            return ["T" if isinstance(piece, Terminal) else "N", piece.name]
+
+        content = {
+            "entry": encode(self.entry),
+            "productions": [
+                [encode(prod.source), None if prod.target.pieces is None else [encode(p) for p in prod.target.pieces]]
+                for prod in self.production_list
+            ],
+        }
+        return hashlib.sha256(json.dumps(content, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+    def dump_analysis(self) -> dict:
+        """
+        Return FIRST and FOLLOW masks of all used pieces, indexed by symbol id, to be stored and loaded by
+        ``load_analysis()`` later.
 
-        # if it's non-terminal, first of all, get all possible derivation
-        piece: NonTerminal  # type mark
-        first_set: set[Terminal | None] = set()
-        contains_epsilon: bool = False
-        derivations_set: set[Derivation] = self.get_all_derivation(piece)
+        FIRST of terminals is not stored, it is always the bit of itself.
+        """
+        return {
+            "first": [self.first_masks[nt] for nt in self.symbols.non_terminals],
+            "follow_terminals": [self.follow_masks[t] for t in self.symbols.terminals[1:]],
+            "follow_non_terminals": [self.follow_masks[nt] for nt in self.symbols.non_terminals],
+        }
 
-        # deal with each RHS with current NonTerminal as source.
-        for derivation in derivations_set:
+    def load_analysis(self, data: dict) -> None:
+        """
+        Set nullable, FIRST and FOLLOW sets from the result of ``dump_analysis()`` of the same CFG, instead of
+        generating them.
 
-            # if this non-terminal could be derived to epsilon, then first set contains epsilon
-            if derivation.pieces is None:
-                contains_epsilon = True
-                continue
+        Raise ValueError if the data does not match the symbols of this CFG.
+        """
+        terminals = self.symbols.terminals[1:]
+        non_terminals = self.symbols.non_terminals
+        first = data.get("first")
+        follow_terminals = data.get("follow_terminals")
+        follow_non_terminals = data.get("follow_non_terminals")
+        if (
+            not isinstance(first, list) or len(first) != len(non_terminals)
+            or not isinstance(follow_terminals, list) or len(follow_terminals) != len(terminals)
+            or not isinstance(follow_non_terminals, list) or len(follow_non_terminals) != len(non_terminals)
+        ):
+            raise ValueError("Analysis data does not match the symbols of this CFG")
 
-            # loop through each part of the derivation
-            all_contains_epsilon_until_now: bool = True
-            for cur_piece in derivation.pieces:
-                # not need to continue in this case
-                if not all_contains_epsilon_until_now:
-                    break
+        self.first_masks = {t: self.terminal_bit(t) for t in terminals}
+        self.first_masks.update(zip(non_terminals, first))
+        self.nullable_set = {nt for nt in non_terminals if self.first_masks[nt] & EPSILON_BIT}
+        self.follow_masks = dict(zip(terminals, follow_terminals))
+        self.follow_masks.update(zip(non_terminals, follow_non_terminals))
+
+        self.first_sets = {piece: self.mask_to_set(mask) for piece, mask in self.first_masks.items()}
+        self.follow_sets = {piece: self.mask_to_set(mask) for piece, mask in self.follow_masks.items()}
+
+    def calc_productive_set(self) -> set[Piece]:
+        """
+        Return the set of productive pieces, which could be derived into a string of terminals.
 
-                # calc first set of current part
-                cur_piece_first_set = self.calc_first_set(cur_piece)
+        Terminals are always productive. A production makes its source productive once all its pieces are productive,
+        each production keeps a count of pieces not known to be productive yet. O(size of grammar).
+        """
+        productive_set: set[Piece] = set(self.symbols.terminals[1:])
+
+        # count of pieces not known to be productive, for each production
+        remaining_count: dict[int, int] = {}
+        worklist: list[Piece] = []
+
+        for prod in self.production_list:
+            count = 0
+            if prod.target.pieces is not None:
+                # terminals are productive already, only non-terminals are waited for
+                count = sum(1 for piece in prod.target.pieces if not isinstance(piece, Terminal))
+            remaining_count[id(prod)] = count
+            if count == 0 and prod.source not in productive_set:
+                productive_set.add(prod.source)
+                worklist.append(prod.source)
+
+        while len(worklist) > 0:
+            piece = worklist.pop()
+            for prod, pos in self.occurrences.get(piece, []):
+                remaining_count[id(prod)] -= 1
+                if remaining_count[id(prod)] == 0 and prod.source not in productive_set:
+                    productive_set.add(prod.source)
+                    worklist.append(prod.source)
+
+        return productive_set
+
+    def reduced(self) -> tuple["CFGSystem", list[Production]]:
+        """
+        Return a trimmed copy of this CFG without unproductive and unreachable pieces. O(size of grammar).
+
+        Productions using any unproductive piece are removed first, then the productions whose source could not be
+        reached from entry. If entry is not specified, only unproductive productions are removed.
+
+        Rets:
 
-                # if all first set of the parts before contains epsilon
-                # then first set of this part should be added to first set of the source
-                if all_contains_epsilon_until_now:
-                    first_set.update(cur_piece_first_set)
+        A tuple ``(reduced_cfg, origin)``. ``origin[i]`` is the production in this CFG that
+        ``reduced_cfg.production_list[i]`` comes from.
 
-                if not (None in cur_piece_first_set):
-                    all_contains_epsilon_until_now = False
+        Exceptions:
 
-            if all_contains_epsilon_until_now:
-                contains_epsilon = True
+        Raise RuntimeError if entry is specified but unproductive, since the reduced grammar is empty.
+        """
+        productive_set = self.calc_productive_set()
+        if self.entry is not None and self.entry not in productive_set:
+            raise RuntimeError(
+                f"CFG entry {self.entry} could not derive any string of terminals, the reduced CFG is empty."
+            )
+
+        # productions that only use productive pieces, grouped by source
+        productive_dict: dict[Piece, list[Production]] = {}
+        productive_ids: set[int] = set()
+        for prod in self.production_list:
+            if prod.source not in productive_set:
+                continue
+            if prod.target.pieces is not None and any(p not in productive_set for p in prod.target.pieces):
+                continue
+            productive_dict.setdefault(prod.source, []).append(prod)
+            productive_ids.add(id(prod))
 
-        # add epsilon into the set if needed
-        if contains_epsilon:
-            first_set.add(None)
+        # reachable pieces from entry, through productive productions only
+        if self.entry is None:
+            reachable_set = set(productive_dict.keys())
         else:
-            try:
-                first_set.remove(None)
-            except KeyError:
-                pass
+            reachable_set = {self.entry}
+            worklist: list[Piece] = [self.entry]
+            while len(worklist) > 0:
+                piece = worklist.pop()
+                for prod in productive_dict.get(piece, []):
+                    for next_piece in prod.target.pieces or []:
+                        if next_piece not in reachable_set:
+                            reachable_set.add(next_piece)
+                            worklist.append(next_piece)
+
+        # keep the original order of productions
+        origin: list[Production] = [
+            prod for prod in self.production_list
+            if id(prod) in productive_ids and prod.source in reachable_set
+        ]
+
+        return CFGSystem(origin, entry=self.entry), origin
+
+    def to_ll1_form(self) -> GrammarTransform:
+        """
+        Return an equivalent CFG without left recursion and with common prefixes left-factored, so that it has a
+        better chance to be LL(1).
 
-        # check if that the circular dependency error is cause by this piece
-        if (
-            enable_recur_detect
-            and (self._recur_piece_detected_in_calc_first is not None)
-            and (piece == self._recur_piece_detected_in_calc_first)
-        ):
-            # remove the recur flag
-            self._recur_piece_detected_in_calc_first = None
+        The CFG is reduced first. Then left recursion is eliminated among the non-terminals on a left-recursive cycle,
+        substituting the later defined ones into the earlier defined ones (indirect) and replacing ``A -> A a | b`` by
+        ``A -> b A'``, ``A' -> a A' | epsilon`` (direct). At last, ``A -> x b | x c`` is factored into ``A -> x A'``,
+        ``A' -> b | c``. Productions ``A -> A``, and the productions no longer reachable, are dropped.
 
-        # update catch if this result is final and valid
-        if (not enable_recur_detect) or (
-            self._recur_piece_detected_in_calc_first is None
-        ):
-            self.first_sets[piece] = first_set
-        return first_set
+        Rets:
 
-    def generate_follow_set(self) -> None:
+        A GrammarTransform, pass it to ``ParseTree.restore_origin()`` to get the parse tree of this CFG from the parse
+        tree of the transformed one.
+
+        Exceptions:
+
+        Raise RuntimeError if left recursion hidden behind nullable pieces (e.g. ``A -> B A x`` with B nullable)
+        remains, which this method could not eliminate.
         """
-        Calculate the follow set of a piece.
+        reduced_cfg, origin = self.reduced()
+
+        # working rules of each source, list of (pieces, template), in order of appearance
+        rules: dict[NonTerminal, list[tuple[list[Piece], OriginTemplate]]] = {}
+        for prod, origin_prod in zip(reduced_cfg.production_list, origin):
+            pieces = prod.target.pieces or []
+            template = OriginProduction(origin_prod, tuple(OriginChild(i) for i in range(len(pieces))))
+            rules.setdefault(prod.source, []).append((pieces, template))
+
+        used_names: set[str] = {piece.name for piece in reduced_cfg.used_pieces}
+        # count of inputs of helper non-terminals, original pieces take no input
+        input_count: dict[Piece, int] = {}
+
+        def new_helper(base: NonTerminal, count: int) -> NonTerminal:
+            helper = self._new_non_terminal(base, used_names)
+            input_count[helper] = count
+            return helper
+
+        # eliminate left recursion, only non-terminals on the same left-recursive cycle are substituted
+        left_corner_components = self._calc_cyclic_components({
+            source: {pieces[0] for pieces, _ in source_rules if len(pieces) > 0}
+            for source, source_rules in rules.items()
+        })
+        # non-terminals closer to the entry are usually defined first. process them last, so the inner ones are
+        # substituted into them, and the inner ones keep their original productions.
+        recursive_list = [nt for nt in reversed(rules.keys()) if nt in left_corner_components]
+        # processed non-terminals of each component, in order
+        component_members: dict[int, list[NonTerminal]] = {}
+        for nt_i in recursive_list:
+            processed_members = component_members.setdefault(left_corner_components[nt_i], [])
+            for nt_j in processed_members:
+                # Ai -> Aj rest, Aj -> d  =>  Ai -> d rest
+                new_rules: list[tuple[list[Piece], OriginTemplate]] = []
+                for pieces, template in rules[nt_i]:
+                    if len(pieces) == 0 or pieces[0] != nt_j:
+                        new_rules.append((pieces, template))
+                        continue
+                    for sub_pieces, sub_template in rules[nt_j]:
+                        sub_len = len(sub_pieces)
+                        new_rules.append((
+                            sub_pieces + pieces[1:],
+                            _map_origin_template(
+                                template,
+                                lambda child, args: (
+                                    sub_template if child == 0 else OriginChild(child - 1 + sub_len, args)
+                                ),
+                            ),
+                        ))
+                rules[nt_i] = new_rules
+            processed_members.append(nt_i)
+
+            # A -> A a | b  =>  A -> b A', A' -> a A' | epsilon
+            recursive_rules = [(pieces[1:], t) for pieces, t in rules[nt_i] if len(pieces) > 0 and pieces[0] == nt_i]
+            if len(recursive_rules) == 0:
+                continue
+            tail = new_helper(nt_i, 1)
+            rules[nt_i] = [
+                (pieces + [tail], OriginChild(len(pieces), (t,)))
+                for pieces, t in rules[nt_i] if len(pieces) == 0 or pieces[0] != nt_i
+            ]
+            rules[tail] = [
+                (rest + [tail], OriginChild(len(rest), (_map_origin_template(
+                    t, lambda child, args: OriginInput(0) if child == 0 else OriginChild(child - 1, args)
+                ),)))
+                for rest, t in recursive_rules if len(rest) > 0
+            ]
+            rules[tail].append(([], OriginInput(0)))
+
+        # left factoring, only pieces that take no input could be factored out
+        worklist: list[NonTerminal] = list(rules.keys())
+        while len(worklist) > 0:
+            source = worklist.pop()
+            source_rules = rules[source]
+            groups: dict[Piece, list[int]] = {}
+            for index, (pieces, _) in enumerate(source_rules):
+                if len(pieces) > 0 and input_count.get(pieces[0], 0) == 0:
+                    groups.setdefault(pieces[0], []).append(index)
+
+            # index of first rule of each group -> the factored rule replacing the group
+            factored_rules: dict[int, tuple[list[Piece], OriginTemplate]] = {}
+            factored_indexes: set[int] = set()
+            for indexes in groups.values():
+                if len(indexes) < 2:
+                    continue
+                group = [source_rules[index] for index in indexes]
+                prefix = group[0][0]
+
+                # longest common prefix of the group
+                prefix_len = 1
+                while all(
+                    len(pieces) > prefix_len and pieces[prefix_len] == prefix[prefix_len]
+                    for pieces, _ in group
+                ) and input_count.get(prefix[prefix_len], 0) == 0:
+                    prefix_len += 1
+
+                # A -> x b | x c  =>  A -> x A', A' -> b | c. A' takes inputs of A, then nodes of x.
+                source_input_count = input_count.get(source, 0)
+                helper = new_helper(source, source_input_count + prefix_len)
+                factored_rules[indexes[0]] = (
+                    prefix[:prefix_len] + [helper],
+                    OriginChild(prefix_len, tuple(OriginInput(k) for k in range(source_input_count))
+                                + tuple(OriginChild(k) for k in range(prefix_len))),
+                )
+                rules[helper] = [
+                    (pieces[prefix_len:], _map_origin_template(
+                        t,
+                        lambda child, args: (
+                            OriginInput(source_input_count + child) if child < prefix_len
+                            else OriginChild(child - prefix_len, args)
+                        ),
+                    ))
+                    for pieces, t in group
+                ]
+                factored_indexes.update(indexes)
+                worklist.append(helper)
+
+            if len(factored_indexes) == 0:
+                continue
+            rules[source] = [
+                factored_rules[index] if index in factored_rules else rule
+                for index, rule in enumerate(source_rules)
+                if index not in factored_indexes or index in factored_rules
+            ]
+
+        production_list: list[Production] = []
+        origin_templates: list[OriginTemplate] = []
+        for source, source_rules in rules.items():
+            for pieces, template in source_rules:
+                production_list.append(Production(source, Derivation(pieces if len(pieces) > 0 else None)))
+                origin_templates.append(template)
+        # substitution may leave some non-terminals unreachable, reduce again
+        transform = self._reduced_transform(production_list, origin_templates, reduced_cfg.entry)
+        ll1_cfg = transform.cfg
+
+        # check left recursion hidden behind nullable prefixes
+        nullable_set = ll1_cfg.nullable_set
+        left_corner_edges: dict[Piece, set[Piece]] = {}
+        for prod in ll1_cfg.production_list:
+            edges = left_corner_edges.setdefault(prod.source, set())
+            for piece in prod.target.pieces or []:
+                edges.add(piece)
+                if piece not in nullable_set:
+                    break
+        left_corner_components = self._calc_cyclic_components(left_corner_edges)
+        for piece in left_corner_edges:
+            if piece in left_corner_components:
+                raise RuntimeError(
+                    f"Left recursion of {piece} is hidden behind nullable pieces and could not be eliminated."
+                )
 
-        Must call generate_first_set() before calling this method.
+        return transform
+
+    def eliminate_epsilon(self) -> GrammarTransform:
+        """
+        Return an equivalent CFG without epsilon productions.
+
+        Each production ``A -> X1..Xn`` is replaced by all its variants that omit some of the nullable pieces, except
+        the empty one and ``A -> A``. If entry is nullable, the empty string is kept by ``S -> epsilon``, and a new
+        entry ``S' -> S | epsilon`` is introduced when S appears on some right-hand side.
+
+        Rets:
+
+        A GrammarTransform, an omitted nullable piece is restored by a fixed epsilon derivation of it.
         """
-        # enable recursive tracking
-        self._recur_runtime_set = set()
-        self._recur_piece_detected_in_calc_follow = None
-        self._is_recur_when_calc_follow = True
-
-        while self._is_recur_when_calc_follow:
-            self._is_recur_when_calc_follow = False
-            for piece in self.used_pieces:
-                self.calc_follow_set(piece)
-
-    def calc_follow_set(
-        self, piece: Piece, enable_recur_detect: bool = True
-    ) -> set[Terminal | None]:
-        logger.debug(f"Calculating follow set of {self}")
-        # try using cache
-        try:
-            return self.follow_sets[piece]
-        except KeyError:
-            pass
-
-        # if detected recursive call, return an empty set
-        if enable_recur_detect and (piece in self._recur_runtime_set):
-            self._recur_piece_detected_in_calc_follow = piece
-            self._is_recur_when_calc_follow = True
-            return set()
-        self._recur_runtime_set.add(piece)
-
-        follow_set: set[Terminal | None] = set()
-
-        # iterate through each production
+        epsilon_templates = self._calc_epsilon_templates()
+
+        production_list: list[Production] = []
+        origin_templates: list[OriginTemplate] = []
+        added: set[tuple[Piece, tuple[Piece, ...]]] = set()
+
+        def add_production(source: NonTerminal, pieces: list[Piece], template: OriginTemplate) -> None:
+            key = (source, tuple(pieces))
+            if key in added:
+                return
+            added.add(key)
+            production_list.append(Production(source, Derivation(pieces if len(pieces) > 0 else None)))
+            origin_templates.append(template)
+
+        # keep the empty string of entry
+        entry = self.entry
+        if entry is not None and entry in self.nullable_set:
+            if entry in self.occurrences:
+                entry = self._new_non_terminal(entry, {piece.name for piece in self.used_pieces})
+                add_production(entry, [self.entry], OriginChild(0))
+            add_production(entry, [], epsilon_templates[self.entry])
+
         for prod in self.production_list:
-            source = prod.source
-            all_contains_epsilon_until_now: bool = True
+            # variants of the production, list of (pieces, args)
+            variants: list[tuple[list[Piece], list[OriginTemplate]]] = [([], [])]
+            for piece in prod.target.pieces or []:
+                new_variants: list[tuple[list[Piece], list[OriginTemplate]]] = []
+                for pieces, args in variants:
+                    new_variants.append((pieces + [piece], args + [OriginChild(len(pieces))]))
+                    if piece in self.nullable_set:
+                        new_variants.append((pieces, args + [epsilon_templates[piece]]))
+                variants = new_variants
+
+            for pieces, args in variants:
+                if len(pieces) == 0 or pieces == [prod.source]:
+                    continue
+                add_production(prod.source, pieces, OriginProduction(prod, tuple(args)))
 
-            # if the RHS is epsilon, skip processing
-            if prod.target.pieces is None:
+        return GrammarTransform(CFGSystem(production_list, entry=entry), origin_templates)
+
+    def _calc_epsilon_templates(self) -> dict[NonTerminal, OriginTemplate]:
+        """
+        Return a template of a fixed epsilon derivation of each nullable non-terminal.
+
+        Non-terminals are visited in the order they are found nullable, so a template only refers to the templates
+        found before it and never loops.
+        """
+        epsilon_templates: dict[NonTerminal, OriginTemplate] = {}
+
+        # count of pieces not known to be nullable, for each production
+        remaining_count: dict[int, int] = {}
+        worklist: list[Production] = []
+
+        for prod in self.production_list:
+            count = 0 if prod.target.pieces is None else len(prod.target.pieces)
+            remaining_count[id(prod)] = count
+            if count == 0:
+                worklist.append(prod)
+
+        while len(worklist) > 0:
+            prod = worklist.pop()
+            if prod.source in epsilon_templates:
                 continue
+            epsilon_templates[prod.source] = OriginProduction(
+                prod, tuple(epsilon_templates[piece] for piece in prod.target.pieces or [])
+            )
+            for occur_prod, pos in self.occurrences.get(prod.source, []):
+                remaining_count[id(occur_prod)] -= 1
+                if remaining_count[id(occur_prod)] == 0:
+                    worklist.append(occur_prod)
 
-            # get number of pieces
-            pieces_count = len(prod.target.pieces)
-
-            # loop through each part in derivation from end to beginning
-            for i in range(pieces_count - 1, -1, -1):
-                cur_piece = prod.target.pieces[i]
-                cur_piece_first_set = self.first_sets[cur_piece]
-
-                # only try updating follow set if current piece it the one we are processing
-                if cur_piece == piece:
-
-                    # if this is the last element || not the last, but all part behind it could become epsilon
-                    # then follow(source) \subset follow(piece)
-                    if all_contains_epsilon_until_now:
-                        # logger.debug(f'In production: {prod}, Piece: {cur_piece}')
-                        # logger.debug(f'Request calculate Following({source})')
-                        if source != piece:
-                            follow_set.update(self.calc_follow_set(source))
-
-                    # if not the last one, add the first set of the following piece
-                    if i < pieces_count - 1:
-                        follow_set.update(
-                            self.calc_first_set(prod.target.pieces[i + 1])
-                        )
-
-                # update states
-                if not (None in cur_piece_first_set):
-                    all_contains_epsilon_until_now = False
-
-        # remove epsilon (we don't need it in follow set)
-        try:
-            follow_set.remove(None)
-        except KeyError:
-            pass
-
-        # if current recur pieces not None, we need to check if this piece is the one that cause recur circle
-        # if it is, then after this, the flag should be removed since the recur circle has been resolved
-        if (
-            enable_recur_detect
-            and (self._recur_piece_detected_in_calc_follow is not None)
-            and (piece == self._recur_piece_detected_in_calc_follow)
-        ):
-            # update recur piece flag if it's not in stack anymore
-            self._recur_piece_detected_in_calc_follow = None
+        return epsilon_templates
 
-        # update cache when this result is the final
-        if (not enable_recur_detect) or (
-            self._recur_piece_detected_in_calc_follow is None
-        ):
-            self.follow_sets[piece] = follow_set
+    def eliminate_unit_productions(self) -> GrammarTransform:
+        """
+        Return an equivalent CFG without unit productions ``A -> B``, where B is a non-terminal.
+
+        For every B reachable from A through unit productions, the non-unit productions of B are copied to A. The
+        non-terminals only reachable through unit productions are removed.
+
+        Rets:
+
+        A GrammarTransform, the skipped unit productions are restored along a shortest chain.
+        """
+        unit_dict: dict[Piece, list[Production]] = {}
+        non_unit_dict: dict[Piece, list[Production]] = {}
+        for prod in self.production_list:
+            pieces = prod.target.pieces
+            if pieces is not None and len(pieces) == 1 and isinstance(pieces[0], NonTerminal):
+                unit_dict.setdefault(prod.source, []).append(prod)
+            else:
+                non_unit_dict.setdefault(prod.source, []).append(prod)
+
+        production_list: list[Production] = []
+        origin_templates: list[OriginTemplate] = []
+        added: set[tuple[Piece, Derivation]] = set()
+
+        for source in dict.fromkeys(prod.source for prod in self.production_list):
+            # bfs through unit productions, record the unit production chain to each reached non-terminal
+            chains: dict[Piece, list[Production]] = {source: []}
+            queue: list[Piece] = [source]
+            for current in queue:
+                for unit_prod in unit_dict.get(current, []):
+                    target = unit_prod.target.pieces[0]
+                    if target not in chains:
+                        chains[target] = chains[current] + [unit_prod]
+                        queue.append(target)
+
+            for target in queue:
+                for prod in non_unit_dict.get(target, []):
+                    if (source, prod.target) in added:
+                        continue
+                    added.add((source, prod.target))
+                    template: OriginTemplate = OriginProduction(
+                        prod, tuple(OriginChild(i) for i in range(len(prod.target.pieces or [])))
+                    )
+                    for unit_prod in reversed(chains[target]):
+                        template = OriginProduction(unit_prod, (template,))
+                    production_list.append(Production(source, prod.target))
+                    origin_templates.append(template)
+
+        return self._reduced_transform(production_list, origin_templates, self.entry)
+
+    def to_cnf(self) -> GrammarTransform:
+        """
+        Return an equivalent CFG in Chomsky normal form.
+
+        Every production of the result is ``A -> B C`` or ``A -> a``, except ``S -> epsilon`` when entry is nullable,
+        where S does not appear on any right-hand side.
+
+        Epsilon productions and unit productions are eliminated first, then terminals in long right-hand sides are
+        replaced by ``a' -> a``, and ``A -> X1 X2 .. Xn`` is split into ``A -> X1 A1'``, ``A1' -> X2 A2'``, ...
 
-        # remove piece from runtime stack
-        try:
-            self._recur_runtime_set.remove(piece)
-        except KeyError:
-            pass
+        Rets:
 
-        return follow_set
+        The chained GrammarTransform of all steps.
+        """
+        epsilon_transform = self.eliminate_epsilon()
+        unit_transform = epsilon_transform.cfg.eliminate_unit_productions()
+        unit_cfg = unit_transform.cfg
+
+        used_names: set[str] = {piece.name for piece in unit_cfg.used_pieces}
+        terminal_sources: dict[Terminal, NonTerminal] = {}
+
+        production_list: list[Production] = []
+        origin_templates: list[OriginTemplate] = []
+
+        for prod in unit_cfg.production_list:
+            pieces = prod.target.pieces
+            # A -> a and S -> epsilon are kept
+            if pieces is None or len(pieces) == 1:
+                production_list.append(prod)
+                origin_templates.append(
+                    OriginProduction(prod, tuple(OriginChild(i) for i in range(len(pieces or []))))
+                )
+                continue
+
+            # replace terminals with a' -> a, a' is restored into the token leaf itself
+            new_pieces: list[Piece] = []
+            for piece in pieces:
+                if isinstance(piece, Terminal):
+                    if piece not in terminal_sources:
+                        terminal_source = self._new_non_terminal(NonTerminal(piece.name), used_names)
+                        terminal_sources[piece] = terminal_source
+                        production_list.append(Production(terminal_source, Derivation([piece])))
+                        origin_templates.append(OriginChild(0))
+                    piece = terminal_sources[piece]
+                new_pieces.append(piece)
+
+            # A -> X1 A1', A1' -> X2 A2', ..., helper of depth k takes the nodes of X1..Xk as inputs
+            source = prod.source
+            for depth in range(len(new_pieces) - 2):
+                helper = self._new_non_terminal(NonTerminal(f"{prod.source.name}{depth + 1}"), used_names)
+                production_list.append(Production(source, Derivation([new_pieces[depth], helper])))
+                origin_templates.append(
+                    OriginChild(1, tuple(OriginInput(k) for k in range(depth)) + (OriginChild(0),))
+                )
+                source = helper
+            production_list.append(Production(source, Derivation(new_pieces[-2:])))
+            origin_templates.append(OriginProduction(
+                prod,
+                tuple(OriginInput(k) for k in range(len(new_pieces) - 2)) + (OriginChild(0), OriginChild(1)),
+            ))
+
+        cnf_transform = GrammarTransform(CFGSystem(production_list, entry=unit_cfg.entry), origin_templates)
+        return epsilon_transform.then(unit_transform).then(cnf_transform)
+
+    @staticmethod
+    def _reduced_transform(
+            production_list: list[Production],
+            origin_templates: list[OriginTemplate],
+            entry: Piece | None,
+    ) -> GrammarTransform:
+        """
+        Create the transformed CFG, reduce it and return the GrammarTransform with templates of the kept productions.
+        """
+        transformed_cfg = CFGSystem(production_list, entry=entry)
+        template_of: dict[int, OriginTemplate] = {
+            id(prod): template for prod, template in zip(transformed_cfg.production_list, origin_templates)
+        }
+        transformed_cfg, origin = transformed_cfg.reduced()
+        return GrammarTransform(transformed_cfg, [template_of[id(prod)] for prod in origin])
+
+    @staticmethod
+    def _new_non_terminal(base: NonTerminal, used_names: set[str]) -> NonTerminal:
+        """
+        Return a new non-terminal named after ``base`` with primes, whose name is not in ``used_names``.
+
+        The new name is added to ``used_names``.
+        """
+        name = base.name + "'"
+        while name in used_names:
+            name += "'"
+        used_names.add(name)
+        return NonTerminal(name)
+
+    @staticmethod
+    def _calc_cyclic_components(edges: dict[Piece, set[Piece]]) -> dict[Piece, int]:
+        """
+        Return the index of strongly connected component of each piece on a cycle of ``edges``, that is, the pieces
+        reachable from themselves through at least one edge. Two pieces reach each other iff they have the same index.
+
+        Tarjan's algorithm with explicit stacks, O(count of edges).
+        """
+        # missing means not visited, finished means assigned to a component, which is larger than any depth
+        depth: dict[Piece, int] = {}
+        finished = len(edges) + sum(len(next_pieces) for next_pieces in edges.values()) + 1
+        node_stack: list[Piece] = []
+        components: dict[Piece, int] = {}
+        component_count = 0
+
+        for start in edges:
+            if depth.get(start, 0) != 0:
+                continue
+            node_stack.append(start)
+            depth[start] = len(node_stack)
+            # (piece, iterator of next pieces, depth when visited)
+            call_stack: list[tuple[Piece, Iterator[Piece], int]] = [(start, iter(edges[start]), depth[start])]
+
+            while len(call_stack) > 0:
+                piece, next_iter, piece_depth = call_stack[-1]
+
+                next_piece = next(next_iter, None)
+                if next_piece is not None:
+                    if depth.get(next_piece, 0) == 0:
+                        node_stack.append(next_piece)
+                        depth[next_piece] = len(node_stack)
+                        call_stack.append((next_piece, iter(edges.get(next_piece, ())), depth[next_piece]))
+                        continue
+                    depth[piece] = min(depth[piece], depth[next_piece])
+                    continue
 
+                call_stack.pop()
+                # piece is the root of a strongly connected component
+                if depth[piece] == piece_depth:
+                    members: list[Piece] = []
+                    while True:
+                        member = node_stack.pop()
+                        depth[member] = finished
+                        members.append(member)
+                        if member == piece:
+                            break
+                    if len(members) > 1 or piece in edges.get(piece, ()):
+                        for member in members:
+                            components[member] = component_count
+                        component_count += 1
+                if len(call_stack) > 0:
+                    parent = call_stack[-1][0]
+                    depth[parent] = min(depth[parent], depth[piece])
+
+        return components
 
 # a -> bc
 # c -> xa
@@ -1,8 +1,24 @@
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Mapping
 from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Literal
 
 import reg_exp as regex
 import automata as fa
-from cfg import Terminal, NonTerminal
+from cfg import Terminal, NonTerminal, SymbolTable
+
+# Channels of a token definition.
+#
+# - ``default`` Tokens are emitted as TokenPair and will be passed to the parser.
+# - ``hidden`` Tokens are never emitted, only their offset range is recorded if the analyzer asks for it.
+# - ``skip`` Tokens only advance the scan position.
+type TokenChannel = Literal['default', 'hidden', 'skip']
+
+CHANNEL_DEFAULT: TokenChannel = 'default'
+CHANNEL_HIDDEN: TokenChannel = 'hidden'
+CHANNEL_SKIP: TokenChannel = 'skip'
 
 
 class TokenDefinition:
@@ -15,14 +31,49 @@ class TokenDefinition:
 
     fa: fa.FA
 
+    # which channel the matched token goes to, checkout TokenChannel
+    channel: TokenChannel
+
+    # if True, the automaton of this definition runs over UTF-8 bytes instead of chars
+    utf8: bool
+
+    # reserved words of this token, key is the lexeme, value is the token type it will be reclassified to.
+    # keywords are looked up after a match, so they add no state to the automaton.
+    keywords: Mapping[str, str] | None
+
     def use_dfa(self):
         self.fa = self.fa.to_dfa()
 
-    def __init__(self, token_type: str, regular_expr: regex.RegularExpr, priority: int = 0):
+    def __init__(
+            self,
+            token_type: str,
+            regular_expr: regex.RegularExpr,
+            priority: int = 0,
+            channel: TokenChannel = CHANNEL_DEFAULT,
+            utf8: bool = False,
+            keywords: Mapping[str, str] | Iterable[str] | None = None,
+    ):
+        """
+        Params:
+
+        - ``keywords`` Keyword table attached to this token. Could be a dict that maps lexeme to token type, or just
+          an iterable of lexemes, in which case each keyword uses itself as the token type.
+        """
+        if channel not in (CHANNEL_DEFAULT, CHANNEL_HIDDEN, CHANNEL_SKIP):
+            raise ValueError(f'Unknown token channel: {channel}')
+
         self.token_type = token_type
         self.priority = priority
         self.regular_expr = regular_expr
-        self.fa = self.regular_expr.to_fa()
+        self.channel = channel
+        self.utf8 = utf8
+        self.fa = self.regular_expr.to_fa(utf8=utf8)
+
+        self.keywords = None
+        if keywords is not None:
+            if not isinstance(keywords, Mapping):
+                keywords = {kw: kw for kw in keywords}
+            self.keywords = MappingProxyType(dict(keywords))
 
     def __lt__(self, other):
         return self.priority < other.priority
@@ -35,6 +86,9 @@ class TokenDefinition:
 class TokenPair:
     token_type: str
     content: str
+    # offset of the first char of this token in the source string, -1 if unknown.
+    # line and column are not stored, use LexicalAnalyzer.get_line_col() to resolve them when needed.
+    start: int = -1
 
     def is_match(self, terminal: Terminal) -> bool:
         """
@@ -48,11 +102,16 @@ class TokenPair:
             return False
         return True
 
-    def to_terminal(self) -> Terminal:
+    def to_terminal(self, symbols: SymbolTable | None = None) -> Terminal:
         """
         Return the corresponding Terminal for this TokenPair.
-        :return:
+
+        If ``symbols`` is provided and contains the token type, the interned Terminal is returned without allocating.
         """
+        if symbols is not None:
+            terminal = symbols.get_terminal(self.token_type)
+            if terminal is not None:
+                return terminal
         return Terminal(name=self.token_type)
 
 
@@ -63,10 +122,55 @@ class LexicalAnalyzer:
     # store the parsed token pair
     token_pairs: list[TokenPair]
 
-    def __init__(self, token_definitions: list[TokenDefinition], use_dfa: bool = True):
+    # if True, offset ranges of tokens in hidden channel will be recorded into hidden_ranges
+    record_hidden: bool
+
+    # if True, all token definitions are byte level, the input will be scanned as UTF-8 bytes,
+    # and all offsets (TokenPair.start, hidden_ranges, line and column) are byte offsets.
+    utf8: bool
+
+    # offset ranges of hidden tokens, pattern: (token_type, start, end), end is exclusive
+    hidden_ranges: list[tuple[str, int, int]]
+
+    # the source string of the latest parse() call, encoded if utf8 is True
+    _source: str | bytes
+
+    # sorted offsets of all newline chars in _source, built lazily by get_line_col()
+    _newline_offsets: array | None
+
+    # if True, use linear time maximal munch among all definitions instead of trying definitions by priority.
+    maximal_munch: bool
+
+    # lazily built combined automaton used in maximal munch mode, states are identified by index.
+    # _scan_states[i] is a tuple of current states of all definitions, _scan_accepts[i] is the index of the
+    # definition that accepts in such state (-1 if none).
+    _scan_states: list[tuple[frozenset | None, ...]]
+    _scan_state_ids: dict[tuple[frozenset | None, ...], int]
+    _scan_transitions: list[dict[str | int, int]]
+    _scan_accepts: list[int]
+
+    def __init__(
+            self,
+            token_definitions: list[TokenDefinition],
+            use_dfa: bool = True,
+            record_hidden: bool = False,
+            maximal_munch: bool = False,
+    ):
         # initial token definitions
         token_definitions.sort()
         self.token_definitions = token_definitions
+        self.record_hidden = record_hidden
+        self.maximal_munch = maximal_munch
+
+        self._scan_states = []
+        self._scan_state_ids = {}
+        self._scan_transitions = []
+        self._scan_accepts = []
+
+        # char level and byte level definitions could not be mixed in one analyzer
+        self.utf8 = any(defs.utf8 for defs in token_definitions)
+        if self.utf8 and not all(defs.utf8 for defs in token_definitions):
+            raise ValueError('Could not mix UTF-8 byte level token definitions with char level ones')
 
         # use dfa if needed
         if use_dfa:
@@ -75,15 +179,68 @@ class LexicalAnalyzer:
 
         # init token pairs
         self.token_pairs = []
+        self.hidden_ranges = []
+        self._source = ''
+        self._newline_offsets = None
 
     def init_state(self):
         self.token_pairs = []
+        self.hidden_ranges = []
+        self._source = ''
+        self._newline_offsets = None
+
+    def get_line_col(self, position: int | TokenPair) -> tuple[int, int]:
+        """
+        Resolve the (line, column) of an offset or a TokenPair in the source of the latest ``parse()`` call.
+
+        Both line and column start from 1. The newline index is built on first call, after that each
+        call is a binary search, O(log lines).
+        """
+        offset = position.start if isinstance(position, TokenPair) else position
+        if offset < 0:
+            raise ValueError(f'Could not resolve line and column of an unknown offset {offset}')
+
+        if self._newline_offsets is None:
+            self._build_newline_index()
+
+        # count of newline chars before offset
+        line_idx = bisect_left(self._newline_offsets, offset)
+        line_start = 0 if line_idx == 0 else self._newline_offsets[line_idx - 1] + 1
+        return line_idx + 1, offset - line_start + 1
+
+    def _build_newline_index(self) -> None:
+        newline_offsets = array('q')
+        newline = b'\n' if isinstance(self._source, bytes) else '\n'
+        idx = self._source.find(newline)
+        while idx >= 0:
+            newline_offsets.append(idx)
+            idx = self._source.find(newline, idx + 1)
+        self._newline_offsets = newline_offsets
 
     def parse(self, input_str: str):
         """
         Try parsing input string using this Lexical Analyzer.
 
-        Return List of TokenPair object if success.
+        Return List of TokenPair object if success. Only tokens in default channel will be included.
+        """
+        # byte level automata need encoded input
+        if self.utf8:
+            input_str = input_str.encode('utf-8')
+
+        # keep the source for line and column lookup, the index itself is built on demand
+        self._source = input_str
+        self._newline_offsets = None
+
+        if self.maximal_munch:
+            self._parse_maximal_munch(input_str)
+        else:
+            self._parse_by_priority(input_str)
+
+        return self.token_pairs
+
+    def _parse_by_priority(self, input_str: str | bytes) -> None:
+        """
+        Try token definitions one by one in order of priority, each definition consumes its longest match.
         """
         parsed: int = 0
 
@@ -101,11 +258,7 @@ class LexicalAnalyzer:
 
                 has_match = True
                 # has matched prefix in string
-                # add token pairs
-                self.token_pairs.append(TokenPair(
-                    token_type=token_defs.token_type,
-                    content=input_str[0:max_match]
-                ))
+                self._add_token(token_defs, parsed, parsed + max_match)
                 # update parsed
                 parsed += max_match
                 # update input str
@@ -115,4 +268,121 @@ class LexicalAnalyzer:
             if not has_match:
                 raise RuntimeError(f'Failed to parse token, parsed: {parsed}')
 
-        return self.token_pairs
+    def _parse_maximal_munch(self, input_str: str | bytes) -> None:
+        """
+        Longest match among all token definitions wins, ties are broken by priority.
+
+        Uses the tabulation technique of Reps' "Maximal-Munch" Tokenization in Linear Time: once a (state, position)
+        pair is known to never reach an accept state, it's recorded and the scan stops there next time. Every pair
+        fails at most once, so the total work is O(n) no matter how the input looks like.
+        """
+        input_len = len(input_str)
+        parsed: int = 0
+        start_state = self._get_scan_state_id(self._scan_start_components())
+
+        # (state, position) pairs that could never reach an accept state, encoded as state * (input_len + 1) + pos
+        failed: set[int] = set()
+        stride = input_len + 1
+
+        while parsed < input_len:
+            state = start_state
+            pos = parsed
+            # last accept state info
+            accept_defs_idx: int = -1
+            accept_end: int = -1
+            # pairs visited after last accept
+            visited: list[int] = []
+
+            while state >= 0 and (state * stride + pos) not in failed:
+                if self._scan_accepts[state] >= 0:
+                    accept_defs_idx = self._scan_accepts[state]
+                    accept_end = pos
+                    visited.clear()
+                else:
+                    visited.append(state * stride + pos)
+
+                if pos >= input_len:
+                    break
+                state = self._scan_move(state, input_str[pos])
+                pos += 1
+
+            # all pairs visited after last accept could not lead to another accept
+            failed.update(visited)
+
+            # not match at all, or only match empty string
+            if accept_end <= parsed:
+                raise RuntimeError(f'Failed to parse token, parsed: {parsed}')
+
+            self._add_token(self.token_definitions[accept_defs_idx], parsed, accept_end)
+            parsed = accept_end
+
+    def _add_token(self, token_defs: TokenDefinition, start: int, end: int) -> None:
+        """
+        Add matched token to the channel it belongs to. Skipped and hidden tokens never create a TokenPair.
+        """
+        if token_defs.channel == CHANNEL_DEFAULT:
+            content = self._source[start:end]
+            if self.utf8:
+                content = content.decode('utf-8')
+
+            # reclassify the lexeme if it's a keyword
+            token_type = token_defs.token_type
+            if token_defs.keywords is not None:
+                token_type = token_defs.keywords.get(content, token_type)
+
+            self.token_pairs.append(TokenPair(
+                token_type=token_type,
+                content=content,
+                start=start,
+            ))
+        elif token_defs.channel == CHANNEL_HIDDEN and self.record_hidden:
+            self.hidden_ranges.append((token_defs.token_type, start, end))
+
+    def _scan_start_components(self) -> tuple[frozenset | None, ...]:
+        return tuple(token_defs.fa.get_start_states(find_epsilons=True) for token_defs in self.token_definitions)
+
+    def _get_scan_state_id(self, components: tuple[frozenset | None, ...]) -> int:
+        """
+        Get id of the combined scan state. The combined state is a tuple of current states of every token definition,
+        None means the automaton of that definition is stuck.
+
+        Return -1 if all automata are stuck.
+        """
+        state_id = self._scan_state_ids.get(components)
+        if state_id is not None:
+            return state_id
+
+        if all(c is None for c in components):
+            state_id = -1
+        else:
+            state_id = len(self._scan_states)
+            self._scan_states.append(components)
+            self._scan_transitions.append({})
+
+            # the first definition (highest priority) that accepts
+            accept_defs_idx = -1
+            for idx, c in enumerate(components):
+                if c is not None and any(node.is_end for node in c):
+                    accept_defs_idx = idx
+                    break
+            self._scan_accepts.append(accept_defs_idx)
+
+        self._scan_state_ids[components] = state_id
+        return state_id
+
+    def _scan_move(self, state_id: int, char: str | int) -> int:
+        """
+        Move combined scan state by one char. Transitions are discovered lazily and cached.
+        """
+        transitions = self._scan_transitions[state_id]
+        next_id = transitions.get(char)
+        if next_id is not None:
+            return next_id
+
+        next_components = tuple(
+            None if c is None else token_defs.fa.peek_next(c, char)
+            for token_defs, c in zip(self.token_definitions, self._scan_states[state_id])
+        )
+        next_id = self._get_scan_state_id(next_components)
+        transitions[char] = next_id
+        return next_id
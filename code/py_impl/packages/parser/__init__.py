@@ -1,4 +1,6 @@
 # import as submodule
 from . import ll
 from . import lr
+from . import cyk
 from .errors import *
+from .cache import *
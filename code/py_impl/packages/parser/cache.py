@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import zlib
+from pathlib import Path
+
+from loguru import logger
+
+import cfg
+
+__all__ = [
+    'ParserCache',
+]
+
+
+class ParserCache:
+    """
+    On-disk cache of generated parser artifacts (FIRST/FOLLOW sets, LL table, LR ACTION/GOTO tables), so a parser of an
+    unchanged CFG could be created without generating them again.
+
+    Entries are keyed by the fingerprint of the CFG (checkout ``CFGSystem.fingerprint()``), the kind of artifact and
+    the parameters that affect it, e.g. the type of LR parser and its precedence declarations.
+
+    File Format:
+
+    - ``MAGIC`` 4 bytes.
+    - ``FORMAT_VERSION`` uint16, little endian.
+    - sha256 digest of the body, 32 bytes.
+    - body, zlib compressed JSON of ``{"key": key, "data": data}``.
+
+    A file is ignored on load if its magic, version, digest or key does not match, so a truncated or stale file never
+    yields a wrong table. Files are written to a temporary file first then renamed, concurrent writers are safe.
+    """
+    MAGIC = b'PYPC'
+
+    # bump it when the layout of file or any stored data changes
+    FORMAT_VERSION = 1
+
+    _HEADER = struct.Struct('<4sH32s')
+
+    directory: Path
+
+    def __init__(self, directory: str | os.PathLike):
+        self.directory = Path(directory)
+
+    @staticmethod
+    def make_key(cfg_sys: cfg.CFGSystem, kind: str, params: str = '') -> str:
+        """
+        Return the key of the cache entry of an artifact of the CFG.
+        """
+        content = json.dumps([cfg_sys.fingerprint(), kind, params], separators=(',', ':'))
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def get_path(self, key: str) -> Path:
+        return self.directory / f'{key}.cache'
+
+    def load(self, cfg_sys: cfg.CFGSystem, kind: str, params: str = '') -> dict | None:
+        """
+        Return the data stored by ``store()`` with the same CFG, kind and params, None if not found or invalid.
+        """
+        key = self.make_key(cfg_sys, kind, params)
+        try:
+            raw = self.get_path(key).read_bytes()
+        except OSError:
+            return None
+
+        if len(raw) < self._HEADER.size:
+            return None
+        magic, version, digest = self._HEADER.unpack_from(raw)
+        body = raw[self._HEADER.size:]
+        if magic != self.MAGIC or version != self.FORMAT_VERSION or hashlib.sha256(body).digest() != digest:
+            logger.warning(f'Ignore invalid parser cache file {self.get_path(key)}')
+            return None
+
+        try:
+            content = json.loads(zlib.decompress(body))
+        except (zlib.error, ValueError):
+            logger.warning(f'Ignore invalid parser cache file {self.get_path(key)}')
+            return None
+        if not isinstance(content, dict) or content.get('key') != key or not isinstance(content.get('data'), dict):
+            return None
+
+        return content['data']
+
+    def store(self, cfg_sys: cfg.CFGSystem, kind: str, data: dict, params: str = '') -> None:
+        """
+        Store the data of an artifact of the CFG, data should be JSON serializable.
+        """
+        key = self.make_key(cfg_sys, kind, params)
+        body = zlib.compress(json.dumps({'key': key, 'data': data}, separators=(',', ':')).encode('utf-8'))
+        raw = self._HEADER.pack(self.MAGIC, self.FORMAT_VERSION, hashlib.sha256(body).digest()) + body
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(raw)
+            os.replace(temp_path, self.get_path(key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def load_analysis(self, cfg_sys: cfg.CFGSystem) -> bool:
+        """
+        Set FIRST and FOLLOW sets of the CFG from cache, return False if not cached.
+        """
+        data = self.load(cfg_sys, 'analysis')
+        if data is None:
+            return False
+        try:
+            cfg_sys.load_analysis(data)
+        except ValueError:
+            return False
+        return True
+
+    def store_analysis(self, cfg_sys: cfg.CFGSystem) -> None:
+        """
+        Store FIRST and FOLLOW sets of the CFG, they are generated first if not yet.
+        """
+        self.store(cfg_sys, 'analysis', cfg_sys.dump_analysis())
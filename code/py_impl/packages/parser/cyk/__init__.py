@@ -0,0 +1 @@
+from .parser_cyk import *
@@ -0,0 +1,227 @@
+from copy import copy
+
+import cfg
+from lexical_analyzer import TokenPair
+
+from .. import errors as general_err
+from ..parse_tree import ParseTree, ParseTreeNode
+
+# numpy is an optional dependency, only required by CYKParser
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__all__ = [
+    'CYKParser',
+    'NotRecognizedError',
+]
+
+
+class CYKParser:
+    """
+    CYK parser, works with any CFG including ambiguous ones, in O(n^3) time and O(n^2) space.
+
+    The CFG is converted to Chomsky normal form first (checkout ``CFGSystem.to_cnf()``), and the parse tree is restored
+    to the productions of the original CFG. For ambiguous input, one of the parse trees is returned.
+
+    Chart:
+
+    ``chart[length, start]`` is a boolean vector over non-terminals of the CNF grammar, True if the non-terminal
+    derives ``tokens[start:start + length]``. All spans of the same length are filled at once. For each group of
+    binary rules ``A -> B C`` sharing B, a batched boolean matrix product of the B column of left parts and the C
+    columns of right parts over all split points gives the rules that match.
+
+    Requires numpy.
+    """
+    cfg_system: cfg.CFGSystem
+
+    # transform from the original CFG to its CNF
+    transform: cfg.GrammarTransform
+
+    # binary rules grouped by id of left child, list of (left id, array of right ids, array of source ids)
+    _binary_groups: list[tuple[int, 'np.ndarray', 'np.ndarray']]
+
+    # binary rules of each source id, (array of left ids, array of right ids, list of productions)
+    _binary_rules: dict[int, tuple['np.ndarray', 'np.ndarray', list[cfg.Production]]]
+
+    # terminal id -> boolean vector of the non-terminals that derive it
+    _terminal_vectors: dict[int, 'np.ndarray']
+
+    # (source id, terminal id) -> production A -> a
+    _terminal_rules: dict[tuple[int, int], cfg.Production]
+
+    # the production S -> epsilon of CNF, if entry is nullable
+    _epsilon_production: cfg.Production | None
+
+    _epsilon_terminal: cfg.Terminal | None
+
+    def __init__(self, cfg_system: cfg.CFGSystem, epsilon_terminal: cfg.Terminal | None = None):
+        if np is None:
+            raise ImportError('CYKParser requires numpy, please install it first.')
+        if cfg_system.entry is None:
+            raise general_err.EntryUndefinedError()
+
+        self.cfg_system = cfg_system
+        self._epsilon_terminal = epsilon_terminal
+        try:
+            self.transform = cfg_system.to_cnf()
+        except RuntimeError as e:
+            raise general_err.CFGIncompatibleError(parser_type='CYK') from e
+
+        self._generate_rules()
+
+    def _generate_rules(self) -> None:
+        cnf_cfg = self.transform.cfg
+        non_terminal_count = len(cnf_cfg.symbols.non_terminals)
+
+        binary_dict: dict[int, list[cfg.Production]] = {}
+        self._terminal_vectors = {}
+        self._terminal_rules = {}
+        self._epsilon_production = None
+
+        for prod in cnf_cfg.production_list:
+            pieces = prod.target.pieces
+            if pieces is None:
+                self._epsilon_production = prod
+            elif len(pieces) == 1:
+                terminal_id = pieces[0].id
+                if terminal_id not in self._terminal_vectors:
+                    self._terminal_vectors[terminal_id] = np.zeros(non_terminal_count, dtype=bool)
+                self._terminal_vectors[terminal_id][prod.source.id] = True
+                self._terminal_rules[(prod.source.id, terminal_id)] = prod
+            else:
+                binary_dict.setdefault(pieces[0].id, []).append(prod)
+
+        self._binary_groups = [
+            (
+                left_id,
+                np.array([prod.target.pieces[1].id for prod in prods], dtype=np.intp),
+                np.array([prod.source.id for prod in prods], dtype=np.intp),
+            )
+            for left_id, prods in binary_dict.items()
+        ]
+
+        source_dict: dict[int, list[cfg.Production]] = {}
+        for prods in binary_dict.values():
+            for prod in prods:
+                source_dict.setdefault(prod.source.id, []).append(prod)
+        self._binary_rules = {
+            source_id: (
+                np.array([prod.target.pieces[0].id for prod in prods], dtype=np.intp),
+                np.array([prod.target.pieces[1].id for prod in prods], dtype=np.intp),
+                prods,
+            )
+            for source_id, prods in source_dict.items()
+        }
+
+    def generate_chart(self, token_list: list[TokenPair]) -> 'np.ndarray':
+        """
+        Return the CYK chart of the input tokens, checkout the doc of this class for its layout.
+        """
+        cnf_cfg = self.transform.cfg
+        token_count = len(token_list)
+        non_terminal_count = len(cnf_cfg.symbols.non_terminals)
+        chart = np.zeros((token_count + 1, token_count, non_terminal_count), dtype=bool)
+
+        # spans of length 1, A -> a
+        for start, token in enumerate(token_list):
+            vector = self._terminal_vectors.get(cnf_cfg.symbols.get_terminal_id(token.token_type))
+            if vector is not None:
+                chart[1, start] = vector
+
+        for length in range(2, token_count + 1):
+            starts = np.arange(token_count - length + 1)
+            splits = np.arange(1, length)
+            # left[s, k] = chart[k, start], right[s, k] = chart[length - k, start + k]
+            left = chart[splits[None, :], starts[:, None]]
+            right = chart[(length - splits)[None, :], starts[:, None] + splits[None, :]]
+            cells = chart[length, :token_count - length + 1]
+
+            for left_id, right_ids, source_ids in self._binary_groups:
+                # hits[s, j] = any over k of (left[s, k, B] and right[s, k, C_j])
+                hits = np.matmul(left[:, None, :, left_id], right[:, :, right_ids])[:, 0, :]
+                np.logical_or.at(cells, (slice(None), source_ids), hits)
+
+        return chart
+
+    def recognize(self, token_list: list[TokenPair]) -> bool:
+        """
+        Return True if the input tokens could be derived from entry of the CFG.
+        """
+        if len(token_list) == 0:
+            return self._epsilon_production is not None
+
+        chart = self.generate_chart(token_list)
+        return bool(chart[len(token_list), 0, self.transform.cfg.entry.id])
+
+    def parse(self, token_list: list[TokenPair]) -> ParseTree:
+        """
+        Parse the input tokens, return the parse tree of the original CFG.
+
+        Exceptions:
+
+        - ``NotRecognizedError`` If the input tokens could not be derived from entry of the CFG.
+        """
+        cnf_cfg = self.transform.cfg
+        token_count = len(token_list)
+        entry = cnf_cfg.entry
+
+        leaves: list[ParseTreeNode] = [
+            ParseTreeNode(node_type=token.to_terminal(cnf_cfg.symbols), node_content=token) for token in token_list
+        ]
+        root = ParseTreeNode(node_type=entry)
+        parse_tree = ParseTree([root], epsilon_terminal=self._epsilon_terminal)
+
+        if token_count == 0:
+            if self._epsilon_production is None:
+                raise NotRecognizedError(token_list)
+            root.production = self._epsilon_production
+            root.pointers = [copy(parse_tree.epsilon_leaf)]
+            parse_tree.leaves = []
+            return parse_tree.restore_origin(self.transform)
+
+        chart = self.generate_chart(token_list)
+        if not chart[token_count, 0, entry.id]:
+            raise NotRecognizedError(token_list)
+
+        # build tree top-down from the chart, list of (node, start, length)
+        node_stack: list[tuple[ParseTreeNode, int, int]] = [(root, 0, token_count)]
+        while len(node_stack) > 0:
+            node, start, length = node_stack.pop()
+            source_id = node.node_type.id
+
+            if length == 1:
+                leaf = leaves[start]
+                node.production = self._terminal_rules[(source_id, leaf.node_type.id)]
+                node.pointers = [leaf]
+                continue
+
+            # find the first rule and split point that match
+            left_ids, right_ids, prods = self._binary_rules[source_id]
+            splits = np.arange(1, length)
+            hits = chart[splits, start][:, left_ids] & chart[length - splits, start + splits][:, right_ids]
+            split_index, rule_index = np.argwhere(hits)[0]
+            split = int(splits[split_index])
+            prod = prods[rule_index]
+
+            left_node = ParseTreeNode(node_type=prod.target.pieces[0])
+            right_node = ParseTreeNode(node_type=prod.target.pieces[1])
+            node.production = prod
+            node.pointers = [left_node, right_node]
+            node_stack.append((left_node, start, split))
+            node_stack.append((right_node, start + split, length - split))
+
+        parse_tree.leaves = leaves
+        return parse_tree.restore_origin(self.transform)
+
+
+class NotRecognizedError(general_err.ParseErrorBase):
+    """
+    Raise when the input tokens could not be derived from entry of the CFG.
+    """
+
+    def __init__(self, token_list: list[TokenPair]):
+        super().__init__(
+            f'Input tokens could not be derived from entry of the CFG: {[t.token_type for t in token_list]}'
+        )
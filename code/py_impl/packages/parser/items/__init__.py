@@ -1,2 +1 @@
 from .items import *
-from .items_helper import *
\ No newline at end of file
@@ -97,32 +97,36 @@ class ItemCore:
 class Item:
     """Class that represents Canonical LR(1) Items"""
     core: ItemCore
-    lookahead_set: set[Piece] | None = None
+
+    # lookahead terminals as bitmask, checkout cfg.EPSILON_BIT and CFGSystem.terminal_bit().
+    # None means no limitation on lookahead.
+    lookahead: int | None = None
 
     def __init__(
             self,
             production: Production,
             offset: int,
-            lookahead: set[Piece] | None = None):
+            lookahead: int | None = None):
         """
-        Initialize Item based on production offset and lookahead.
+        Initialize Item based on production offset and lookahead bitmask.
 
         Lookahead default to None.
         """
         self.core = ItemCore(production, offset)
-        self.lookahead_set = lookahead
+        self.lookahead = lookahead
 
     def __copy__(self):
-        return Item(self.core.production, self.core.offset, self.lookahead_set)
+        return Item(self.core.production, self.core.offset, self.lookahead)
 
     def __eq__(self, other) -> bool:
         return hash(self) == hash(other)
 
     def __hash__(self) -> int:
-        return hash(tuple([self.core, tuple(self.lookahead_set or set())]))
+        return hash((self.core, self.lookahead))
 
     def __repr__(self) -> str:
-        repr_str = f'({self.core}, {self.lookahead_set})'
+        lookahead_str = 'None' if self.lookahead is None else f'{self.lookahead:#x}'
+        repr_str = f'({self.core}, {lookahead_str})'
         return repr_str
 
     def hash_of_core(self):
@@ -131,14 +135,15 @@ class Item:
         """
         return hash(self.core)
 
-    def could_reduce(self, piece: Piece):
-        if self.lookahead_set is None:
-            return True
-
-        if piece in self.lookahead_set:
+    def could_reduce(self, terminal_bit: int):
+        """
+        Check if the lookahead of this item contains the terminal, ``terminal_bit`` is given by
+        ``CFGSystem.terminal_bit()``
+        """
+        if self.lookahead is None:
             return True
 
-        return False
+        return (self.lookahead & terminal_bit) != 0
 
 
 class IllegalItemOffsetError(Exception):
@@ -1,8 +1,10 @@
-from copy import copy
 import cfg
 from lexical_analyzer import TokenPair
 
+from loguru import logger
+
 from .. import errors as general_err
+from ..cache import ParserCache
 from ..parse_tree import ParseTree, ParseTreeNode
 
 __all__ = [
@@ -41,25 +43,60 @@ class LLParseTable:
             source = prod.source
             target = prod.target
 
-            # if target is epsilon, add follow set of source
+            # lookahead set of this production is FIRST(target), if target is nullable, add FOLLOW(source)
             if target.pieces is None:
-                source_follow_set = self.cfg_system.follow_sets[source]
-                for terminal in source_follow_set:
-                    self.set(source, terminal, prod)
-                continue
-
-                # deal with item in first set
-            target_first_set = self.cfg_system.first_sets[target.pieces[0]]
-            for terminal in target_first_set:
-                self.set(source, terminal, prod)
+                lookahead_mask = cfg.EPSILON_BIT
+            else:
+                lookahead_mask = self.cfg_system.calc_first_mask_of_pieces(target.pieces)
+            if lookahead_mask & cfg.EPSILON_BIT:
+                lookahead_mask = (lookahead_mask & ~cfg.EPSILON_BIT) | self.cfg_system.follow_masks[source]
 
-            # if first set could be epsilon, then add epsilon set
-            if not (None in target_first_set):
-                continue
-            target_follow_set = self.cfg_system.follow_sets[target.pieces[0]]
-            for terminal in target_follow_set:
+            for terminal in self.cfg_system.mask_to_set(lookahead_mask):
                 self.set(source, terminal, prod)
 
+    def dump(self) -> dict:
+        """
+        Return the parse table as JSON serializable data, list of (non-terminal id, terminal id, production index).
+        """
+        production_index_dict = {id(prod): index for index, prod in enumerate(self.cfg_system.production_list)}
+        return {
+            'moves': [
+                [non_terminal.id, terminal.id, production_index_dict[id(production)]]
+                for non_terminal, row in self.parse_dict.items()
+                for terminal, production in row.items()
+            ],
+        }
+
+    @classmethod
+    def load(cls, cfg_system: cfg.CFGSystem, data: dict) -> 'LLParseTable':
+        """
+        Create the parse table from the result of ``dump()`` of the same CFG, without generating it.
+
+        Exceptions:
+
+        - ``ValueError`` If the data is not consistent with the CFG.
+        """
+        if cfg_system.entry is None:
+            raise general_err.EntryUndefinedError()
+
+        parse_table = cls.__new__(cls)
+        parse_table.cfg_system = cfg_system
+        parse_table.parse_dict = {}
+        symbols = cfg_system.symbols
+        production_list = cfg_system.production_list
+        try:
+            for non_terminal_id, terminal_id, production_index in data['moves']:
+                if terminal_id <= 0 or production_index < 0:
+                    raise IndexError(terminal_id, production_index)
+                production = production_list[production_index]
+                # the move must derive the non-terminal
+                if production.source.id != non_terminal_id:
+                    raise ValueError('LL parse table does not match the CFG')
+                parse_table.parse_dict.setdefault(production.source, {})[symbols.terminals[terminal_id]] = production
+        except (KeyError, TypeError, IndexError) as e:
+            raise ValueError('Invalid data of LL parse table') from e
+        return parse_table
+
     def get(self, non_terminal: cfg.NonTerminal, lookahead: cfg.Terminal | TokenPair) -> cfg.Production:
         """
         Try get item from parse dict
@@ -68,10 +105,12 @@ class LLParseTable:
 
         Raise ``DerivationNotFoundError`` when item not found in parse table.
         """
-        # convert token pair to Terminal instance if needed
+        # convert token pair to the interned Terminal instance if needed
         terminal: cfg.Terminal = lookahead
         if isinstance(lookahead, TokenPair):
-            terminal = cfg.Terminal(name=lookahead.token_type)
+            terminal = self.cfg_system.symbols.get_terminal(lookahead.token_type)
+            if terminal is None:
+                raise NoValidMove(non_terminal, lookahead.to_terminal())
 
         try:
             return self.parse_dict[non_terminal][terminal]
@@ -109,23 +148,68 @@ class LLParseTable:
 
 
 class LLParser:
+    """
+    LL(1) parser driven by ``LLParseTable``.
+
+    Nodes of parse tree that are predicted but not yet matched are kept in a prediction stack, with the left-most one
+    at the top. Each step pops the top node, derives it if NonTerminal, or matches it with the lookahead token if
+    Terminal. The ``leaves`` of parse tree holds the matched Terminal nodes, in the order of input tokens.
+    """
     parse_table: LLParseTable
 
     _token_list: list[TokenPair]
     _parsed_count: int
     _total_token_count: int
     _parse_tree: ParseTree
+
+    # predicted nodes that are not matched or derived yet, the left-most one at the top of stack
+    _prediction_stack: list[ParseTreeNode]
+
     _lookahead: TokenPair | None
     _epsilon_terminal: cfg.Terminal | None
 
-    def __init__(self, cfg_system: cfg.CFGSystem, epsilon_terminal: cfg.Terminal | None = None):
+    def __init__(
+            self,
+            cfg_system: cfg.CFGSystem,
+            epsilon_terminal: cfg.Terminal | None = None,
+            cache: ParserCache | None = None,
+    ):
+        """
+        Params:
+
+        - ``cache`` If provided, the parse table is loaded from it when the CFG is cached, otherwise the generated
+          parse table, FIRST and FOLLOW sets are stored to it.
+        """
         self._epsilon_terminal = epsilon_terminal
+        if cache is not None and self._load_table(cfg_system, cache):
+            return
+
         try:
             # init parse table
             self.parse_table = LLParseTable(cfg_system)
         except Exception as e:
             raise general_err.CFGIncompatibleError(parser_type='LL(1)') from e
 
+        if cache is not None:
+            cache.store(cfg_system, 'll_table', self.parse_table.dump())
+            cache.store_analysis(cfg_system)
+
+    def _load_table(self, cfg_system: cfg.CFGSystem, cache: ParserCache) -> bool:
+        """
+        Load the parse table from cache, return False if not cached or invalid. FIRST and FOLLOW sets are also
+        loaded if cached.
+        """
+        cache.load_analysis(cfg_system)
+        data = cache.load(cfg_system, 'll_table')
+        if data is None:
+            return False
+        try:
+            self.parse_table = LLParseTable.load(cfg_system, data)
+        except ValueError as e:
+            logger.warning(f'Ignore cached LL(1) parse table: {e}')
+            return False
+        return True
+
     def init_state(self, token_list: list[TokenPair]) -> None:
         """
         Initialize parser for next parsing.
@@ -138,11 +222,13 @@ class LLParser:
         entry_piece = self.parse_table.cfg_system.entry
         if entry_piece is None:
             raise general_err.EntryUndefinedError()
-        self._parse_tree = ParseTree(
-            start_nodes=[ParseTreeNode(node_type=self.parse_table.cfg_system.entry)],
-            epsilon_terminal=self._epsilon_terminal,
-        )
-        self._lookahead = self._token_list[0]
+        entry_node = ParseTreeNode(node_type=entry_piece)
+        self._parse_tree = ParseTree(start_nodes=[entry_node], epsilon_terminal=self._epsilon_terminal)
+
+        # leaves are pushed when matched, pending nodes are on the prediction stack
+        self._parse_tree.leaves = []
+        self._prediction_stack = [entry_node]
+        self._lookahead = self._token_list[0] if self._total_token_count > 0 else None
 
     def parse_token(self, token_list: list[TokenPair]) -> ParseTree:
         """
@@ -157,84 +243,54 @@ class LLParser:
         """
         self.init_state(token_list)
 
-        # set token list
-        self._token_list = copy(token_list)
-
         # loop while not fully parsed
-        while self._total_token_count > self._parsed_count:
-            self._match_terminal_forward()
-            self._derive_leftmost_non_terminal()
-
-        # check if parse tree valid
-        if not self._parse_tree.is_valid():
+        while self._total_token_count > self._parsed_count and len(self._prediction_stack) > 0:
+            node = self._prediction_stack.pop()
+            if isinstance(node.node_type, cfg.NonTerminal):
+                self._derive_non_terminal(node)
+            else:
+                self._match_terminal(node)
+
+        # check if parse tree valid, all tokens matched and no node pending
+        if self._total_token_count > self._parsed_count or len(self._prediction_stack) > 0:
             raise general_err.InvalidParseTreeError(self._parse_tree)
 
         return self._parse_tree
 
-    def _derive_leftmost_non_terminal(self):
-        non_terminal_info = self._parse_tree.get_first_non_terminal_info()
-        # no terminal found
-        if non_terminal_info is None:
-            return
-            # retrieve info
-        index = non_terminal_info[0]
-        node = non_terminal_info[1]
-
-        # get source of production
-        source = node.node_type
-        if not isinstance(source, cfg.NonTerminal):
-            raise general_err.DerivationError(source)
-
+    def _derive_non_terminal(self, node: ParseTreeNode):
+        """
+        Derive the NonTerminal node by the production in parse table, and push its children to the prediction stack.
+        """
         # use parse table to get move
-        move_info = self.parse_table.get(source, self._lookahead)
+        move_info = self.parse_table.get(node.node_type, self._lookahead)
 
-        # update parse tree
-        new_pieces = move_info.target.pieces
-        self._parse_tree.derive_non_terminal(index, new_pieces)
+        # update parse tree, the left-most child should be at the top of stack
+        new_nodes = self._parse_tree.derive_node(node, move_info.target.pieces, move_info)
+        self._prediction_stack.extend(reversed(new_nodes))
 
-    def _match_terminal_forward(self):
+    def _match_terminal(self, node: ParseTreeNode):
         """
-        Try match token list with terminal leaves in parse tree.
+        Try match the lookahead token with the Terminal node.
 
         If match success, will update ``_parsed_count`` and ``lookahead``
 
         Exceptions:
         - ``TokenNotMatchError``
-        :return:
         """
-        info = self._parse_tree.get_first_non_terminal_info()
-
-        # match range: [match_start, match_end)
-        match_start: int = self._parsed_count
-        match_end: int = -1
-        if info is None:
-            match_end = self._total_token_count
-        else:
-            match_end = info[0]
-
-        # skip if no need to forward
-        if match_start >= match_end:
-            return
-
-            # loop to check if all newly derived terminal match the corresponding token pair
-        for idx in range(match_start, match_end):
-            # retrieve info
-            token_pair = self._token_list[idx]
-            node_type: cfg.Piece = self._parse_tree.leaves[idx].node_type
-
-            node_type: cfg.Terminal  # it should be terminal if the get_first_non_terminal_info() method is correct
-            is_match = token_pair.is_match(node_type)
+        token_pair = self._lookahead
+        node_type: cfg.Terminal = node.node_type
 
-            # if piece and token not match, raise error
-            if not is_match:
-                raise general_err.TokenNotMatchError(token=self._token_list[idx], piece=node_type, index=idx)
+        # if piece and token not match, raise error
+        if not token_pair.is_match(node_type):
+            raise general_err.TokenNotMatchError(token=token_pair, piece=node_type, index=self._parsed_count)
 
         # match success, update parsed index and lookahead
-        self._parsed_count = match_end
+        self._parse_tree.leaves.append(node)
+        self._parsed_count += 1
         if self._parsed_count >= self._total_token_count:
             self._lookahead = None
         else:
-            self._lookahead = self._token_list[match_end]
+            self._lookahead = self._token_list[self._parsed_count]
 
 
 class NoValidMove(Exception):
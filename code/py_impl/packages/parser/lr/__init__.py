@@ -1,2 +1,5 @@
 from .stack_automata import *
+from .precedence import *
+from .parse_table import *
 from .parser_lr import *
+from .parser_glr import *
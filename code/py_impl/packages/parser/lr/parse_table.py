@@ -0,0 +1,259 @@
+from cfg import *
+from .stack_automata import StackAutomaton
+from .precedence import PrecedenceTable
+
+__all__ = [
+    'LRParseTable',
+]
+
+
+class LRParseTable:
+    """
+    ACTION and GOTO tables of LR parser compiled from a Stack Automaton, with states, terminals, non-terminals and
+    productions all represented by ints.
+
+    ACTION:
+
+    ``action[state][terminal_id]``, terminal id is given by ``CFGSystem.symbols``, and id 0 (the bit index of
+    EPSILON_BIT) represents the end of input.
+
+    - ``0`` Error.
+    - ``> 0`` Shift, then move to state ``action - 1``.
+    - ``< 0`` Reduce by production ``-action - 1``, the index in ``CFGSystem.production_list``. Reduce by the entry
+    production accepts the input.
+
+    GOTO:
+
+    ``goto[state][non_terminal_id]`` is the state to move to after reducing to the non-terminal, -1 if none.
+
+    Conflicts:
+
+    Shift/reduce conflict between a single reduce and the shift is resolved by ``precedence`` first (checkout
+    ``PrecedenceTable``), and not recorded. Cells with more than one action that precedence could not resolve are
+    recorded in ``conflicts`` with all of their actions. Remaining shift/reduce conflict is resolved as reduce.
+    Reduce/reduce conflict is left as error in ACTION, parser should check ``conflicts`` to report it.
+
+    Unit productions:
+
+    If ``skip_unit_productions`` is enabled, ``unit_sources`` gives the source id of each unit production ``A -> B``
+    (B is NonTerminal). After reducing to B, parser could look up the ACTION of the GOTO state on the lookahead, and if
+    it is a reduction by ``A -> B``, go to the GOTO state of A directly. The stack is the same as reducing by the unit
+    production, but the state is never pushed and no parse tree node is created for it.
+    """
+    action: list[list[int]]
+
+    goto: list[list[int]]
+
+    # count of target pieces of each production
+    reduce_sizes: list[int]
+
+    # id of source of each production
+    reduce_sources: list[int]
+
+    # index of the entry production
+    entry_production: int
+
+    start_state: int
+
+    # (state, terminal id) -> all actions of the cell, only for cells with more than one action
+    conflicts: dict[tuple[int, int], list[int]]
+
+    # precedence declarations to resolve shift/reduce conflicts, None if not provided
+    precedence: PrecedenceTable | None
+
+    # source id of each unit production that could be skipped, -1 for other productions. None if not enabled
+    unit_sources: list[int] | None
+
+    _cfg_sys: CFGSystem
+
+    def __init__(
+            self,
+            stack_automaton: StackAutomaton,
+            precedence: PrecedenceTable | None = None,
+            skip_unit_productions: bool = False,
+    ):
+        cfg_sys = stack_automaton.cfg_sys
+        self._cfg_sys = cfg_sys
+        self.precedence = precedence
+        production_index_dict = {id(prod): index for index, prod in enumerate(cfg_sys.production_list)}
+        terminal_count = len(cfg_sys.symbols.terminals)
+        non_terminal_count = len(cfg_sys.symbols.non_terminals)
+
+        self.reduce_sizes = [len(prod.target.pieces or []) for prod in cfg_sys.production_list]
+        self.reduce_sources = [prod.source.id for prod in cfg_sys.production_list]
+        self.entry_production = production_index_dict[id(stack_automaton.get_entry_item().core.production)]
+        self.start_state = stack_automaton.start_state.sid
+        self.unit_sources = None
+        if skip_unit_productions:
+            self.unit_sources = [
+                prod.source.id if self.is_unit_production(prod) and index != self.entry_production else -1
+                for index, prod in enumerate(cfg_sys.production_list)
+            ]
+        self.action = []
+        self.goto = []
+        self.conflicts = {}
+
+        for state in stack_automaton.states:
+            # terminal id -> actions
+            cell_actions: dict[int, list[int]] = {}
+            goto_row = [-1] * non_terminal_count
+
+            for piece, next_state in state.transitions.items():
+                if isinstance(piece, Terminal):
+                    cell_actions.setdefault(piece.id, []).append(self.shift_action(next_state.sid))
+                else:
+                    goto_row[piece.id] = next_state.sid
+
+            for item in state.items:
+                if not item.core.all_matched():
+                    continue
+                action = self.reduce_action(production_index_dict[id(item.core.production)])
+                # None lookahead, reduce on any terminal
+                if item.lookahead is None:
+                    terminal_ids = range(terminal_count)
+                else:
+                    terminal_ids = self.mask_to_ids(item.lookahead)
+                for terminal_id in terminal_ids:
+                    cell_actions.setdefault(terminal_id, []).append(action)
+
+            action_row = [0] * terminal_count
+            for terminal_id, actions in cell_actions.items():
+                action_row[terminal_id] = self._resolve_conflict(state.sid, terminal_id, actions)
+
+            self.action.append(action_row)
+            self.goto.append(goto_row)
+
+    def _resolve_conflict(self, state: int, terminal_id: int, actions: list[int]) -> int:
+        """
+        Return the action of the cell, record the actions in ``conflicts`` if more than one.
+        """
+        if len(actions) == 1:
+            return actions[0]
+
+        reduce_actions = [action for action in actions if action < 0]
+
+        # shift/reduce conflict with declared precedence
+        if self.precedence is not None and len(reduce_actions) == 1 and terminal_id > 0:
+            resolution = self.precedence.resolve(
+                self._cfg_sys.production_list[-reduce_actions[0] - 1],
+                self._cfg_sys.symbols.terminals[terminal_id],
+            )
+            if resolution is not None:
+                if resolution > 0:
+                    return next(action for action in actions if action > 0)
+                return reduce_actions[0] if resolution < 0 else 0
+
+        self.conflicts[(state, terminal_id)] = actions
+        if len(reduce_actions) == 1:
+            return reduce_actions[0]
+        return 0
+
+    def dump(self) -> dict:
+        """
+        Return the tables as JSON serializable data, checkout ``load()``.
+        """
+        return {
+            'action': self.action,
+            'goto': self.goto,
+            'reduce_sizes': self.reduce_sizes,
+            'reduce_sources': self.reduce_sources,
+            'entry_production': self.entry_production,
+            'start_state': self.start_state,
+            'conflicts': [[state, terminal_id, actions] for (state, terminal_id), actions in self.conflicts.items()],
+            'unit_sources': self.unit_sources,
+        }
+
+    @classmethod
+    def load(cls, cfg_sys: CFGSystem, data: dict, precedence: PrecedenceTable | None = None) -> 'LRParseTable':
+        """
+        Create the tables from the result of ``dump()`` of the same CFG, without the Stack Automaton.
+
+        Exceptions:
+
+        - ``ValueError`` If the data is not consistent with the CFG, or any action or state is out of range.
+        """
+        try:
+            parse_table = cls._load_unchecked(cfg_sys, data, precedence)
+            parse_table._check(cfg_sys)
+        except (KeyError, TypeError, IndexError) as e:
+            raise ValueError('Invalid data of LR parse table') from e
+        return parse_table
+
+    @classmethod
+    def _load_unchecked(cls, cfg_sys: CFGSystem, data: dict, precedence: PrecedenceTable | None) -> 'LRParseTable':
+        parse_table = cls.__new__(cls)
+        parse_table._cfg_sys = cfg_sys
+        parse_table.precedence = precedence
+        parse_table.action = data['action']
+        parse_table.goto = data['goto']
+        parse_table.reduce_sizes = data['reduce_sizes']
+        parse_table.reduce_sources = data['reduce_sources']
+        parse_table.entry_production = data['entry_production']
+        parse_table.start_state = data['start_state']
+        parse_table.conflicts = {(state, terminal_id): actions for state, terminal_id, actions in data['conflicts']}
+        parse_table.unit_sources = data['unit_sources']
+        return parse_table
+
+    def _check(self, cfg_sys: CFGSystem) -> None:
+        """
+        Raise ValueError if the tables could not be used by the CFG.
+        """
+        production_count = len(cfg_sys.production_list)
+        terminal_count = len(cfg_sys.symbols.terminals)
+        non_terminal_count = len(cfg_sys.symbols.non_terminals)
+        state_count = len(self.action)
+
+        # productions are checked against the CFG
+        if (
+            self.reduce_sizes != [len(prod.target.pieces or []) for prod in cfg_sys.production_list]
+            or self.reduce_sources != [prod.source.id for prod in cfg_sys.production_list]
+            or not 0 <= self.entry_production < production_count
+            or not 0 <= self.start_state < state_count
+            or len(self.goto) != state_count
+        ):
+            raise ValueError('LR parse table does not match the CFG')
+
+        # each action is a shift to an existing state, or a reduce by an existing production
+        for action_row in self.action:
+            if len(action_row) != terminal_count:
+                raise ValueError('LR parse table does not match the CFG')
+            if len(action_row) > 0 and not (-production_count <= min(action_row) and max(action_row) <= state_count):
+                raise ValueError('Action out of range in LR parse table')
+        for goto_row in self.goto:
+            if len(goto_row) != non_terminal_count:
+                raise ValueError('LR parse table does not match the CFG')
+            if len(goto_row) > 0 and not (-1 <= min(goto_row) and max(goto_row) < state_count):
+                raise ValueError('Goto state out of range in LR parse table')
+        if self.unit_sources is not None and len(self.unit_sources) != production_count:
+            raise ValueError('LR parse table does not match the CFG')
+
+    @staticmethod
+    def is_unit_production(production: Production) -> bool:
+        """
+        Return True if the production is in form of ``A -> B``, where B is a NonTerminal other than A.
+        """
+        pieces = production.target.pieces
+        return (
+            pieces is not None and len(pieces) == 1 and isinstance(pieces[0], NonTerminal)
+            and pieces[0] != production.source
+        )
+
+    @staticmethod
+    def shift_action(state: int) -> int:
+        return state + 1
+
+    @staticmethod
+    def reduce_action(production_index: int) -> int:
+        return -production_index - 1
+
+    @staticmethod
+    def mask_to_ids(mask: int) -> list[int]:
+        """
+        Return indices of the set bits of a bitmask, that is the terminal ids in the mask.
+        """
+        terminal_ids: list[int] = []
+        while mask:
+            lowest_bit = mask & -mask
+            terminal_ids.append(lowest_bit.bit_length() - 1)
+            mask ^= lowest_bit
+        return terminal_ids
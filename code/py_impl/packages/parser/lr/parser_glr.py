@@ -0,0 +1,314 @@
+import json
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+from loguru import logger
+
+from cfg import *
+from lexical_analyzer import TokenPair
+
+from ..cache import ParserCache
+from ..parse_forest import *
+from ..parse_tree import ParseTree
+from .stack_automata import *
+from .precedence import *
+from .parser_lr import LRParserBase
+from .. import errors as general_err
+
+__all__ = [
+    'GLRParser',
+    'GSSNode',
+    'NoViableStackError',
+]
+
+
+@dataclass(eq=False)
+class GSSNode:
+    """
+    Node of graph-structured stack, a state of the stack automaton at a level (count of shifted tokens).
+
+    Each (state, level) has only one node, stacks that reach the same state at the same level are merged.
+    """
+    state: int
+    level: int
+
+    # previous node -> forest node of the piece between them, the edge points toward the bottom of stack
+    edges: dict['GSSNode', ForestNode] = field(default_factory=dict)
+
+    def __repr__(self) -> str:
+        return f'GSSNode({self.state}, {self.level})'
+
+
+class GLRParser(LRParserBase):
+    """
+    Generalized LR parser, works with any CFG including ambiguous ones, on the same ACTION/GOTO tables as LR parsers.
+
+    All actions of a conflict cell of ACTION table (checkout ``LRParseTable.conflicts``) are performed, forking the
+    stack. Stacks are kept in a graph-structured stack, those reaching the same state after the same tokens are merged
+    into one node. Results are built as a shared packed parse forest (checkout ``ParseForest``), so ambiguous input is
+    parsed in polynomial time, even if it has exponentially many parse trees.
+
+    Conflicts resolved by precedence declarations are not forked, which could be used to cut unwanted ambiguity.
+
+    Tables are compiled from LALR automaton by default, or from canonical LR(1) automaton with ``canonical=True``.
+    Reductions of the entry production are only performed at the end of input.
+    """
+    _parser_type = 'GLR'
+
+    # generate tables from canonical LR(1) automaton instead of LALR automaton
+    canonical: bool
+
+    # nodes of forest of current parsing, (piece, start, end) -> node
+    _forest_nodes: dict[tuple[Piece, int, int], ForestNode]
+
+    # packed nodes of forest of current parsing, to avoid adding the same alternative twice
+    _packed_keys: set[tuple[int, int, tuple[int, ...]]]
+
+    def __init__(
+            self,
+            cfg_sys: CFGSystem,
+            epsilon_terminal: Terminal | None = None,
+            precedence: PrecedenceTable | None = None,
+            canonical: bool = False,
+            cache: ParserCache | None = None,
+    ):
+        self.canonical = canonical
+        super().__init__(cfg_sys, epsilon_terminal=epsilon_terminal, precedence=precedence, cache=cache)
+
+    def parse(self, token_list: list[TokenPair]) -> ParseTree:
+        """
+        Parse the input tokens, return one of the parse trees. Checkout ``ParseForest.to_parse_tree()``.
+        """
+        return self.parse_forest(token_list).to_parse_tree()
+
+    def parse_iter(self, tokens: Iterable[TokenPair]) -> ParseTree:
+        return self.parse_forest(tokens).to_parse_tree()
+
+    def parse_forest(self, tokens: Iterable[TokenPair]) -> ParseForest:
+        """
+        Parse the input tokens from any iterable, return the shared packed parse forest of all parse trees.
+
+        Tokens are pulled one by one, each is shifted by all alive stacks at once.
+
+        Exceptions:
+
+        - ``NoViableStackError`` If all stacks died before the input is accepted.
+        """
+        token_iter = iter(tokens)
+        lookahead = next(token_iter, None)
+        level = 0
+
+        self._forest_nodes = {}
+        self._packed_keys = set()
+
+        frontier: dict[int, GSSNode] = {self.parse_table.start_state: GSSNode(self.parse_table.start_state, 0)}
+        while True:
+            terminal_id = 0 if lookahead is None else self.cfg_sys.symbols.get_terminal_id(lookahead.token_type)
+            shifts, roots = self._reduce_level(frontier, level, terminal_id)
+
+            if lookahead is None:
+                if len(roots) == 0:
+                    raise NoViableStackError(None, level)
+                return ParseForest(roots[0], epsilon_terminal=self._epsilon_terminal)
+
+            if len(shifts) == 0:
+                raise NoViableStackError(lookahead, level)
+
+            # shift the lookahead by all stacks at once, stacks moving to the same state are merged
+            terminal_node = ForestNode(self._token_to_terminal(lookahead), level, level + 1, token=lookahead)
+            frontier = {}
+            for node, next_state in shifts:
+                next_node = frontier.get(next_state)
+                if next_node is None:
+                    next_node = frontier[next_state] = GSSNode(next_state, level + 1)
+                next_node.edges[node] = terminal_node
+
+            lookahead = next(token_iter, None)
+            level += 1
+
+    def _get_actions(self, state: int, terminal_id: int) -> list[int]:
+        """
+        Return all actions of the cell, including all actions of conflicts.
+        """
+        if terminal_id < 0:
+            return []
+        actions = self.parse_table.conflicts.get((state, terminal_id))
+        if actions is not None:
+            return actions
+        action = self.parse_table.action[state][terminal_id]
+        return [action] if action != 0 else []
+
+    def _reduce_level(
+            self,
+            frontier: dict[int, GSSNode],
+            level: int,
+            terminal_id: int,
+    ) -> tuple[list[tuple[GSSNode, int]], list[ForestNode]]:
+        """
+        Perform all reductions on the nodes of the level with the lookahead, nodes created by reductions are added to
+        ``frontier``.
+
+        Rets:
+
+        - List of (node, next state) to shift the lookahead.
+        - Forest nodes of the entry, if the entry production is reduced at the end of input.
+        """
+        entry_production = self.parse_table.entry_production
+        reduce_sizes = self.parse_table.reduce_sizes
+
+        shifts: list[tuple[GSSNode, int]] = []
+        roots: list[ForestNode] = []
+        # nodes of this level whose actions have been performed
+        processed: list[GSSNode] = []
+        worklist: list[GSSNode] = list(frontier.values())
+        # pending reductions, (node, production index, the edge that paths must go through or None)
+        reductions: list[tuple[GSSNode, int, tuple[GSSNode, GSSNode] | None]] = []
+
+        while len(worklist) > 0 or len(reductions) > 0:
+            if len(reductions) == 0:
+                node = worklist.pop()
+                processed.append(node)
+                for action in self._get_actions(node.state, terminal_id):
+                    if action > 0:
+                        shifts.append((node, action - 1))
+                    elif -action - 1 != entry_production or terminal_id == 0:
+                        reductions.append((node, -action - 1, None))
+                continue
+
+            node, production_index, required_edge = reductions.pop()
+            for end_node, children in self._find_paths(node, reduce_sizes[production_index], required_edge):
+                if production_index == entry_production:
+                    roots.append(self._add_alternative(production_index, end_node.level, level, children))
+                    continue
+
+                new_edge = self._goto(frontier, worklist, end_node, production_index, level, children)
+                if new_edge is None:
+                    continue
+                # a new edge to an existing node, redo the reductions of processed nodes that go through it.
+                # nodes in worklist will find the edge when processed.
+                for processed_node in processed:
+                    for action in self._get_actions(processed_node.state, terminal_id):
+                        if action < 0 and reduce_sizes[-action - 1] > 0 and -action - 1 != entry_production:
+                            reductions.append((processed_node, -action - 1, new_edge))
+
+        return shifts, roots
+
+    def _goto(
+            self,
+            frontier: dict[int, GSSNode],
+            worklist: list[GSSNode],
+            end_node: GSSNode,
+            production_index: int,
+            level: int,
+            children: tuple[ForestNode, ...],
+    ) -> tuple[GSSNode, GSSNode] | None:
+        """
+        Add the reduced piece on top of ``end_node``, merging into the existing node of the GOTO state.
+
+        Rets:
+
+        The new edge if it is added to a node already in ``frontier``, which may open new reduction paths. None
+        otherwise, including a new node is created.
+        """
+        next_state = self.parse_table.goto[end_node.state][self.parse_table.reduce_sources[production_index]]
+        if next_state < 0:
+            return None
+
+        forest_node = self._add_alternative(production_index, end_node.level, level, children)
+        next_node = frontier.get(next_state)
+        if next_node is None:
+            next_node = frontier[next_state] = GSSNode(next_state, level)
+            next_node.edges[end_node] = forest_node
+            worklist.append(next_node)
+            return None
+
+        if end_node in next_node.edges:
+            # the edge is labeled by the same forest node, only a new alternative is added
+            return None
+
+        next_node.edges[end_node] = forest_node
+        return next_node, end_node
+
+    @staticmethod
+    def _find_paths(
+            node: GSSNode,
+            length: int,
+            required_edge: tuple[GSSNode, GSSNode] | None = None,
+    ) -> list[tuple[GSSNode, tuple[ForestNode, ...]]]:
+        """
+        Return all paths of ``length`` edges from the node toward the bottom, as (end node, forest nodes of the
+        edges from left to right). If ``required_edge`` is given, only paths through it are returned.
+        """
+        paths: list[tuple[GSSNode, tuple[ForestNode, ...]]] = []
+
+        # (node, remaining length, forest nodes from right to left, passed required edge)
+        path_stack: list[tuple[GSSNode, int, tuple[ForestNode, ...], bool]] = [
+            (node, length, (), required_edge is None)
+        ]
+        while len(path_stack) > 0:
+            current, remaining, labels, passed = path_stack.pop()
+            if remaining == 0:
+                if passed:
+                    paths.append((current, tuple(reversed(labels))))
+                continue
+            for previous, forest_node in current.edges.items():
+                path_stack.append((
+                    previous,
+                    remaining - 1,
+                    labels + (forest_node,),
+                    passed or (current is required_edge[0] and previous is required_edge[1]),
+                ))
+
+        return paths
+
+    def _add_alternative(
+            self,
+            production_index: int,
+            start: int,
+            end: int,
+            children: tuple[ForestNode, ...],
+    ) -> ForestNode:
+        """
+        Return the forest node of the source of production over ``[start, end)``, with the alternative added.
+        """
+        production = self.cfg_sys.production_list[production_index]
+        key = (production.source, start, end)
+        forest_node = self._forest_nodes.get(key)
+        if forest_node is None:
+            forest_node = self._forest_nodes[key] = ForestNode(production.source, start, end)
+
+        packed_key = (id(forest_node), production_index, tuple(id(child) for child in children))
+        if packed_key not in self._packed_keys:
+            self._packed_keys.add(packed_key)
+            forest_node.alternatives.append((production, children))
+        return forest_node
+
+    def _report_reduce_conflicts(self):
+        """
+        Conflicts are expected for GLR parser, they are only logged in debug level.
+        """
+        self.reduce_conflicts = self.stack_automaton.find_reduce_conflicts()
+        for state, conflict_items in self.reduce_conflicts:
+            logger.debug(f'Reduce-Reduce conflict in state {state.sid} of GLR parser: {conflict_items}')
+
+    def _get_cache_params(self) -> str:
+        """
+        Tables of canonical LR(1) and LALR automaton are cached separately.
+        """
+        return json.dumps([super()._get_cache_params(), self.canonical], separators=(',', ':'))
+
+    def _generate_automaton(self):
+        self.stack_automaton = StackAutomaton(self.cfg_sys) if self.canonical else LALRAutomaton(self.cfg_sys)
+
+
+class NoViableStackError(general_err.ParseErrorBase):
+    """
+    Raise when all stacks of GLR parser died, the input could not be derived from entry of the CFG.
+    """
+
+    def __init__(self, token: TokenPair | None, index: int):
+        if token is None:
+            message = f'All stacks of GLR parser died at the end of input, after {index} tokens.'
+        else:
+            message = f'All stacks of GLR parser died on token {token.token_type} {token.content!r} at index {index}.'
+        super().__init__(message)
@@ -1,19 +1,25 @@
+import json
+from collections.abc import Iterable, Iterator
 from copy import copy
 from dataclasses import dataclass
 from loguru import logger
 
 from cfg import *
-from automata import FA, FANode
-from automata.visualize import FADiGraph
 from lexical_analyzer import TokenPair
 
 from ..items import *
 from ..parse_tree import *
 from .stack_automata import *
+from .parse_table import *
+from .precedence import *
+from ..cache import ParserCache
 from .. import errors as general_err
 
 __all__ = [
-    'LRParserBase'
+    'LRParserBase',
+    'CLRParser',
+    'LALRParser',
+    'SLRParser',
 ]
 
 
@@ -26,8 +32,22 @@ class LRParserBase:
     To create new LR Parser, we need to re-write the following methods:
 
     - ``_generate_automaton()`` Rewrite to generate the proper Stack Automaton for the LR Parser.
-    - ``_get_lookahead()`` Rewrite if you want to decide how to convert a token to its corresponding lookahead instance.
-    - ``_is_lookahead_match()`` Determine how to judge whether current lookahead match the requirement of the Item.
+
+    The automaton is compiled into ACTION/GOTO tables (checkout ``LRParseTable``) after generated, and the parser only
+    looks up the tables when parsing. Shift/reduce conflicts of ambiguous CFG, e.g. ``E -> E + E | E * E``, could be
+    resolved by passing a ``PrecedenceTable``.
+
+    Unit Productions:
+
+    With ``skip_unit_productions=True``, reductions by unit productions like ``E -> T`` are skipped (checkout
+    ``LRParseTable``), no node is created for them. The skipped productions are recorded in ``skipped_units`` of the
+    node reduced before them, call ``ParseTree.restore_unit_chains()`` to get the full parse tree back.
+
+    Cache:
+
+    With a ``ParserCache``, the tables are loaded from it if the same CFG has been compiled by the same type of parser
+    with the same options before, and the Stack Automaton is generated only when it is accessed. Otherwise, the
+    tables, FIRST and FOLLOW sets are stored to it after generated.
 
     Fields:
     - ``_parser_type`` The string that represents the type of the parser. E.g.: SLR, CLR, ...
@@ -36,13 +56,14 @@ class LRParserBase:
 
     _parser_type: str = 'Base LR'
 
-    _token_list: list[TokenPair]
+    # unexamined input tokens, pulled one by one when the lookahead is shifted
+    _tokens: Iterator[TokenPair]
 
-    # working stack of this parser
-    _stack: list[ParserStackItem]
+    # the lookahead token, None if end of input
+    _lookahead: TokenPair | None
 
-    # list of unexamined token of the parser
-    _unexamined: list[TokenPair]
+    # working stack of this parser, states of the stack automaton with the start state at the bottom
+    _stack: list[int]
 
     # parse tree object for the parser.
     _parse_tree: ParseTree
@@ -50,231 +71,290 @@ class LRParserBase:
     # a terminal that used to represent the epsilon derivation in parse tree.
     _epsilon_terminal: Terminal | None
 
-    # store the stack automaton for this parser
-    stack_automaton: StackAutomaton
+    # the stack automaton for this parser, None if the tables are loaded from cache and it is not accessed yet
+    _stack_automaton: StackAutomaton | None
+
+    # states with reduce/reduce conflicts, and the conflict items of each state
+    reduce_conflicts: list[tuple[LRState, list[Item]]]
+
+    # ACTION/GOTO tables compiled from the stack automaton
+    parse_table: LRParseTable
+
+    # precedence declarations used when compiling the tables
+    precedence: PrecedenceTable | None
+
+    # skip reductions by unit productions when parsing
+    skip_unit_productions: bool
 
     def __init__(
             self,
             cfg_sys: CFGSystem,
             epsilon_terminal: Terminal | None = None,
+            precedence: PrecedenceTable | None = None,
+            skip_unit_productions: bool = False,
+            cache: ParserCache | None = None,
     ):
         self.cfg_sys = cfg_sys
         self._epsilon_terminal = epsilon_terminal
+        self.precedence = precedence
+        self.skip_unit_productions = skip_unit_productions
+        self._stack_automaton = None
+
+        if cache is not None and self._load_table(cache):
+            return
+
         self._generate_automaton()
+        self._report_reduce_conflicts()
+        self._generate_table()
+        if cache is not None:
+            cache.store(self.cfg_sys, 'lr_table', self.parse_table.dump(), params=self._get_cache_params())
+            cache.store_analysis(self.cfg_sys)
+
+    @property
+    def stack_automaton(self) -> StackAutomaton:
+        """
+        The Stack Automaton of this parser, generated on first access if the tables are loaded from cache.
+        """
+        if self._stack_automaton is None:
+            self._generate_automaton()
+        return self._stack_automaton
+
+    @stack_automaton.setter
+    def stack_automaton(self, stack_automaton: StackAutomaton) -> None:
+        self._stack_automaton = stack_automaton
 
-    def init_state(self, token_list: list[TokenPair]) -> 'LRParserBase':
+    def init_state(self, tokens: Iterable[TokenPair]) -> 'LRParserBase':
         """
-        Prepare the parser, make it ready to parse the input list of token.
+        Prepare the parser, make it ready to parse the input tokens.
+
+        Only the first token is pulled here, the parse tree starts empty and leaf nodes are added on shift.
         """
-        # shadow copy the received token list.
-        self._token_list = token_list[:]
-        self._unexamined = token_list[:]
+        self._tokens = iter(tokens)
+        self._lookahead = next(self._tokens, None)
         # initialize the stack
-        self._stack = []
-
-        # initialize parse tree
-        parse_tree_nodes: list[ParseTreeNode] = []
-        # convert all tokens in token_list into ParseTreeNode.
-        for token in self._token_list:
-            parse_tree_nodes.append(
-                ParseTreeNode(node_type=token.to_terminal(), node_content=token)
-            )
-        # init parse tree.
-        self._parse_tree = ParseTree(
-            parse_tree_nodes,
-            epsilon_terminal=self._epsilon_terminal,
-        )
+        self._stack = [self.parse_table.start_state]
+        self._parse_tree = ParseTree([], epsilon_terminal=self._epsilon_terminal)
 
         return self
 
     def parse(self, token_list: list[TokenPair]) -> ParseTree | None:
+        return self.parse_iter(token_list)
+
+    def parse_iter(self, tokens: Iterable[TokenPair]) -> ParseTree:
+        """
+        Parse the input tokens from any iterable, e.g. a generator of a lexer.
+
+        Tokens are pulled only when the lookahead is shifted, so lexing and parsing could be overlapped, and the input
+        is never held as a whole.
+
+        Notice:
+
+        When parsing finished, the iterator has been advanced by one token after the last shifted one, to check the
+        end of input. On error, the tokens after the lookahead are left unexamined in the iterator.
+        """
         # initial parser state
-        self.init_state(token_list)
-
-        # parse until parse tree valid or all token used
-        while not self._parse_tree.is_valid_for_bottom_up():
-            # check if we should perform reduction
-            reduce_prod = self._should_reduce()
-            # perform reduction if should
-            if reduce_prod is not None:
-                self.perform_reduction(reduce_prod)
-            # else, perform shift
+        self.init_state(tokens)
+
+        action_table = self.parse_table.action
+        entry_production = self.parse_table.entry_production
+
+        # one lookup of ACTION table for each shift or reduce, until the entry production is reduced
+        while True:
+            state = self._stack[-1]
+            terminal_id = self._get_lookahead_id()
+            action = action_table[state][terminal_id] if terminal_id >= 0 else 0
+
+            if action > 0:
+                self.perform_shift(action - 1)
+            elif action < 0:
+                production_index = -action - 1
+                self.perform_reduction(production_index, terminal_id)
+                if production_index == entry_production:
+                    break
             else:
-                self.perform_shift()
+                self._raise_action_error(state, terminal_id)
 
         # error detection part
 
-        if len(self._unexamined) > 0:
-            general_err.ParseErrorBase(f'Parse Tree has been fully reduced with unexamined tokens {token_list}')
-
-        if self._parse_tree.is_valid():
-            general_err.ParseErrorBase(
-                'Could not successfully reduced into a valid parse tree with all tokens already used')
+        if self._lookahead is not None:
+            raise general_err.ParseErrorBase(
+                f'Parse Tree has been fully reduced with unexamined tokens, starting from {self._lookahead}')
 
         # all good, return parse tree
         return self._parse_tree
 
-    def _get_lookahead(self) -> Terminal | None:
+    def _get_lookahead_id(self) -> int:
         """
-        Return the lookahead terminal type of current state.
+        Return the terminal id of the lookahead, used as the column of ACTION table.
 
-        Return None if no lookahead found.
+        End of input is represented by 0 (the bit index of EPSILON_BIT), and -1 is returned if the type of lookahead
+        token is not used by the CFG.
         """
-        if len(self._unexamined) == 0:
-            return None
+        if self._lookahead is None:
+            return 0
 
-        return Terminal(name=self._unexamined[0].token_type)
+        return self.cfg_sys.symbols.get_terminal_id(self._lookahead.token_type)
 
-    def _is_lookahead_match(self, item: Item) -> bool:
+    def _token_to_terminal(self, token: TokenPair) -> Terminal:
         """
-        Check if input item could match current lookahead of this parser.
-        """
-        # In convention of this package, lookahead set is None represents that no limitation on lookahead.
-        # So here always return True.
-        if item.lookahead_set is None or (None in item.lookahead_set):
-            return True
+        Return the interned terminal of the token in the symbol table of the CFG.
 
-        # get current lookahead
-        lookahead_terminal = self._get_lookahead()
-        # return compare result
-        return lookahead_terminal in item.lookahead_set
+        Only token type not used by the CFG allocates a new Terminal, which will not match any item.
+        """
+        return token.to_terminal(self.cfg_sys.symbols)
 
-    def _should_reduce(self) -> Production | None:
+    def _raise_action_error(self, state: int, terminal_id: int):
+        """
+        Raise the proper error when no action could be performed at the state with the lookahead.
         """
-        Check if the parser should perform reduction at current state of affairs.
+        conflict_actions = self.parse_table.conflicts.get((state, terminal_id))
+        if conflict_actions is not None:
+            production_list = self.cfg_sys.production_list
+            conflict_productions = [production_list[-action - 1] for action in conflict_actions if action < 0]
+            conflict_items = {
+                item for item in self.stack_automaton.states[state].items
+                if item.core.all_matched() and item.core.production in conflict_productions
+            }
+            raise ReduceReduceConflict(conflict_item=conflict_items, parser_type=self._parser_type)
+
+        if self._lookahead is None:
+            raise RuntimeError(
+                'Could not perform Shift operation for this parser, since no more tokens in unexamined list.')
 
-        Rets:
+        raise ShiftStateError()
 
-        - ``Production`` Returns Production which should be used for Reduction if should reduce.
-        - ``None`` If should NOT reduce at this time.
+    def perform_reduction(self, production_index: int, terminal_id: int = -1) -> None:
         """
-        # if stack is empty, impossible to reduce
-        if len(self._stack) == 0:
-            return None
+        Perform Reduction operation on the Stack with the instruction of the Production at ``production_index`` of
+        ``CFGSystem.production_list``.
 
-        # get current valid items
-        valid_items = self._stack[-1].get_valid_items()
-
-        # no valid items
-        if len(valid_items) == 0:
-            return None
+        Params:
 
-        # check all items in current states, if they matched the current lookahead?
-        matched_items: set[Item] = set()
-        for item in valid_items:
+        - ``terminal_id`` Terminal id of the lookahead, only used to skip the following unit reductions if
+          ``skip_unit_productions`` is enabled. -1 means not skipping.
+        """
+        # Here reduce size means the count of the stack element that is going to be reduced.
+        reduce_size = self.parse_table.reduce_sizes[production_index]
 
-            # only all matched items could be used for reduction action.
-            if not (item.core.all_matched()):
-                continue
+        # remove previous states, in place
+        if reduce_size > 0:
+            del self._stack[-reduce_size:]
 
-            # if lookahead matched, add to matched_item list.
-            if self._is_lookahead_match(item):
-                matched_items.add(item)
+        # update parse tree, the start state at the bottom of the stack has no node
+        production = self.cfg_sys.production_list[production_index]
+        self._parse_tree.reduce_node(
+            start_index=len(self._stack) - 1,
+            reduce_size=reduce_size,
+            new_piece=production.source,
+            corresponding_production=production)
 
-        matched_count = len(matched_items)
+        # the entry production never appears in GOTO table, parsing finished
+        if production_index == self.parse_table.entry_production:
+            return
 
-        # if no item match, should not reduce
-        if matched_count == 0:
-            return None
+        goto_row = self.parse_table.goto[self._stack[-1]]
+        next_state = goto_row[self.parse_table.reduce_sources[production_index]]
 
-        # there should be at most one matched item
-        if matched_count > 1:
-            raise ReduceReduceConflict(conflict_item=matched_items, parser_type=self._parser_type)
+        # raise error if the stack could not be matched using the Stack Automaton after reduction.
+        if next_state < 0:
+            raise ReductionStateError()
 
-        # retrieve the only matched item
-        single_match_item: Item = None
-        for i in matched_items:
-            single_match_item = i
+        if self.parse_table.unit_sources is not None and terminal_id >= 0:
+            next_state = self._skip_unit_reductions(goto_row, next_state, terminal_id)
 
-        assert single_match_item is not None
-        return single_match_item.core.production
+        self._stack.append(next_state)
 
-    def perform_reduction(self, production: Production) -> None:
-        """
-        Perform Reduction operation on the Stack with the instruction of given Production.
+    def _skip_unit_reductions(self, goto_row: list[int], next_state: int, terminal_id: int) -> int:
         """
+        Skip the unit reductions that would be performed right after moving to ``next_state`` with the lookahead, and
+        return the state to move to instead.
 
-        # retrieve info
-        source = production.source
-        target_pieces = production.target.pieces
-
-        # determine reduce size.
-        # Here reduce size means the count of the stack element that is going to be reduced.
-        reduce_size: int = -1
-        if target_pieces is None:
-            reduce_size = 0
-        else:
-            reduce_size = len(target_pieces)
-
-        # check if current Reduction could actually be performed.
-        # that is: check if the top part of the stack matches the target pieces of this production.
-        stack_top = self._stack[-reduce_size:]
-        stack_top_pieces = [i.piece for i in stack_top]
-        # raise error if pieces not match
-        # if target pieces is None, means target is epsilon, no need to check
-        if (target_pieces is not None) and (not (stack_top_pieces == target_pieces)):
-            raise InvalidReductionError(production_target=target_pieces, stack_top=stack_top_pieces)
-
-        # reduction could be successfully performed.
-
-        # remove previous pieces
-        if reduce_size > 0:
-            self._stack = self._stack[:-reduce_size]
+        ``goto_row`` is the GOTO row of the state under the reduced node. The skipped productions are recorded in the
+        reduced node, from inner to outer.
+        """
+        action_table = self.parse_table.action
+        unit_sources = self.parse_table.unit_sources
+        node = self._parse_tree.entries[-1]
 
-        # update parse tree
-        self._parse_tree.reduce_node(
-            start_index=len(self._stack),
-            reduce_size=reduce_size,
-            new_piece=source)
-
-        # generate item for new pieces
-        # if the stack is not empty after removing target pieces, means we could start matching at the state of top of
-        # the stack.
-        start_states: set[FANode] | None = None
-        if len(self._stack) > 0:
-            start_states = self._stack[-1].fa_state
-        new_stack_item_list = self.stack_automaton.match_stack(stack=[source], start_states=start_states)
-
-        # special judge when source if entry. (since stack automaton could not match the true entry)
-        if source == self.cfg_sys.entry:
-            self._stack.append(ParserStackItem(piece=source, fa_state=set()))
-            return
+        action = action_table[next_state][terminal_id]
+        while action < 0 and unit_sources[-action - 1] >= 0:
+            if node.skipped_units is None:
+                node.skipped_units = []
+            node.skipped_units.append(self.cfg_sys.production_list[-action - 1])
 
-        # raise error if the stack could not be matched using the Stack Automaton after reduction.
-        if new_stack_item_list is None:
-            raise ReductionStateError()
+            next_state = goto_row[unit_sources[-action - 1]]
+            if next_state < 0:
+                raise ReductionStateError()
+            action = action_table[next_state][terminal_id]
 
-        # add new item list to stack
-        # here new stack item list should always have only one element. This is because the source part of a Production
-        # should always be a single NonTerminal.
-        assert len(new_stack_item_list) == 1
-        self._stack.append(new_stack_item_list[0])
+        return next_state
 
-    def perform_shift(self):
+    def perform_shift(self, next_state: int):
+        """
+        Shift the lookahead token to the Stack as a new leaf of parse tree, move to ``next_state``, and pull the next
+        token as lookahead.
+        """
         # raise error if it could not shift
-        if len(self._unexamined) == 0:
+        if self._lookahead is None:
             raise RuntimeError(
                 'Could not perform Shift operation for this parser, since no more tokens in unexamined list.')
 
-        # get first token in unexamined
-        token_terminal_to_be_shift = self._unexamined.pop(0).to_terminal()
+        self._parse_tree.shift_node(
+            ParseTreeNode(node_type=self._token_to_terminal(self._lookahead), node_content=self._lookahead))
+        self._lookahead = next(self._tokens, None)
+        self._stack.append(next_state)
 
-        # go through the fa
-        start_state: set[FANode] | None = None
-        if len(self._stack) > 0:
-            start_state = self._stack[-1].fa_state
-        parser_item_list = self.stack_automaton.match_stack(stack=[token_terminal_to_be_shift],
-                                                            start_states=start_state)
-
-        # raise error if shift breaks viable prefixes
-        if parser_item_list is None:
-            raise ShiftStateError()
+    def _report_reduce_conflicts(self):
+        """
+        Find the reduce/reduce conflicts of the generated automaton, and log them as warnings.
+        """
+        self.reduce_conflicts = self.stack_automaton.find_reduce_conflicts()
+        for state, conflict_items in self.reduce_conflicts:
+            logger.warning(
+                f'Reduce-Reduce conflict in state {state.sid} of {self._parser_type} parser: {conflict_items}')
 
-        assert len(parser_item_list) == 1
-        new_parser_item = parser_item_list[0]
+    def _load_table(self, cache: ParserCache) -> bool:
+        """
+        Load the ACTION/GOTO tables from cache, return False if not cached or invalid.
 
-        # add new item to stack
-        self._stack.append(new_parser_item)
+        FIRST and FOLLOW sets are also loaded if cached, so they are not generated again for the automaton.
+        """
+        cache.load_analysis(self.cfg_sys)
+        data = cache.load(self.cfg_sys, 'lr_table', params=self._get_cache_params())
+        if data is None:
+            return False
+        try:
+            self.parse_table = LRParseTable.load(self.cfg_sys, data, precedence=self.precedence)
+        except ValueError as e:
+            logger.warning(f'Ignore cached tables of {self._parser_type} parser: {e}')
+            return False
+
+        # conflict items are only reported with the automaton
+        self.reduce_conflicts = []
+        if any(sum(action < 0 for action in actions) > 1 for actions in self.parse_table.conflicts.values()):
+            self._report_reduce_conflicts()
+        return True
+
+    def _get_cache_params(self) -> str:
+        """
+        Return the parameters that affect the tables, as part of the cache key.
+        """
+        return json.dumps([
+            self.__class__.__qualname__,
+            self._parser_type,
+            self.skip_unit_productions,
+            None if self.precedence is None else self.precedence.dump(),
+        ], separators=(',', ':'))
+
+    def _generate_table(self):
+        """
+        Compile the ACTION/GOTO tables from the Stack Automaton.
+        """
+        self.parse_table = LRParseTable(
+            self.stack_automaton,
+            precedence=self.precedence,
+            skip_unit_productions=self.skip_unit_productions,
+        )
 
     def _generate_automaton(self):
         """
@@ -303,7 +383,41 @@ class CLRParser(LRParserBase):
     Also in CLR(1) Items, lookahead is None represent reduce with no limitation. This will only be used in the entry
     of the augmented grammar. S' -> S$, this item should have the None as the lookahead.
     """
-    pass
+    _parser_type = 'CLR'
+
+
+class LALRParser(LRParserBase):
+    """
+    LALR(1) parser, uses the states of the LR(0) automaton, with lookaheads computed by DeRemer-Pennello algorithm.
+    Checkout ``LALRAutomaton``.
+
+    The entry should be in the same pattern as CLRParser.
+
+    ## About Conflicts:
+
+    The states are the canonical LR(1) states with the same core merged, so the tables are usually much smaller than
+    CLR. Merging never introduces shift/reduce conflicts, but could introduce reduce/reduce conflicts for some LR(1)
+    grammars. As for all LR parsers, reduce/reduce conflicts are logged as warnings when generating the automaton, and
+    kept in ``reduce_conflicts``. ``ReduceReduceConflict`` is raised if a conflict is met when parsing.
+    """
+    _parser_type = 'LALR'
+
+    def _generate_automaton(self):
+        self.stack_automaton = LALRAutomaton(self.cfg_sys)
+
+
+class SLRParser(LRParserBase):
+    """
+    SLR(1) parser, uses the states of the LR(0) automaton, reduces by a production only if the lookahead is in the
+    FOLLOW set of its source. Checkout ``SLRAutomaton``.
+
+    The entry should be in the same pattern as CLRParser. Accepts fewer grammars than LALRParser with the same states,
+    but the lookaheads come from FOLLOW sets directly.
+    """
+    _parser_type = 'SLR'
+
+    def _generate_automaton(self):
+        self.stack_automaton = SLRAutomaton(self.cfg_sys)
 
 
 class ReduceReduceConflict(Exception):
@@ -323,6 +437,7 @@ class ReduceReduceConflict(Exception):
             parser_type_str += f' with type {parser_type}'
 
         error_msg = f'Reduce-Reduce error occurred in parser{parser_type_str}. Set of conflict items: {conflict_item}'
+        super().__init__(error_msg)
 
 
 class InvalidReductionError(general_err.ParseErrorBase):
@@ -0,0 +1,143 @@
+from collections.abc import Iterable
+from typing import Literal
+
+from cfg import *
+
+__all__ = [
+    'Associativity',
+    'ASSOC_LEFT',
+    'ASSOC_RIGHT',
+    'ASSOC_NONASSOC',
+    'PrecedenceTable',
+]
+
+# Associativity of a precedence level, same as yacc.
+#
+# - ``left`` Shift/reduce conflict between the same level is resolved as reduce, e.g. ``1 - 2 - 3`` is ``(1 - 2) - 3``.
+# - ``right`` Resolved as shift, e.g. ``a = b = c`` is ``a = (b = c)``.
+# - ``nonassoc`` Resolved as error, e.g. ``a < b < c`` is rejected.
+type Associativity = Literal['left', 'right', 'nonassoc']
+
+ASSOC_LEFT: Associativity = 'left'
+ASSOC_RIGHT: Associativity = 'right'
+ASSOC_NONASSOC: Associativity = 'nonassoc'
+
+
+class PrecedenceTable:
+    """
+    yacc-style precedence and associativity declarations, used to resolve shift/reduce conflicts when compiling LR
+    parse table.
+
+    Levels are declared from low to high, each ``declare()`` is like a ``%left``, ``%right`` or ``%nonassoc`` line of
+    yacc. Terminals only used for precedence (e.g. ``UMINUS``) need not appear in the CFG.
+
+    The precedence of a production is the one of the last terminal in its target, or the one of the terminal set by
+    ``set_production_precedence()`` (like ``%prec`` of yacc). Productions without precedence, or terminals without
+    precedence, leave the conflict to the default resolution of ``LRParseTable``.
+
+    Conflict resolution between reducing production P and shifting terminal t:
+
+    - Level of P is higher than t: reduce.
+    - Level of P is lower than t: shift.
+    - Same level: decided by the associativity of the level.
+    """
+    # terminal -> (level, associativity), level starts from 1
+    terminal_levels: dict[Terminal, tuple[int, Associativity]]
+
+    # production -> terminal whose precedence is used by the production
+    production_overrides: dict[Production, Terminal]
+
+    def __init__(self, declarations: Iterable[tuple[Associativity, Iterable[Terminal | str]]] = ()):
+        """
+        Params:
+
+        - ``declarations`` List of (associativity, terminals) from the lowest level to the highest.
+        """
+        self.terminal_levels = {}
+        self.production_overrides = {}
+        self._level_count = 0
+        for associativity, terminals in declarations:
+            self.declare(associativity, terminals)
+
+    def declare(self, associativity: Associativity, terminals: Iterable[Terminal | str]) -> 'PrecedenceTable':
+        """
+        Declare a new level with higher precedence than all existing levels.
+        """
+        if associativity not in (ASSOC_LEFT, ASSOC_RIGHT, ASSOC_NONASSOC):
+            raise ValueError(f'Unknown associativity {associativity!r}')
+
+        self._level_count += 1
+        for terminal in terminals:
+            self.terminal_levels[self._to_terminal(terminal)] = (self._level_count, associativity)
+        return self
+
+    def set_production_precedence(self, production: Production, terminal: Terminal | str) -> 'PrecedenceTable':
+        """
+        Let the production use the precedence of the terminal, like ``%prec`` of yacc.
+        """
+        terminal = self._to_terminal(terminal)
+        if terminal not in self.terminal_levels:
+            raise ValueError(f'Precedence of terminal {terminal} is not declared')
+
+        self.production_overrides[production] = terminal
+        return self
+
+    def dump(self) -> dict:
+        """
+        Return the declarations as JSON serializable data, used in the key of cached parse tables.
+        """
+        return {
+            'terminals': sorted([terminal.name, level, associativity]
+                                for terminal, (level, associativity) in self.terminal_levels.items()),
+            'productions': sorted(
+                [prod.source.name, [piece.name for piece in prod.target.pieces or []], terminal.name]
+                for prod, terminal in self.production_overrides.items()
+            ),
+        }
+
+    def get_terminal_precedence(self, terminal: Terminal) -> tuple[int, Associativity] | None:
+        return self.terminal_levels.get(terminal)
+
+    def get_production_precedence(self, production: Production) -> tuple[int, Associativity] | None:
+        """
+        Return (level, associativity) of the production, None if it has no precedence.
+        """
+        terminal = self.production_overrides.get(production)
+        if terminal is not None:
+            return self.terminal_levels[terminal]
+
+        # the last terminal of target
+        for piece in reversed(production.target.pieces or []):
+            if isinstance(piece, Terminal):
+                return self.terminal_levels.get(piece)
+        return None
+
+    def resolve(self, production: Production, terminal: Terminal) -> int | None:
+        """
+        Resolve the shift/reduce conflict between reducing the production and shifting the terminal.
+
+        Rets:
+
+        - ``1`` Shift.
+        - ``-1`` Reduce.
+        - ``0`` Error, both are nonassoc of the same level.
+        - ``None`` Could not be resolved, since the production or the terminal has no precedence.
+        """
+        production_precedence = self.get_production_precedence(production)
+        terminal_precedence = self.get_terminal_precedence(terminal)
+        if production_precedence is None or terminal_precedence is None:
+            return None
+
+        production_level, associativity = production_precedence
+        terminal_level, _ = terminal_precedence
+        if production_level != terminal_level:
+            return -1 if production_level > terminal_level else 1
+        if associativity == ASSOC_LEFT:
+            return -1
+        if associativity == ASSOC_RIGHT:
+            return 1
+        return 0
+
+    @staticmethod
+    def _to_terminal(terminal: Terminal | str) -> Terminal:
+        return Terminal(name=terminal) if isinstance(terminal, str) else terminal
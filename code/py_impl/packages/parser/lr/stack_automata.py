@@ -1,63 +1,92 @@
-from copy import copy
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from graphviz import Digraph
 
 from cfg import *
 from ..items import *
 from .. import errors as general_err
-from automata import FA, FANode
-from automata.visualize import FADiGraph
 
 __all__ = [
     'StackAutomaton',
+    'LR0Automaton',
+    'LALRAutomaton',
+    'SLRAutomaton',
+    'LRState',
     'EntryPatternNotMatch',
     'ParserStackItem',
 ]
 
+# key of an item core in the construction, (index of production in CFGSystem.production_list, offset)
+type _CoreKey = tuple[int, int]
+
+
+@dataclass(eq=False)
+class LRState:
+    """
+    A state of the Stack Automaton, that is a set of LR items closed under closure.
+    """
+    # index of this state in StackAutomaton.states
+    sid: int
+
+    # kernel items first, followed by the items added by closure. Items with same core are merged, the lookahead of
+    # the merged item is the union of the lookaheads.
+    items: list[Item]
+
+    # count of the kernel items at the head of items
+    kernel_size: int
+
+    # piece -> next state
+    transitions: dict[Piece, 'LRState'] = field(default_factory=dict)
+
+    def __repr__(self):
+        return f'LRState({self.sid})'
+
 
 @dataclass
 class ParserStackItem:
     piece: Piece
-    fa_state: set[FANode[list[Item], Piece]]
+    state: LRState | None
 
     def get_valid_items(self) -> list[Item]:
         """
-        Get valid items indicated by this set of states.
+        Get valid items indicated by the state of this stack item.
 
         Return empty list if valid items not found.
         """
-        valid_items: list[Item] = []
-
-        # states empty, no valid item
-        if (self.fa_state is None) or (len(self.fa_state) == 0):
-            return valid_items
-
-        # loop state
-        for st in self.fa_state:
-            item_list = st.label
-            valid_items.extend(item_list)
-
-        return valid_items
+        if self.state is None:
+            return []
+        return self.state.items
 
     def __repr__(self):
         return str(self.piece)
 
 
 class StackAutomaton:
+    """
+    The DFA of viable prefixes, built as the canonical collection of LR(1) item sets.
+
+    States are generated directly with the closure/goto worklist algorithm. Each state is interned by its kernel, that
+    is the items reached by goto, so a state is created only once for each distinct kernel.
+    """
     cfg_sys: CFGSystem
     _entry_item: Item
 
-    # items helper for this automaton
-    _items_helper: ItemHelper
+    # all states of this automaton, states[0] is the start state
+    states: list[LRState]
 
-    _fa: FA[list[Item], Piece]
+    # the state used when matching from the bottom of the stack
+    start_state: LRState
+
+    # target pieces of each production, indexed as CFGSystem.production_list
+    _pieces: list[list[Piece]]
+
+    # non-terminal -> indices of the productions that use it as source
+    _production_indices: dict[NonTerminal, list[int]]
 
     def __init__(self, cfg_sys: CFGSystem):
         self.cfg_sys = cfg_sys
 
-        self._items_helper = ItemHelper()
         self._generate_entry_item()
-        self._fa = self._generate_fa()
+        self._generate_states()
 
     def _generate_entry_item(self):
         entry = self.cfg_sys.entry
@@ -77,7 +106,7 @@ class StackAutomaton:
                 raise EntryPatternNotMatch(entry, prod)
 
             # create item
-            entry_item = self._items_helper.get_item(Item(prod, 0, None), True, True)
+            entry_item = Item(prod, 0, None)
             break
 
         # if no entry found
@@ -86,143 +115,362 @@ class StackAutomaton:
 
         self._entry_item = entry_item
 
-    def _generate_fa(self) -> FA:
+    def get_entry_item(self) -> Item:
         """
-        Discover and generate NFA used to match the stacks.
-        :return:
+        Return the item of entry production with nothing matched, the only kernel item of the start state.
         """
-        # discover new moves recursively.
-        process_list: list[Item] = [self._entry_item]
+        return self._entry_item
+
+    def _generate_states(self) -> None:
+        """
+        Discover all states of the automaton and the transitions between them.
+        """
+        production_list = self.cfg_sys.production_list
+        self._pieces = [
+            [] if prod.target.pieces is None else prod.target.pieces for prod in production_list
+        ]
+        self._production_indices = {}
+        entry_index = -1
+        for index, prod in enumerate(production_list):
+            self._production_indices.setdefault(prod.source, []).append(index)
+            if prod is self._entry_item.core.production:
+                entry_index = index
+        assert entry_index >= 0
+
+        self.states = []
+        # kernel -> state
+        state_dict: dict[frozenset[tuple[_CoreKey, int | None]], LRState] = {}
+        # states whose transitions not generated yet, with the closure of each state
+        process_list: list[tuple[LRState, dict[_CoreKey, int | None]]] = []
+
+        def get_state(kernel: dict[_CoreKey, int | None]) -> LRState:
+            kernel_key = frozenset(kernel.items())
+            state = state_dict.get(kernel_key)
+            if state is not None:
+                return state
+
+            closure = self._closure(kernel)
+            state = LRState(
+                sid=len(self.states),
+                items=[
+                    Item(production_list[prod_index], offset, lookahead)
+                    for (prod_index, offset), lookahead in closure.items()
+                ],
+                kernel_size=len(kernel),
+            )
+            state_dict[kernel_key] = state
+            self.states.append(state)
+            process_list.append((state, closure))
+            return state
+
+        self.start_state = get_state({(entry_index, 0): self._entry_item.lookahead})
 
         while len(process_list) > 0:
-            current_item = process_list.pop()
+            state, closure = process_list.pop()
 
-            # if this item is all matched, skip
-            if current_item.core.all_matched():
-                continue
+            # group items by the waiting piece, the kernel of goto(state, piece) is these items moved forward
+            kernels: dict[Piece, dict[_CoreKey, int | None]] = {}
+            for (prod_index, offset), lookahead in closure.items():
+                pieces = self._pieces[prod_index]
+                if offset < len(pieces):
+                    kernels.setdefault(pieces[offset], {})[(prod_index, offset + 1)] = lookahead
 
-            # add forward item
-            forward_item = self._items_helper.get_forward_item(current_item, write_if_not_exists=False)
-            # search forward item too if it's not been tracked
-            if not self._items_helper.has_item(forward_item):
-                process_list.append(forward_item)
-            # add pointer
-            self._items_helper.point_to(current_item, current_item.core.get_waiting(), forward_item)
-
-            # found watching piece
-            watching_piece = current_item.core.get_waiting()
-            # add closure item if waiting item is non-terminal
-            if not isinstance(current_item.core.get_waiting(), NonTerminal):
-                continue
-            watching_piece: NonTerminal
-            lookahead_set = self._generate_lookahead(current_item, forward_item)
-            # found production that source is the waiting item
-            for prod in self.cfg_sys.production_dict[watching_piece]:
-                # new item for this production
-                new_item = Item(prod, 0, lookahead_set)
-                # add to process list if not tracked before
-                if not self._items_helper.has_item(new_item):
-                    process_list.append(new_item)
-                # add pointer with epsilon move
-                self._items_helper.point_to(current_item, None, new_item)
-
-        # generate the node dicts that used for initializing FA
-        fa_node_dicts: dict[str, FANode] = {}
-        for node in self._items_helper.fa_nodes.values():
-            fa_node_dicts[node.nid] = node
-
-        nfa = FA(fa_node_dicts)
-        dfa = nfa.to_dfa(new_fa=True, minimize=False)
-        dfa.minimize(new_fa=False, skip_if_pointers_empty=True)
-
-        self._fa = dfa
-        return dfa
-
-    def _generate_lookahead(self, current_item: Item, forward_item: Item) -> set[Piece] | None:
-        """
-        Default lookahead generator logic for CLR
+            for piece, kernel in kernels.items():
+                state.transitions[piece] = get_state(kernel)
 
-        If you want to use SLR, override this method and let it always return None.
+    def _closure(self, kernel: dict[_CoreKey, int | None]) -> dict[_CoreKey, int | None]:
+        """
+        Return the closure of the kernel items, as a dict from core to lookahead.
+
+        The lookahead of a derived item grows when new lookahead reaches the item it is derived from, such item is
+        processed again until no lookahead changes.
         """
-        # all item being processed should not be epsilon item. Since epsilon item always satisfy all_matched() == True
-        assert current_item.core.production.target.pieces is not None
+        production_list = self.cfg_sys.production_list
+        items = dict(kernel)
+        process_list = list(kernel)
 
-        max_offset = len(current_item.core.production.target.pieces)
-        offset = current_item.core.offset
+        while len(process_list) > 0:
+            core_key = process_list.pop()
+            prod_index, offset = core_key
+            pieces = self._pieces[prod_index]
 
-        assert max_offset > offset
+            # all matched, or waiting for a terminal
+            if offset >= len(pieces) or not isinstance(pieces[offset], NonTerminal):
+                continue
 
-        # no any following piece, use lookahead of current node for all derived node.
-        if forward_item.core.all_matched():
-            return current_item.lookahead_set
+            lookahead = self._generate_lookahead(production_list[prod_index], offset, items[core_key])
+            for derived_index in self._production_indices.get(pieces[offset], []):
+                derived_key = (derived_index, 0)
+                if derived_key in items:
+                    prev_lookahead = items[derived_key]
+                    new_lookahead = self._merge_lookahead(prev_lookahead, lookahead)
+                    if new_lookahead == prev_lookahead:
+                        continue
+                    items[derived_key] = new_lookahead
+                else:
+                    items[derived_key] = lookahead
+                process_list.append(derived_key)
+
+        return items
 
-        # has the following pieces, then lookahead should be FIRST(rest_pieces, lookaheads)
-        rest_pieces = forward_item.core.rest_pieces()
-        first_set_of_rest = self.cfg_sys.calc_first_set_of_pieces(rest_pieces)
+    @staticmethod
+    def _merge_lookahead(lookahead: int | None, other: int | None) -> int | None:
+        """
+        Return the union of two lookaheads, None (no limitation) absorbs any bitmask.
+        """
+        if lookahead is None or other is None:
+            return None
+        return lookahead | other
+
+    def _generate_lookahead(self, production: Production, offset: int, lookahead: int | None) -> int | None:
+        """
+        Default lookahead generator logic for CLR, returns the lookahead bitmask of the items derived from the piece
+        at ``offset`` of the production, where ``lookahead`` is the lookahead of the item waiting for that piece.
+
+        If you want to use SLR, override this method and let it always return None.
+        """
+        # lookahead is FIRST(rest_pieces, lookaheads), FIRST of the suffix is precomputed by the CFG.
+        # no any following piece gives EPSILON_BIT, then lookahead of current item is used for all derived items.
+        first_mask_of_rest = self.cfg_sys.get_suffix_first_mask(production, offset + 1)
         # if epsilon in first set, then add lookahead of current item
-        if None in first_set_of_rest:
-            first_set_of_rest.remove(None)
-            first_set_of_rest.update(current_item.lookahead_set)
+        if first_mask_of_rest & EPSILON_BIT:
+            if lookahead is None:
+                return None
+            first_mask_of_rest = (first_mask_of_rest & ~EPSILON_BIT) | lookahead
 
-        return first_set_of_rest
+        return first_mask_of_rest
 
     def to_graphviz(self) -> Digraph:
-        gv_instance = FADiGraph(get_node_label=self.get_dfa_node_label)
-        return gv_instance.from_fa(self._fa).get_graph()
-
-    def match_stack(self, stack: list[Piece], start_states: set[FANode] | None = None) -> list[ParserStackItem] | None:
+        gv_instance = Digraph()
+        for state in self.states:
+            gv_instance.node(str(state.sid), label=self.get_state_label(state), shape='box')
+        for state in self.states:
+            for piece, next_state in state.transitions.items():
+                gv_instance.edge(str(state.sid), str(next_state.sid), label=str(piece))
+        return gv_instance
+
+    def match_stack(self, stack: list[Piece], start_state: LRState | None = None) -> list[ParserStackItem] | None:
         """
         Try matching a list of Pieces using this Stack Automaton.
 
         Params:
 
         - ``stack`` A list of Pieces. Could be the whole or part of the Stack.
-        - ``start_states`` Specified what states the FA should start from when try matching this list of Pieces. Use
-        initial state if not specified.
+        - ``start_state`` Specified what state the automaton should start from when try matching this list of Pieces.
+        Use start state if not specified.
 
         Rets:
 
-        - ``list[Item]`` If valid for current stack if match success, return list of all valid Items in such state.
+        - ``list[ParserStackItem]`` The stack items of the matched pieces if match success.
         - ``None`` If could not match the stack with viable prefixes.
         """
-        # determine and set start state for Stack Automaton.
-        if start_states is None:
-            self._fa.init_state()
-        else:
-            self._fa.set_current_state(start_states)
+        state = self.start_state if start_state is None else start_state
 
         # store the generated ParserStackItem
         stack_items: list[ParserStackItem] = []
 
-        # iterate through the stack items and try moving the FA.
+        # iterate through the stack items and try moving the automaton.
         for stack_elem in stack:
-            valid_move = self._fa.move_next(stack_elem)
+            state = state.transitions.get(stack_elem)
             # if matched failed, return None
-            if not valid_move:
+            if state is None:
                 return None
-            # match success, create new StackItem
-            new_stack_item = ParserStackItem(piece=stack_elem, fa_state=self._fa.get_current_state())
-            # add new stack item to return list.
-            stack_items.append(new_stack_item)
+            stack_items.append(ParserStackItem(piece=stack_elem, state=state))
 
         return stack_items
 
+    def find_reduce_conflicts(self) -> list[tuple[LRState, list[Item]]]:
+        """
+        Return the states in which more than one item could be used for reduction on the same lookahead, with the
+        conflict items of each state.
+        """
+        conflicts: list[tuple[LRState, list[Item]]] = []
+        for state in self.states:
+            reduce_items = [item for item in state.items if item.core.all_matched()]
+            conflict_items: list[Item] = []
+            for index, item in enumerate(reduce_items):
+                for other in reduce_items[:index] + reduce_items[index + 1:]:
+                    if item.lookahead is None or other.lookahead is None or (item.lookahead & other.lookahead):
+                        conflict_items.append(item)
+                        break
+            if len(conflict_items) > 0:
+                conflicts.append((state, conflict_items))
+        return conflicts
+
     @staticmethod
-    def get_dfa_node_label(nid: str, node: FANode[list[Item], Piece]) -> str:
+    def get_state_label(state: LRState) -> str:
         """
         This static method is used when determine how to determine the label when generating DOT graph.
 
         This method should not be directly called by user, but could be overridden if needed.
         """
-        node_label_str = ''
-        # deduplicated_label = list(set(node.label))
-        deduplicated_label = node.label
-        for item in deduplicated_label:
-            node_label_str += str(item)
-            node_label_str += '\n'
+        return f'{state.sid}\n' + '\n'.join(str(item) for item in state.items)
+
+
+class LR0Automaton(StackAutomaton):
+    """
+    The DFA of viable prefixes built from LR(0) items, the lookahead of all items is None.
+    """
+
+    def _generate_lookahead(self, production: Production, offset: int, lookahead: int | None) -> int | None:
+        return None
+
+
+class SLRAutomaton(LR0Automaton):
+    """
+    The LR(0) automaton, with the FOLLOW set of the source as the lookahead of each reduce item.
+    """
+
+    def __init__(self, cfg_sys: CFGSystem):
+        super().__init__(cfg_sys)
+
+        entry_production = self._entry_item.core.production
+        follow_masks = self.cfg_sys.follow_masks
+        for state in self.states:
+            for item in state.items:
+                # entry item keeps no limitation on lookahead
+                if item.core.all_matched() and item.core.production is not entry_production:
+                    item.lookahead = follow_masks[item.core.production.source]
+
+
+class LALRAutomaton(LR0Automaton):
+    """
+    The LR(0) automaton, with LALR(1) lookaheads of the reduce items computed by the DeRemer-Pennello algorithm.
+
+    Each state is a state of the canonical LR(1) collection with the lookaheads of all states of the same core merged,
+    while the lookaheads are computed on the LR(0) automaton without building the LR(1) states:
+
+    - ``DR(p, A)`` Terminals that could be shifted right after the transition of non-terminal A from state p.
+    - ``(p, A) reads (r, C)`` If r is reached by (p, A) and has a transition of nullable C.
+    - ``(p, A) includes (p', B)`` If B -> βAγ, γ is nullable and p' reaches p by β.
+    - ``(q, A -> ω) lookback (p, A)`` If p reaches q by ω.
+
+    ``Read`` is DR closed under reads, ``Follow`` is Read closed under includes, and the lookahead of a reduce item is
+    the union of Follow of the transitions it lookbacks. Items that are not all matched keep None as lookahead, only
+    the lookaheads of the reduce items are used by the parser.
+    """
+
+    def __init__(self, cfg_sys: CFGSystem):
+        super().__init__(cfg_sys)
+        self._generate_lalr_lookahead()
+
+    def _generate_lalr_lookahead(self) -> None:
+        nullable_set = self.cfg_sys.nullable_set
+
+        # non-terminal transitions, (state, non-terminal) -> index
+        transition_indices: dict[tuple[int, NonTerminal], int] = {}
+        transition_list: list[tuple[LRState, NonTerminal]] = []
+        for state in self.states:
+            for piece in state.transitions:
+                if isinstance(piece, NonTerminal):
+                    transition_indices[(state.sid, piece)] = len(transition_list)
+                    transition_list.append((state, piece))
+
+        # direct read and reads relation
+        direct_read: list[int] = []
+        reads: list[list[int]] = []
+        for state, non_terminal in transition_list:
+            next_state = state.transitions[non_terminal]
+            read_mask = 0
+            read_list: list[int] = []
+            for piece in next_state.transitions:
+                if isinstance(piece, Terminal):
+                    read_mask |= self.cfg_sys.terminal_bit(piece)
+                elif piece in nullable_set:
+                    read_list.append(transition_indices[(next_state.sid, piece)])
+            direct_read.append(read_mask)
+            reads.append(read_list)
+
+        # includes and lookback relation, found by walking the productions of each transition
+        includes: list[list[int]] = [[] for _ in transition_list]
+        lookback: dict[tuple[int, int], list[int]] = {}
+        for index, (start_state, non_terminal) in enumerate(transition_list):
+            for prod_index in self._production_indices[non_terminal]:
+                production = self.cfg_sys.production_list[prod_index]
+                state = start_state
+                for offset, piece in enumerate(self._pieces[prod_index]):
+                    if isinstance(piece, NonTerminal) and \
+                            self.cfg_sys.get_suffix_first_mask(production, offset + 1) & EPSILON_BIT:
+                        includes[transition_indices[(state.sid, piece)]].append(index)
+                    state = state.transitions[piece]
+                lookback.setdefault((state.sid, prod_index), []).append(index)
+
+        # the entry has no transition to be included in, transitions at the end of entry production read the end of
+        # input instead, which is EPSILON_BIT in masks, as the entry item of canonical LR(1) collection.
+        entry_production = self._entry_item.core.production
+        state = self.start_state
+        for offset, piece in enumerate(entry_production.target.pieces):
+            if isinstance(piece, NonTerminal) and \
+                    self.cfg_sys.get_suffix_first_mask(entry_production, offset + 1) & EPSILON_BIT:
+                direct_read[transition_indices[(state.sid, piece)]] |= EPSILON_BIT
+            state = state.transitions[piece]
+
+        follow = self._digraph(self._digraph(direct_read, reads), includes)
+
+        production_index_dict = {id(prod): index for index, prod in enumerate(self.cfg_sys.production_list)}
+        for state in self.states:
+            for item in state.items:
+                # entry item keeps no limitation on lookahead
+                if not item.core.all_matched() or item.core.production is entry_production:
+                    continue
+                lookahead = 0
+                for index in lookback.get((state.sid, production_index_dict[id(item.core.production)]), []):
+                    lookahead |= follow[index]
+                item.lookahead = lookahead
+
+    @staticmethod
+    def _digraph(initial: list[int], relation: list[list[int]]) -> list[int]:
+        """
+        Return the closure of the initial bitmasks under the relation, that is, the result of x is the union of the
+        initial bitmasks of all nodes reachable from x.
 
-        return node_label_str
-        # return str(node.label)
+        Each strongly connected component is traversed once, and all its nodes share the same result.
+        """
+        node_count = len(initial)
+        result = initial[:]
+        # 0 means not visited, node_count + 1 means finished
+        depth = [0] * node_count
+        finished = node_count + 1
+        node_stack: list[int] = []
+
+        for start in range(node_count):
+            if depth[start] != 0:
+                continue
+            node_stack.append(start)
+            depth[start] = len(node_stack)
+            # (node, index of the next relation to traverse, depth when visited)
+            call_stack: list[tuple[int, int, int]] = [(start, 0, depth[start])]
+
+            while len(call_stack) > 0:
+                node, relation_index, node_depth = call_stack[-1]
+
+                if relation_index < len(relation[node]):
+                    call_stack[-1] = (node, relation_index + 1, node_depth)
+                    next_node = relation[node][relation_index]
+                    if depth[next_node] == 0:
+                        node_stack.append(next_node)
+                        depth[next_node] = len(node_stack)
+                        call_stack.append((next_node, 0, depth[next_node]))
+                        continue
+                    depth[node] = min(depth[node], depth[next_node])
+                    result[node] |= result[next_node]
+                    continue
+
+                call_stack.pop()
+                # node is the root of a strongly connected component
+                if depth[node] == node_depth:
+                    while True:
+                        member = node_stack.pop()
+                        depth[member] = finished
+                        result[member] = result[node]
+                        if member == node:
+                            break
+                if len(call_stack) > 0:
+                    parent = call_stack[-1][0]
+                    depth[parent] = min(depth[parent], depth[node])
+                    result[parent] |= result[node]
+
+        return result
 
 
 class EntryPatternNotMatch(Exception):
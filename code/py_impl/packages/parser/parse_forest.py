@@ -0,0 +1,150 @@
+from copy import copy
+from dataclasses import dataclass, field
+
+import cfg
+from cfg import Production
+from lexical_analyzer import TokenPair
+
+from .parse_tree import ParseTree, ParseTreeNode
+
+__all__ = ["ForestNode", "ParseForest"]
+
+
+@dataclass(eq=False)
+class ForestNode:
+    """
+    Symbol node of shared packed parse forest, a piece that derives the tokens in ``[start, end)``.
+
+    Each (piece, start, end) has only one node in a forest, and all the ways it is derived are packed in
+    ``alternatives``, so sub-trees are shared by all the parse trees that use them.
+    """
+
+    piece: cfg.Piece
+    start: int
+    end: int
+
+    # the token of terminal node, None for non-terminal node
+    token: TokenPair | None = None
+
+    # packed nodes, (production, children from left to right). Empty children means derived into epsilon.
+    #
+    # The first alternative is the one found first, its children are always created before this node, so following
+    # the first alternatives never runs into a cycle.
+    alternatives: list[tuple[Production, tuple["ForestNode", ...]]] = field(default_factory=list)
+
+    def is_ambiguous(self) -> bool:
+        return len(self.alternatives) > 1
+
+    def __repr__(self) -> str:
+        return f"{self.piece}[{self.start}:{self.end}]"
+
+
+class ParseForest:
+    """
+    Shared packed parse forest, all parse trees of an input, returned by GLR parser.
+
+    The forest has O(n^2) symbol nodes for input of n tokens, even if the count of parse trees is exponential.
+    """
+
+    root: ForestNode
+
+    _epsilon_terminal: cfg.Terminal | None
+
+    def __init__(self, root: ForestNode, epsilon_terminal: cfg.Terminal | None = None):
+        self.root = root
+        self._epsilon_terminal = epsilon_terminal
+
+    def get_nodes(self) -> list[ForestNode]:
+        """
+        Return all symbol nodes reachable from root.
+        """
+        visited: set[int] = {id(self.root)}
+        nodes: list[ForestNode] = [self.root]
+        index = 0
+        while index < len(nodes):
+            for _, children in nodes[index].alternatives:
+                for child in children:
+                    if id(child) not in visited:
+                        visited.add(id(child))
+                        nodes.append(child)
+            index += 1
+        return nodes
+
+    def is_ambiguous(self) -> bool:
+        """
+        Return True if the input has more than one parse tree.
+        """
+        return any(node.is_ambiguous() for node in self.get_nodes())
+
+    def count_trees(self) -> int:
+        """
+        Return the count of parse trees in this forest.
+
+        Exceptions:
+
+        - ``ValueError`` If there are infinitely many parse trees, which is caused by cyclic derivations like
+          ``A -> B, B -> A``.
+        """
+        counts: dict[int, int] = {}
+        in_progress: set[int] = set()
+
+        # post-order dfs, (node, expanded)
+        node_stack: list[tuple[ForestNode, bool]] = [(self.root, False)]
+        while len(node_stack) > 0:
+            node, expanded = node_stack.pop()
+            if id(node) in counts:
+                continue
+
+            if expanded:
+                in_progress.discard(id(node))
+                count = 0
+                for _, children in node.alternatives:
+                    alternative_count = 1
+                    for child in children:
+                        alternative_count *= counts[id(child)]
+                    count += alternative_count
+                counts[id(node)] = count if node.token is None else 1
+                continue
+
+            if id(node) in in_progress:
+                raise ValueError(f"Infinitely many parse trees, cyclic derivation found at {node}")
+            in_progress.add(id(node))
+            node_stack.append((node, True))
+            for _, children in node.alternatives:
+                for child in children:
+                    if id(child) not in counts:
+                        if id(child) in in_progress:
+                            raise ValueError(f"Infinitely many parse trees, cyclic derivation found at {child}")
+                        node_stack.append((child, False))
+
+        return counts[id(self.root)]
+
+    def to_parse_tree(self) -> ParseTree:
+        """
+        Return one of the parse trees, following the first alternative of each node.
+
+        Nodes of the parse tree have their ``production`` set, and token leaves have their ``node_content`` set.
+        """
+        parse_tree = ParseTree([], epsilon_terminal=self._epsilon_terminal)
+        root_node = ParseTreeNode(self.root.piece)
+
+        # pre-order dfs, so the token leaves are visited from left to right
+        node_stack: list[tuple[ForestNode, ParseTreeNode]] = [(self.root, root_node)]
+        while len(node_stack) > 0:
+            forest_node, tree_node = node_stack.pop()
+            if forest_node.token is not None:
+                tree_node.node_content = forest_node.token
+                parse_tree.leaves.append(tree_node)
+                continue
+
+            production, children = forest_node.alternatives[0]
+            tree_node.production = production
+            if len(children) == 0:
+                tree_node.pointers = [copy(parse_tree.epsilon_leaf)]
+                continue
+
+            tree_node.pointers = [ParseTreeNode(child.piece) for child in children]
+            node_stack.extend(reversed(list(zip(children, tree_node.pointers))))
+
+        parse_tree.entries = [root_node]
+        return parse_tree
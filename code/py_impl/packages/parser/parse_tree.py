@@ -25,6 +25,11 @@ class ParseTreeNode:
     # checkout docs/parse_tree.md -> Corresponding Production Info
     production: Production
 
+    # unit productions skipped by LR parser after reducing to this node, from inner to outer, None if no skipped.
+    #
+    # checkout ParseTree.restore_unit_chains()
+    skipped_units: list[Production] | None = None
+
     def __copy__(self) -> "ParseTreeNode":
         return ParseTreeNode(self.node_type, self.node_content, self.pointers)
 
@@ -46,6 +51,22 @@ class ParseTreeNode:
         repr_str += ")"
         return repr_str
 
+    def get_start_offset(self) -> int:
+        """
+        Return the source offset of the first token covered by this node, -1 if this node covers no token.
+
+        Pass the result to ``LexicalAnalyzer.get_line_col()`` to get line and column.
+        """
+        # pre-order dfs, the first node with content is the left-most token. (epsilon leaves have no content)
+        node_stack: list[ParseTreeNode] = [self]
+        while len(node_stack) > 0:
+            node = node_stack.pop()
+            if node.node_content is not None:
+                return node.node_content.start
+            node_stack.extend(reversed(node.pointers))
+
+        return -1
+
     def point_to(self, nodes: Union["ParseTreeNode", list["ParseTreeNode"]]) -> None:
         """
         Add a single node or list of nodes to the pointers of this node.
@@ -138,8 +159,23 @@ class ParseTree:
         # not found
         return None
 
+    def shift_node(self, node: ParseTreeNode) -> None:
+        """
+        Push a new leaf node to the end of both entries and leaves.
+
+        General Usage:
+
+        - Use to build the parse tree from tokens incrementally when using LR Parser, one leaf on each shift.
+        """
+        self.entries.append(node)
+        self.leaves.append(node)
+
     def reduce_node(
-        self, start_index: int, reduce_size: int, new_piece: cfg.Piece
+        self,
+        start_index: int,
+        reduce_size: int,
+        new_piece: cfg.Piece,
+        corresponding_production: Production,
     ) -> None:
         """
         Reduce several count of previous entries nodes into new node.
@@ -148,6 +184,13 @@ class ParseTree:
 
         For example, the stack is ABC. If we perform reduce_node(start_index=1, reduce_size=2, new_piece=Q), then we
         will get AQ. (Q -> BC)
+
+        - ``corresponding_production`` The production used by this reduction, stored in the new node.
+
+        Notice:
+
+        ``entries`` is updated in place. When the reduced nodes are at the end of ``entries``, as in LR parsers, this
+        pops the nodes and pushes the new one, which costs O(reduce_size) regardless of the length of ``entries``.
         """
 
         assert (start_index + reduce_size) <= len(self.entries)
@@ -159,14 +202,10 @@ class ParseTree:
         else:
             point_to_list = self.entries[start_index : start_index + reduce_size]
 
-        # remove old node from entries
-        self.entries = (
-            self.entries[:start_index] + self.entries[start_index + reduce_size :]
-        )
-
-        # create new nodes
+        # replace old nodes in entries with the new node
         new_node = ParseTreeNode(new_piece, pointers=point_to_list)
-        self.entries.insert(start_index, new_node)
+        new_node.production = corresponding_production
+        self.entries[start_index : start_index + reduce_size] = [new_node]
 
     def derive_non_terminal(
         self,
@@ -182,13 +221,34 @@ class ParseTree:
         - ``non_terminal_index`` Index of the NonTerminal node in leaves that you want to derive.
         - ``new_pieces`` List of CFG pieces that you want to replace the NonTerminal with.
 
-        General Usage:
+        Notice:
 
-        - Use to derive non-terminal when using LL(1) Parser.
+        ``leaves`` is updated in place, which still moves the leaves after the derived one. Top-down parsers that
+        derive the left-most node each time should keep the pending nodes in their own stack, and use
+        ``derive_node()`` instead.
         """
-        # get the node to derive
-        non_terminal_node = self.leaves[non_terminal_index]
+        new_nodes = self.derive_node(self.leaves[non_terminal_index], new_pieces, corresponding_production)
+
+        # replace the derived node in leaves with new nodes
+        self.leaves[non_terminal_index : non_terminal_index + 1] = new_nodes
 
+    def derive_node(
+        self,
+        non_terminal_node: ParseTreeNode,
+        new_pieces: list[cfg.Piece] | None,
+        corresponding_production: Production,
+    ) -> list[ParseTreeNode]:
+        """
+        Derive the NonTerminal node into new pieces, without updating ``leaves``.
+
+        Rets:
+
+        The newly created child nodes, from left to right. Empty list if derived to epsilon.
+
+        General Usage:
+
+        - Use to derive non-terminal when using LL(1) Parser, with a prediction stack of pending nodes.
+        """
         # check if it could be derived
         if not isinstance(non_terminal_node.node_type, cfg.NonTerminal):
             raise errors.DerivationError(non_terminal_node.node_type, new_pieces)
@@ -210,12 +270,7 @@ class ParseTree:
         # could be derived, add pointers to parent node
         non_terminal_node.pointers.extend(new_nodes)
 
-        # insert new nodes to previous place of the parent node
-        self.leaves = (
-            self.leaves[:non_terminal_index]
-            + new_nodes
-            + self.leaves[non_terminal_index + 1 :]
-        )
+        return new_nodes
 
     def is_valid(self) -> bool:
         """
@@ -243,6 +298,116 @@ class ParseTree:
 
         return True
 
+    def restore_origin(self, transform: cfg.GrammarTransform) -> "ParseTree":
+        """
+        Return the parse tree of the original CFG, from this parse tree of a transformed CFG, built by either top-down
+        or bottom-up parser.
+
+        Params:
+
+        - ``transform`` The GrammarTransform returned by the transformation, e.g. ``CFGSystem.to_ll1_form()``.
+
+        Notice:
+
+        - Token leaves are shared by both trees, non-terminal nodes are newly created.
+        - This parse tree should be valid, and the productions of its nodes should be in ``transform.cfg``. Unit
+          reductions skipped by LR parser should be restored first, checkout ``restore_unit_chains()``.
+        - If the transform is chained after others (checkout ``GrammarTransform.then()``), all of them are restored.
+        """
+        restored_tree = self
+        while transform is not None:
+            restored_tree = restored_tree._restore_by_transform(transform)
+            transform = transform.previous
+        return restored_tree
+
+    def _restore_by_transform(self, transform: cfg.GrammarTransform) -> "ParseTree":
+        """
+        Restore this parse tree through a single transform, ignoring ``transform.previous``.
+        """
+        assert len(self.entries) == 1 and self.is_valid_for_top_down()
+
+        # evaluate origin templates with explicit stacks, since tails of eliminated left recursion could be deep.
+        # tasks:
+        # ("node", node, inputs)                restore a node of this tree, push its result
+        # ("template", template, node, inputs)  evaluate a template of the node, push its result
+        # ("call", child_node, arg_count)       pop args, then restore the child with them as inputs
+        # ("build", production, arg_count)      pop children, build a node of the original production
+        values: list[ParseTreeNode] = []
+        tasks: list[tuple] = [("node", self.entries[0], ())]
+
+        while len(tasks) > 0:
+            task = tasks.pop()
+            task_type = task[0]
+
+            if task_type == "node":
+                _, node, inputs = task
+                # token leaves are restored as is
+                if not isinstance(node.node_type, cfg.NonTerminal):
+                    values.append(node)
+                    continue
+                tasks.append(("template", transform.get_origin_template(node.production), node, inputs))
+
+            elif task_type == "template":
+                _, template, node, inputs = task
+                if isinstance(template, cfg.OriginInput):
+                    values.append(inputs[template.index])
+                    continue
+                if isinstance(template, cfg.OriginChild):
+                    tasks.append(("call", node.pointers[template.child], len(template.args)))
+                else:
+                    tasks.append(("build", template.production, len(template.args)))
+                # args are evaluated from left to right, results are pushed in order
+                for arg in reversed(template.args):
+                    tasks.append(("template", arg, node, inputs))
+
+            elif task_type == "call":
+                _, child, arg_count = task
+                args = tuple(values[len(values) - arg_count:])
+                del values[len(values) - arg_count:]
+                tasks.append(("node", child, args))
+
+            else:
+                _, production, arg_count = task
+                children = values[len(values) - arg_count:]
+                del values[len(values) - arg_count:]
+                if len(children) == 0:
+                    children = [copy(self.epsilon_leaf)]
+                new_node = ParseTreeNode(production.source, pointers=children)
+                new_node.production = production
+                values.append(new_node)
+
+        assert len(values) == 1
+        restored_tree = ParseTree([values[0]], epsilon_terminal=self.epsilon_leaf.node_type)
+        restored_tree.leaves = copy(self.leaves)
+        return restored_tree
+
+    def restore_unit_chains(self) -> "ParseTree":
+        """
+        Restore the unit reductions skipped by LR parser, in place, and return this parse tree.
+
+        For each node with ``skipped_units``, e.g. ``[T -> F, E -> T]`` on node F, nodes T and E are created as the
+        chain E -> T -> F, and E takes the place of F in its parent.
+        """
+
+        def wrap(node: ParseTreeNode) -> ParseTreeNode:
+            for production in node.skipped_units:
+                parent = ParseTreeNode(production.source, pointers=[node])
+                parent.production = production
+                node = parent
+            return node
+
+        node_stack: list[ParseTreeNode] = copy(self.entries)
+        self.entries = [wrap(node) if node.skipped_units else node for node in self.entries]
+
+        # dfs over the nodes of original tree
+        while len(node_stack) > 0:
+            node = node_stack.pop()
+            node.skipped_units = None
+            node_stack.extend(node.pointers)
+            node.pointers = [wrap(child) if child.skipped_units else child for child in node.pointers]
+
+        return self
+
     def to_graphviz(self) -> gv.Digraph:
         graph = gv.Digraph(name="Parse Tree")
 
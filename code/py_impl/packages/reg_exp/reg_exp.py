@@ -1,5 +1,5 @@
 import automata as fa
-from typing import Iterable
+from typing import Iterable, Callable
 
 
 class RegularExpr:
@@ -14,8 +14,10 @@ class RegularExpr:
     #
     # Notice:
     # - It's recommend to only have one single Start and End node in the Automata generated.
+    # - If `utf8` is True, to_fa() should return an automaton over UTF-8 bytes (int 0~255) instead of
+    #   chars. Composite expressions only need to pass this flag down to sub expressions.
 
-    def to_fa(self) -> fa.FA:
+    def to_fa(self, utf8: bool = False) -> fa.FA:
         raise NotImplementedError()
 
 
@@ -28,7 +30,10 @@ class CharExpr(RegularExpr):
         super().__init__()
         self._char = char
 
-    def to_fa(self) -> fa.FA:
+    def to_fa(self, utf8: bool = False) -> fa.FA:
+        if utf8:
+            return utf8_ranges_to_fa([(ord(self._char), ord(self._char))])
+
         start_node: fa.FANode = fa.FANode(is_start=True)
         end_node: fa.FANode = fa.FANode(is_end=True)
         start_node.point_to(self._char, end_node.nid)
@@ -39,16 +44,16 @@ class AddListExpr(RegularExpr):
     def __init__(self, expr_list: list[RegularExpr]):
         self.expr_list = expr_list
 
-    def to_fa(self):
+    def to_fa(self, utf8: bool = False):
         if len(self.expr_list) < 2:
-            return self.expr_list[0].to_fa()
+            return self.expr_list[0].to_fa(utf8)
 
         new_expr = AddExpr(self.expr_list[0], self.expr_list[1])
 
         for idx in range(2, len(self.expr_list)):
             new_expr = AddExpr(new_expr, self.expr_list[idx])
 
-        return new_expr.to_fa()
+        return new_expr.to_fa(utf8)
 
 
 class AddExpr(RegularExpr):
@@ -66,13 +71,13 @@ class AddExpr(RegularExpr):
         self._left = left
         self._right = right
 
-    def to_fa(self) -> fa.FA:
+    def to_fa(self, utf8: bool = False) -> fa.FA:
         start_node: fa.FANode = fa.FANode(is_start=True, label="And_S")
         end_node: fa.FANode = fa.FANode(is_end=True, label="And_E")
 
         # convert two sub regex to fa
-        left_fa = self._left.to_fa()
-        right_fa = self._right.to_fa()
+        left_fa = self._left.to_fa(utf8)
+        right_fa = self._right.to_fa(utf8)
 
         # add epsilon moves to this two sub regex
         for node in left_fa.get_start_states():
@@ -113,8 +118,8 @@ class MulListExpr(RegularExpr):
         self._new_expr: RegularExpr
         self._construct_new_expr()
 
-    def to_fa(self):
-        return self._new_expr.to_fa()
+    def to_fa(self, utf8: bool = False):
+        return self._new_expr.to_fa(utf8)
 
     def _construct_new_expr(self):
         if len(self.expr_list) < 2:
@@ -143,13 +148,13 @@ class MulExpr(RegularExpr):
         self._left = left
         self._right = right
 
-    def to_fa(self) -> fa.FA:
+    def to_fa(self, utf8: bool = False) -> fa.FA:
         start_node: fa.FANode = fa.FANode(is_start=True, label="Mul_S")
         end_node: fa.FANode = fa.FANode(is_end=True, label="Mul_E")
         mid_start_node: fa.FANode = fa.FANode(label="Mul_M")
 
-        left_fa = self._left.to_fa()
-        right_fa = self._right.to_fa()
+        left_fa = self._left.to_fa(utf8)
+        right_fa = self._right.to_fa(utf8)
 
         # start node point to left_fa start
         for node in left_fa.get_start_states():
@@ -195,12 +200,12 @@ class WildCardExpr(RegularExpr):
         super().__init__()
         self._left = left
 
-    def to_fa(self) -> fa.FA:
+    def to_fa(self, utf8: bool = False) -> fa.FA:
         start_node: fa.FANode = fa.FANode(is_start=True, label="WC_S")
         matched_node: fa.FANode = fa.FANode(label="WC_M")
         end_node: fa.FANode = fa.FANode(is_end=True, label="WC_E")
 
-        left_fa = self._left.to_fa()
+        left_fa = self._left.to_fa(utf8)
 
         # point start to end
         start_node.point_to(None, end_node.nid)
@@ -240,10 +245,180 @@ class CharListExpr(RegularExpr):
     def __init__(self, char_list: Iterable[str]):
         self._char_list: Iterable[str] = char_list
 
-    def to_fa(self) -> fa.FA:
+    def to_fa(self, utf8: bool = False) -> fa.FA:
+        if utf8:
+            return utf8_ranges_to_fa(code_points_to_ranges(ord(char) for char in self._char_list))
+
         start_node: fa.FANode = fa.FANode(is_start=True)
         end_node: fa.FANode = fa.FANode(is_end=True)
         for char in self._char_list:
             start_node.point_to(char, end_node.nid)
 
         return fa.FA({start_node.nid: start_node, end_node.nid: end_node})
+
+
+class CharRangeExpr(RegularExpr):
+    """
+    Match a char inside any of the given inclusive ranges.
+
+    CharRangeExpr([('a', 'z'), ('0', '9')]) -> a|b|...|z|0|...|9
+
+    This expression is designed for large Unicode classes. The char level automaton still has one edge per code
+    point, so always use ``to_fa(utf8=True)`` for such classes, which produces a byte level automaton instead.
+    """
+
+    _ranges: list[tuple[int, int]]
+
+    def __init__(self, ranges: Iterable[tuple[str, str]]):
+        super().__init__()
+        self._ranges = []
+        for start, end in ranges:
+            if ord(start) > ord(end):
+                raise ValueError(f"Invalid char range: {start}-{end}")
+            self._ranges.append((ord(start), ord(end)))
+
+    @staticmethod
+    def from_predicate(predicate: Callable[[str], bool], max_code_point: int = 0x10FFFF) -> "CharRangeExpr":
+        """
+        Create expression that matches all code points that satisfy the predicate. E.g.: ``str.isalpha``.
+        """
+        return CharRangeExpr(
+            (chr(start), chr(end))
+            for start, end in code_points_to_ranges(
+                cp for cp in range(max_code_point + 1) if predicate(chr(cp))
+            )
+        )
+
+    def to_fa(self, utf8: bool = False) -> fa.FA:
+        if utf8:
+            return utf8_ranges_to_fa(self._ranges)
+
+        start_node: fa.FANode = fa.FANode(is_start=True)
+        end_node: fa.FANode = fa.FANode(is_end=True)
+        for start, end in self._ranges:
+            for cp in range(start, end + 1):
+                start_node.point_to(chr(cp), end_node.nid)
+
+        return fa.FA({start_node.nid: start_node, end_node.nid: end_node})
+
+
+# UTF-8 byte automaton construction.
+#
+# A code point range is first split into sequences of byte ranges, every sequence covers code points with same
+# encoded length and same leading bytes pattern. E.g.: U+0080~U+07FF -> [C2-DF][80-BF]
+#
+# Then those sequences are compiled into a trie from the last byte to the first one, the nodes that represent
+# identical suffix are shared, so continuation bytes like [80-BF] will not be duplicated for every leading byte.
+
+# max code point of encoded length 1, 2, 3, 4
+_UTF8_LENGTH_BOUNDARIES = (0x7F, 0x7FF, 0xFFFF, 0x10FFFF)
+_SURROGATE_START = 0xD800
+_SURROGATE_END = 0xDFFF
+
+
+def code_points_to_ranges(code_points: Iterable[int]) -> list[tuple[int, int]]:
+    """
+    Merge code points into a sorted list of disjoint inclusive ranges.
+    """
+    ranges: list[tuple[int, int]] = []
+    for cp in sorted(set(code_points)):
+        if len(ranges) > 0 and ranges[-1][1] + 1 == cp:
+            ranges[-1] = (ranges[-1][0], cp)
+        else:
+            ranges.append((cp, cp))
+    return ranges
+
+
+def utf8_byte_sequences(start: int, end: int) -> list[list[tuple[int, int]]]:
+    """
+    Split an inclusive code point range into sequences of inclusive byte ranges.
+
+    Concatenation of each byte ranges in a sequence exactly matches the UTF-8 encoding of a part of the code point
+    range. Surrogates are excluded since they could not be encoded.
+    """
+    sequences: list[list[tuple[int, int]]] = []
+    process_list: list[tuple[int, int]] = [(start, end)]
+
+    while len(process_list) > 0:
+        start, end = process_list.pop()
+        if start > end:
+            continue
+
+        # remove surrogates
+        if start <= _SURROGATE_END and end >= _SURROGATE_START:
+            process_list.append((_SURROGATE_END + 1, end))
+            process_list.append((start, _SURROGATE_START - 1))
+            continue
+
+        # split by encoded length
+        split = False
+        for boundary in _UTF8_LENGTH_BOUNDARIES[:-1]:
+            if start <= boundary < end:
+                process_list.append((boundary + 1, end))
+                process_list.append((start, boundary))
+                split = True
+                break
+        if split:
+            continue
+
+        # ascii, single byte range
+        if end <= 0x7F:
+            sequences.append([(start, end)])
+            continue
+
+        # split until every continuation byte of start and end covers the full [80-BF] range, or has same prefix.
+        for i in range(1, 4):
+            max_tail = (1 << (6 * i)) - 1
+            if (start & ~max_tail) != (end & ~max_tail):
+                if (start & max_tail) != 0:
+                    process_list.append(((start | max_tail) + 1, end))
+                    process_list.append((start, start | max_tail))
+                    split = True
+                    break
+                if (end & max_tail) != max_tail:
+                    process_list.append((end & ~max_tail, end))
+                    process_list.append((start, (end & ~max_tail) - 1))
+                    split = True
+                    break
+        if split:
+            continue
+
+        start_bytes = chr(start).encode('utf-8')
+        end_bytes = chr(end).encode('utf-8')
+        sequences.append(list(zip(start_bytes, end_bytes)))
+
+    # process list is used as a stack, restore ascending order
+    sequences.sort()
+    return sequences
+
+
+def utf8_ranges_to_fa(ranges: Iterable[tuple[int, int]]) -> fa.FA:
+    """
+    Generate a byte level automaton that accepts the UTF-8 encoding of any code point in the ranges.
+    """
+    start_node: fa.FANode = fa.FANode(is_start=True)
+    end_node: fa.FANode = fa.FANode(is_end=True)
+    node_dict: dict[str, fa.FANode] = {start_node.nid: start_node, end_node.nid: end_node}
+
+    # shared suffix nodes, key is (byte range, nid of the node this byte range leads to)
+    suffix_cache: dict[tuple[tuple[int, int], str], fa.FANode] = {}
+
+    for start, end in ranges:
+        for sequence in utf8_byte_sequences(start, end):
+            # build from the last byte range, reuse node that represents the same suffix
+            next_nid = end_node.nid
+            for byte_range in reversed(sequence[1:]):
+                suffix_node = suffix_cache.get((byte_range, next_nid))
+                if suffix_node is None:
+                    suffix_node = fa.FANode()
+                    for byte in range(byte_range[0], byte_range[1] + 1):
+                        suffix_node.point_to(byte, next_nid)
+                    suffix_cache[(byte_range, next_nid)] = suffix_node
+                    node_dict[suffix_node.nid] = suffix_node
+                next_nid = suffix_node.nid
+
+            # leading byte range starts from the start node
+            for byte in range(sequence[0][0], sequence[0][1] + 1):
+                start_node.point_to(byte, next_nid)
+
+    return fa.FA(node_dict)
@@ -1 +1,7 @@
 from .fa_test import (FAToDFATest, FADualStateNodesTest)
+from .la_test import (LAChannelTest, LAPositionTest, LAUtf8Test, LAMaximalMunchTest, LAKeywordTest)
+from .cfg_analysis_test import (CFGFirstFollowTest, CFGLazyAnalysisTest, CFGReduceTest,
+                                CFGEpsilonEliminationTest, CFGSymbolTableTest)
+from .parser_test import (LLParserTest, LLTransformTest, CLRParserTest, LRParseTableTest, LRPrecedenceTest,
+                          LRUnitProductionTest, LALRParserTest, SLRParserTest, GLRParserTest,
+                          ParserCacheTest, CYKParserTest)
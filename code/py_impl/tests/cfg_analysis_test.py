@@ -0,0 +1,256 @@
+import unittest as ut
+from cfg import *
+from cfg.grammar_type import ChomskyGrammarSystem, ChomskyProduction, NotContextFree
+
+terminal_int = Terminal(name='int')
+terminal_add = Terminal(name='+')
+terminal_mul = Terminal(name='*')
+terminal_eof = Terminal(name='$')
+terminal_left_para = Terminal(name='(')
+terminal_right_para = Terminal(name=')')
+non_terminal_s = NonTerminal(name='S')
+non_terminal_e = NonTerminal(name='E')
+non_terminal_f = NonTerminal(name='F')
+non_terminal_t = NonTerminal(name='T')
+non_terminal_u = NonTerminal(name='U')
+
+
+def get_expr_cfg() -> CFGSystem:
+    return CFGSystem(production_list=[
+        # S = E EOF
+        Production(source=non_terminal_s, target=Derivation(pieces=[non_terminal_e, terminal_eof])),
+        # E = T F
+        Production(source=non_terminal_e, target=Derivation(pieces=[non_terminal_t, non_terminal_f])),
+        # F = epsilon | + E
+        Production(source=non_terminal_f, target=Derivation(pieces=None)),
+        Production(source=non_terminal_f, target=Derivation(pieces=[terminal_add, non_terminal_e])),
+        # T = (E) | int U
+        Production(source=non_terminal_t,
+                   target=Derivation(pieces=[terminal_left_para, non_terminal_e, terminal_right_para])),
+        Production(source=non_terminal_t, target=Derivation(pieces=[terminal_int, non_terminal_u])),
+        # U = epsilon | * T
+        Production(source=non_terminal_u, target=Derivation(pieces=None)),
+        Production(source=non_terminal_u, target=Derivation(pieces=[terminal_mul, non_terminal_t])),
+    ], entry=non_terminal_s)
+
+
+class CFGFirstFollowTest(ut.TestCase):
+    def setUp(self):
+        self.cfg_sys = get_expr_cfg()
+
+    def test_first_sets(self):
+        first_sets = self.cfg_sys.first_sets
+        self.assertEqual(first_sets[non_terminal_s], {terminal_left_para, terminal_int})
+        self.assertEqual(first_sets[non_terminal_f], {terminal_add, None})
+        self.assertEqual(first_sets[non_terminal_u], {terminal_mul, None})
+        self.assertEqual(self.cfg_sys.nullable_set, {non_terminal_f, non_terminal_u})
+
+    def test_follow_sets(self):
+        follow_sets = self.cfg_sys.follow_sets
+        self.assertEqual(follow_sets[non_terminal_e], {terminal_eof, terminal_right_para})
+        self.assertEqual(follow_sets[non_terminal_t], {terminal_add, terminal_eof, terminal_right_para})
+        self.assertEqual(follow_sets[non_terminal_u], {terminal_add, terminal_eof, terminal_right_para})
+
+    def test_first_set_of_pieces(self):
+        self.assertEqual(
+            self.cfg_sys.calc_first_set_of_pieces([non_terminal_f, non_terminal_u]),
+            {terminal_add, terminal_mul, None},
+        )
+
+    def test_suffix_first_masks(self):
+        for prod in self.cfg_sys.production_list:
+            pieces = prod.target.pieces or []
+            for offset in range(len(pieces)):
+                self.assertEqual(
+                    self.cfg_sys.get_suffix_first_mask(prod, offset),
+                    self.cfg_sys.calc_first_mask_of_pieces(pieces[offset:]),
+                )
+            self.assertEqual(self.cfg_sys.get_suffix_first_mask(prod, len(pieces)), EPSILON_BIT)
+
+    def test_long_chain_grammar(self):
+        # N0 -> N1 x, N1 -> N2 x, ..., far deeper than the python recursion limit
+        chain_len = 5000
+        terminal_x = Terminal(name='x')
+        non_terminals = [NonTerminal(name=f'N{i}') for i in range(chain_len + 1)]
+        production_list = [
+            Production(source=non_terminals[i], target=Derivation(pieces=[non_terminals[i + 1], terminal_x]))
+            for i in range(chain_len)
+        ]
+        production_list.append(Production(source=non_terminals[-1], target=Derivation(pieces=[terminal_int])))
+        cfg_sys = CFGSystem(production_list, entry=non_terminals[0])
+
+        self.assertEqual(cfg_sys.first_sets[non_terminals[0]], {terminal_int})
+        self.assertEqual(cfg_sys.follow_sets[non_terminals[-1]], {terminal_x})
+
+
+class CFGLazyAnalysisTest(ut.TestCase):
+    def test_generated_on_access(self):
+        cfg_sys = get_expr_cfg()
+        self.assertNotIn('_follow_masks', vars(cfg_sys))
+        self.assertNotIn('_first_masks', vars(cfg_sys))
+
+        # production dict does not need FIRST sets
+        self.assertEqual(len(cfg_sys.production_dict[non_terminal_t]), 2)
+        self.assertNotIn('_first_masks', vars(cfg_sys))
+
+        self.assertEqual(cfg_sys.follow_sets[non_terminal_e], {terminal_eof, terminal_right_para})
+        self.assertIn('_first_masks', vars(cfg_sys))
+
+    def test_invalidated_on_change(self):
+        cfg_sys = get_expr_cfg()
+        self.assertEqual(cfg_sys.first_sets[non_terminal_u], {terminal_mul, None})
+
+        # U = / T
+        terminal_div = Terminal(name='/')
+        cfg_sys.add_production(
+            Production(source=non_terminal_u, target=Derivation(pieces=[terminal_div, non_terminal_t]))
+        )
+        self.assertEqual(cfg_sys.first_sets[non_terminal_u], {terminal_mul, terminal_div, None})
+        self.assertIs(cfg_sys.symbols.get_terminal('/'), cfg_sys.production_list[-1].target.pieces[0])
+
+
+class CFGReduceTest(ut.TestCase):
+    def test_remove_dead_productions(self):
+        non_terminal_a = NonTerminal(name='A')
+        non_terminal_b = NonTerminal(name='B')
+        non_terminal_c = NonTerminal(name='C')
+        production_list = [
+            # S = E $ | A $
+            Production(source=non_terminal_s, target=Derivation(pieces=[non_terminal_e, terminal_eof])),
+            Production(source=non_terminal_s, target=Derivation(pieces=[non_terminal_a, terminal_eof])),
+            # E = int | ( E )
+            Production(source=non_terminal_e, target=Derivation(pieces=[terminal_int])),
+            Production(source=non_terminal_e,
+                       target=Derivation(pieces=[terminal_left_para, non_terminal_e, terminal_right_para])),
+            # A = + A, never terminates
+            Production(source=non_terminal_a, target=Derivation(pieces=[terminal_add, non_terminal_a])),
+            # B = C * | epsilon, C = int, unreachable
+            Production(source=non_terminal_b, target=Derivation(pieces=[non_terminal_c, terminal_mul])),
+            Production(source=non_terminal_b, target=Derivation(pieces=None)),
+            Production(source=non_terminal_c, target=Derivation(pieces=[terminal_int])),
+        ]
+        cfg_sys = CFGSystem(production_list, entry=non_terminal_s)
+        reduced_cfg, origin = cfg_sys.reduced()
+
+        self.assertEqual(reduced_cfg.production_list, [production_list[0], production_list[2], production_list[3]])
+        for prod, origin_prod in zip(reduced_cfg.production_list, origin):
+            self.assertIn(origin_prod, cfg_sys.production_list)
+            self.assertEqual(prod, origin_prod)
+        self.assertEqual(reduced_cfg.used_pieces,
+                         {non_terminal_s, non_terminal_e, terminal_eof, terminal_int, terminal_left_para,
+                          terminal_right_para})
+        self.assertEqual(cfg_sys.calc_productive_set() - reduced_cfg.used_pieces,
+                         {non_terminal_b, non_terminal_c, terminal_add, terminal_mul})
+
+    def test_productive_order(self):
+        # E is found productive before T = + E F is counted, T still waits for F
+        production_list = [
+            Production(source=non_terminal_s, target=Derivation(pieces=[non_terminal_e, terminal_eof])),
+            Production(source=non_terminal_e, target=Derivation(pieces=[terminal_int])),
+            Production(source=non_terminal_t, target=Derivation(pieces=[terminal_add, non_terminal_e, non_terminal_f])),
+            Production(source=non_terminal_f, target=Derivation(pieces=[non_terminal_f, terminal_mul])),
+        ]
+        productive_set = CFGSystem(production_list, entry=non_terminal_s).calc_productive_set()
+        self.assertNotIn(non_terminal_t, productive_set)
+        self.assertNotIn(non_terminal_f, productive_set)
+
+    def test_unproductive_entry(self):
+        production_list = [
+            Production(source=non_terminal_s, target=Derivation(pieces=[terminal_add, non_terminal_s])),
+        ]
+        with self.assertRaises(RuntimeError):
+            CFGSystem(production_list, entry=non_terminal_s).reduced()
+
+
+def get_production_strs(cfg_sys: CFGSystem) -> set[str]:
+    return {repr(prod) for prod in cfg_sys.production_list}
+
+
+class CFGEpsilonEliminationTest(ut.TestCase):
+    def test_eliminate_epsilon(self):
+        transform = get_expr_cfg().eliminate_epsilon()
+        self.assertEqual(get_production_strs(transform.cfg), {
+            'S -> E$', 'E -> TF', 'E -> T', 'F -> +E',
+            'T -> (E)', 'T -> intU', 'T -> int', 'U -> *T',
+        })
+        # E -> T omits F, which is restored by F -> epsilon
+        index = [repr(prod) for prod in transform.cfg.production_list].index('E -> T')
+        self.assertEqual(
+            transform.origin_templates[index],
+            OriginProduction(get_expr_cfg().production_list[1], (OriginChild(0), OriginProduction(
+                get_expr_cfg().production_list[2]))),
+        )
+
+    def test_nullable_entry(self):
+        # S = S + | epsilon
+        transform = CFGSystem([
+            Production(source=non_terminal_s, target=Derivation(pieces=[non_terminal_s, terminal_add])),
+            Production(source=non_terminal_s, target=Derivation(pieces=None)),
+        ], entry=non_terminal_s).eliminate_epsilon()
+        self.assertEqual(transform.cfg.entry.name, "S'")
+        self.assertEqual(get_production_strs(transform.cfg), {"S' -> S", "S' -> \\e", 'S -> S+', 'S -> +'})
+
+    def test_eliminate_unit_productions(self):
+        # S = E $, E = T | E + T, T = int | ( E )
+        transform = CFGSystem([
+            Production(source=non_terminal_s, target=Derivation(pieces=[non_terminal_e, terminal_eof])),
+            Production(source=non_terminal_e, target=Derivation(pieces=[non_terminal_t])),
+            Production(source=non_terminal_e, target=Derivation(pieces=[non_terminal_e, terminal_add, non_terminal_t])),
+            Production(source=non_terminal_t, target=Derivation(pieces=[terminal_int])),
+            Production(source=non_terminal_t,
+                       target=Derivation(pieces=[terminal_left_para, non_terminal_e, terminal_right_para])),
+        ], entry=non_terminal_s).eliminate_unit_productions()
+        self.assertEqual(get_production_strs(transform.cfg), {
+            'S -> E$', 'E -> E+T', 'E -> int', 'E -> (E)', 'T -> int', 'T -> (E)',
+        })
+
+    def test_chomsky_grammar(self):
+        non_terminal_a = NonTerminal(name='A')
+        terminal_a = Terminal(name='a')
+        # S = A S | epsilon, A = a | epsilon
+        grammar = ChomskyGrammarSystem(entry=non_terminal_s, productions=[
+            ChomskyProduction([non_terminal_s], [non_terminal_a, non_terminal_s]),
+            ChomskyProduction([non_terminal_s], []),
+            ChomskyProduction([non_terminal_a], [terminal_a]),
+            ChomskyProduction([non_terminal_a], []),
+        ])
+        eliminated = grammar.eliminate_epsilon_rules().eliminate_unit_productions()
+        self.assertEqual({repr(p) for p in eliminated.productions}, {
+            "S' -> AS", "S' -> a", "S' -> \\e", 'S -> AS', 'S -> a', 'A -> a',
+        })
+
+        with self.assertRaises(NotContextFree):
+            ChomskyGrammarSystem(entry=non_terminal_s, productions=[
+                ChomskyProduction([non_terminal_s], [non_terminal_a]),
+                ChomskyProduction([non_terminal_a, terminal_a], [terminal_a, non_terminal_a]),
+            ]).eliminate_epsilon_rules()
+
+
+class CFGSymbolTableTest(ut.TestCase):
+    def test_interned_pieces(self):
+        cfg_sys = get_expr_cfg()
+        symbols = cfg_sys.symbols
+
+        # one instance for each name
+        for prod in cfg_sys.production_list:
+            self.assertIs(prod.source, symbols.intern(NonTerminal(name=prod.source.name)))
+            for piece in prod.target.pieces or []:
+                self.assertIs(piece, symbols.intern(piece))
+        self.assertIs(cfg_sys.entry, symbols.intern(non_terminal_s))
+        self.assertEqual(cfg_sys.entry.id, symbols.non_terminals.index(cfg_sys.entry))
+
+    def test_terminal_ids(self):
+        cfg_sys = get_expr_cfg()
+        symbols = cfg_sys.symbols
+        terminal_add_interned = symbols.get_terminal('+')
+        self.assertEqual(terminal_add_interned, terminal_add)
+        self.assertIs(symbols.terminals[terminal_add_interned.id], terminal_add_interned)
+        self.assertEqual(cfg_sys.terminal_bit(terminal_add_interned), 1 << terminal_add_interned.id)
+        self.assertEqual(cfg_sys.terminal_bit(terminal_add), 1 << terminal_add_interned.id)
+        # non-terminal names and unknown names are not terminals
+        self.assertIsNone(symbols.get_terminal('E'))
+        self.assertEqual(symbols.get_terminal_id('-'), -1)
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,119 @@
+import unittest as ut
+import reg_exp as reg
+import lexical_analyzer as la
+
+
+def get_definitions(white_channel: la.TokenChannel) -> list[la.TokenDefinition]:
+    reg_digit = reg.CharListExpr('0123456789')
+    reg_white = reg.CharListExpr(' \n')
+    return [
+        la.TokenDefinition('int', reg.MulExpr(reg_digit, reg.WildCardExpr(reg_digit))),
+        la.TokenDefinition('+', reg.CharExpr('+')),
+        la.TokenDefinition('white', reg.MulExpr(reg_white, reg.WildCardExpr(reg_white)), channel=white_channel),
+    ]
+
+
+class LAChannelTest(ut.TestCase):
+    def test_skip_channel(self):
+        analyzer = la.LexicalAnalyzer(get_definitions(la.CHANNEL_SKIP), record_hidden=True)
+        pairs = analyzer.parse('12 + 3')
+        self.assertEqual([p.token_type for p in pairs], ['int', '+', 'int'])
+        self.assertEqual(analyzer.hidden_ranges, [])
+
+    def test_hidden_channel(self):
+        analyzer = la.LexicalAnalyzer(get_definitions(la.CHANNEL_HIDDEN), record_hidden=True)
+        pairs = analyzer.parse('12 + 3')
+        self.assertEqual([p.content for p in pairs], ['12', '+', '3'])
+        self.assertEqual(analyzer.hidden_ranges, [('white', 2, 3), ('white', 4, 5)])
+
+    def test_hidden_not_recorded_by_default(self):
+        analyzer = la.LexicalAnalyzer(get_definitions(la.CHANNEL_HIDDEN))
+        analyzer.parse('12 + 3')
+        self.assertEqual(analyzer.hidden_ranges, [])
+
+
+class LAPositionTest(ut.TestCase):
+    def test_line_col(self):
+        analyzer = la.LexicalAnalyzer(get_definitions(la.CHANNEL_SKIP))
+        pairs = analyzer.parse('12 +\n 3\n\n45')
+        self.assertEqual([p.start for p in pairs], [0, 3, 6, 9])
+        self.assertEqual([analyzer.get_line_col(p) for p in pairs], [(1, 1), (1, 4), (2, 2), (4, 1)])
+        self.assertEqual(analyzer.get_line_col(4), (1, 5))
+
+
+class LAUtf8Test(ut.TestCase):
+    def test_utf8_sequences_match_encoding(self):
+        for start, end in [(0, 0x10FFFF), (0x7F, 0x800), (0xD000, 0xE000), (0x10000, 0x10FFFF)]:
+            sequences = reg.utf8_byte_sequences(start, end)
+            for cp in [start, end, (start + end) // 2, 0x7FF, 0x800, 0xFFFF, 0x10000]:
+                if not (start <= cp <= end) or 0xD800 <= cp <= 0xDFFF:
+                    continue
+                encoded = chr(cp).encode('utf-8')
+                matched = [
+                    seq for seq in sequences
+                    if len(seq) == len(encoded) and all(lo <= b <= hi for b, (lo, hi) in zip(encoded, seq))
+                ]
+                self.assertEqual(len(matched), 1, f'U+{cp:X} not covered exactly once')
+
+    def test_unicode_identifier(self):
+        reg_letter = reg.CharRangeExpr.from_predicate(str.isalpha)
+        reg_white = reg.CharListExpr(' ')
+        analyzer = la.LexicalAnalyzer([
+            la.TokenDefinition('id', reg.MulExpr(reg_letter, reg.WildCardExpr(reg_letter)), utf8=True),
+            la.TokenDefinition('white', reg.MulExpr(reg_white, reg.WildCardExpr(reg_white)),
+                               channel=la.CHANNEL_SKIP, utf8=True),
+        ])
+        pairs = analyzer.parse('héllo 世界 𝔘x')
+        self.assertEqual([p.content for p in pairs], ['héllo', '世界', '𝔘x'])
+        self.assertEqual([p.start for p in pairs], [0, 7, 14])
+
+
+class LAMaximalMunchTest(ut.TestCase):
+    def test_longest_match_wins(self):
+        definitions = get_definitions(la.CHANNEL_SKIP)
+        definitions.append(la.TokenDefinition('++', reg.MulListExpr([reg.CharExpr('+'), reg.CharExpr('+')])))
+        analyzer = la.LexicalAnalyzer(definitions, maximal_munch=True)
+        pairs = analyzer.parse('1 ++ 2+3')
+        self.assertEqual([p.token_type for p in pairs], ['int', '++', 'int', '+', 'int'])
+        self.assertEqual([p.start for p in pairs], [0, 2, 5, 6, 7])
+
+    def test_failure_memoization(self):
+        # "a" or "a*b", the classic quadratic input for naive maximal munch
+        reg_a = reg.CharExpr('a')
+        analyzer = la.LexicalAnalyzer([
+            la.TokenDefinition('a', reg_a),
+            la.TokenDefinition('ab', reg.MulExpr(reg.WildCardExpr(reg_a), reg.CharExpr('b'))),
+        ], maximal_munch=True)
+        input_len = 2000
+        pairs = analyzer.parse('a' * input_len)
+        self.assertEqual(len(pairs), input_len)
+        analyzer.init_state()
+        self.assertEqual(analyzer.parse('aab')[0].content, 'aab')
+
+    def test_no_match(self):
+        analyzer = la.LexicalAnalyzer(get_definitions(la.CHANNEL_SKIP), maximal_munch=True)
+        with self.assertRaises(RuntimeError):
+            analyzer.parse('1 - 2')
+
+
+class LAKeywordTest(ut.TestCase):
+    def test_keyword_reclassified(self):
+        reg_letter = reg.CharListExpr('abcdefghijklmnopqrstuvwxyz')
+        reg_white = reg.CharListExpr(' ')
+        id_definition = la.TokenDefinition(
+            'id',
+            reg.MulExpr(reg_letter, reg.WildCardExpr(reg_letter)),
+            keywords=['if', 'else'],
+        )
+        analyzer = la.LexicalAnalyzer([
+            id_definition,
+            la.TokenDefinition('white', reg.MulExpr(reg_white, reg.WildCardExpr(reg_white)), channel=la.CHANNEL_SKIP),
+        ], maximal_munch=True)
+        pairs = analyzer.parse('if iffy else elsewhere')
+        self.assertEqual([p.token_type for p in pairs], ['if', 'id', 'else', 'id'])
+        with self.assertRaises(TypeError):
+            id_definition.keywords['while'] = 'while'
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,791 @@
+import tempfile
+import unittest as ut
+from unittest import mock
+from pathlib import Path
+import reg_exp as reg
+import lexical_analyzer as la
+import parser
+from cfg import *
+
+terminal_int = Terminal(name='int')
+terminal_add = Terminal(name='+')
+terminal_mul = Terminal(name='*')
+terminal_eof = Terminal(name='$')
+terminal_left_para = Terminal(name='(')
+terminal_right_para = Terminal(name=')')
+non_terminal_s = NonTerminal(name='S')
+non_terminal_e = NonTerminal(name='E')
+non_terminal_f = NonTerminal(name='F')
+non_terminal_t = NonTerminal(name='T')
+non_terminal_u = NonTerminal(name='U')
+
+
+def get_analyzer() -> la.LexicalAnalyzer:
+    reg_single_dec_number = reg.CharListExpr('0123456789')
+    reg_white = reg.CharListExpr('\n ')
+    return la.LexicalAnalyzer(
+        token_definitions=[
+            la.TokenDefinition('int', reg.MulExpr(reg_single_dec_number, reg.WildCardExpr(reg_single_dec_number))),
+            la.TokenDefinition('+', reg.CharExpr('+')),
+            la.TokenDefinition('*', reg.CharExpr('*')),
+            la.TokenDefinition('white', reg.MulExpr(reg_white, reg.WildCardExpr(reg_white)), channel=la.CHANNEL_SKIP),
+            la.TokenDefinition('(', reg.CharExpr('(')),
+            la.TokenDefinition(')', reg.CharExpr(')')),
+            la.TokenDefinition('$', reg.CharExpr('$')),
+        ],
+        use_dfa=True
+    )
+
+
+def get_ll_cfg() -> CFGSystem:
+    return CFGSystem(production_list=[
+        # S = E EOF
+        Production(source=non_terminal_s, target=Derivation(pieces=[non_terminal_e, terminal_eof])),
+        # E = T F
+        Production(source=non_terminal_e, target=Derivation(pieces=[non_terminal_t, non_terminal_f])),
+        # F = epsilon | + E
+        Production(source=non_terminal_f, target=Derivation(pieces=None)),
+        Production(source=non_terminal_f, target=Derivation(pieces=[terminal_add, non_terminal_e])),
+        # T = (E) | int U
+        Production(source=non_terminal_t,
+                   target=Derivation(pieces=[terminal_left_para, non_terminal_e, terminal_right_para])),
+        Production(source=non_terminal_t, target=Derivation(pieces=[terminal_int, non_terminal_u])),
+        # U = epsilon | * T
+        Production(source=non_terminal_u, target=Derivation(pieces=None)),
+        Production(source=non_terminal_u, target=Derivation(pieces=[terminal_mul, non_terminal_t])),
+    ], entry=non_terminal_s)
+
+
+def get_lr_cfg() -> CFGSystem:
+    return CFGSystem(production_list=[
+        # S = E EOF
+        Production(source=non_terminal_s, target=Derivation(pieces=[non_terminal_e, terminal_eof])),
+        # E = T + E | T
+        Production(source=non_terminal_e, target=Derivation(pieces=[non_terminal_t, terminal_add, non_terminal_e])),
+        Production(source=non_terminal_e, target=Derivation(pieces=[non_terminal_t])),
+        # T = (E) | int * T | int
+        Production(source=non_terminal_t,
+                   target=Derivation(pieces=[terminal_left_para, non_terminal_e, terminal_right_para])),
+        Production(source=non_terminal_t, target=Derivation(pieces=[terminal_int, terminal_mul, non_terminal_t])),
+        Production(source=non_terminal_t, target=Derivation(pieces=[terminal_int])),
+    ], entry=non_terminal_s)
+
+
+def get_left_recursive_cfg() -> CFGSystem:
+    return CFGSystem(production_list=[
+        # S = E EOF
+        Production(source=non_terminal_s, target=Derivation(pieces=[non_terminal_e, terminal_eof])),
+        # E = E + T | T
+        Production(source=non_terminal_e, target=Derivation(pieces=[non_terminal_e, terminal_add, non_terminal_t])),
+        Production(source=non_terminal_e, target=Derivation(pieces=[non_terminal_t])),
+        # T = T * F | F
+        Production(source=non_terminal_t, target=Derivation(pieces=[non_terminal_t, terminal_mul, non_terminal_f])),
+        Production(source=non_terminal_t, target=Derivation(pieces=[non_terminal_f])),
+        # F = (E) | int | int (E)
+        Production(source=non_terminal_f,
+                   target=Derivation(pieces=[terminal_left_para, non_terminal_e, terminal_right_para])),
+        Production(source=non_terminal_f, target=Derivation(pieces=[terminal_int])),
+        Production(source=non_terminal_f,
+                   target=Derivation(pieces=[terminal_int, terminal_left_para, non_terminal_e, terminal_right_para])),
+    ], entry=non_terminal_s)
+
+
+def get_flat_cfg() -> CFGSystem:
+    return CFGSystem(production_list=[
+        # S = E EOF
+        Production(source=non_terminal_s, target=Derivation(pieces=[non_terminal_e, terminal_eof])),
+        # E = E + E | E * E | + E | (E) | int
+        Production(source=non_terminal_e, target=Derivation(pieces=[non_terminal_e, terminal_add, non_terminal_e])),
+        Production(source=non_terminal_e, target=Derivation(pieces=[non_terminal_e, terminal_mul, non_terminal_e])),
+        Production(source=non_terminal_e, target=Derivation(pieces=[terminal_add, non_terminal_e])),
+        Production(source=non_terminal_e,
+                   target=Derivation(pieces=[terminal_left_para, non_terminal_e, terminal_right_para])),
+        Production(source=non_terminal_e, target=Derivation(pieces=[terminal_int])),
+    ], entry=non_terminal_s)
+
+
+def get_tree_str(node: parser.parse_tree.ParseTreeNode) -> str:
+    """Return the tree structure under the node in form of nested brackets, using types of leaves"""
+    if len(node.pointers) == 0:
+        return node.node_type.name
+    return '[' + ' '.join(get_tree_str(child) for child in node.pointers) + ']'
+
+
+def get_leaves(node: parser.parse_tree.ParseTreeNode) -> list[str]:
+    """Return content of all token leaves under the node, from left to right"""
+    if node.node_content is not None:
+        return [node.node_content.content]
+    leaves = []
+    for child in node.pointers:
+        leaves.extend(get_leaves(child))
+    return leaves
+
+
+class LLParserTest(ut.TestCase):
+    def test_parse(self):
+        tokens = get_analyzer().parse('5*(1+2*3)+4$')
+        ll_parser = parser.ll.LLParser(cfg_system=get_ll_cfg(), epsilon_terminal=Terminal(name='[e]'))
+        parse_tree = ll_parser.parse_token(tokens)
+        self.assertTrue(parse_tree.is_valid())
+        self.assertEqual([n.node_type.name for n in parse_tree.leaves], [t.token_type for t in tokens])
+
+    def test_parse_long_input(self):
+        tokens = get_analyzer().parse('(1+' * 1000 + '1' + ')' * 1000 + '+2*3$')
+        ll_parser = parser.ll.LLParser(cfg_system=get_ll_cfg(), epsilon_terminal=Terminal(name='[e]'))
+        parse_tree = ll_parser.parse_token(tokens)
+        self.assertTrue(parse_tree.is_valid())
+        self.assertEqual([n.node_type.name for n in parse_tree.leaves], [t.token_type for t in tokens])
+
+    def test_parse_error(self):
+        ll_parser = parser.ll.LLParser(cfg_system=get_ll_cfg(), epsilon_terminal=Terminal(name='[e]'))
+        with self.assertRaises(parser.ll.NoValidMove):
+            ll_parser.parse_token(get_analyzer().parse('1+*2$'))
+        with self.assertRaises(parser.errors.InvalidParseTreeError):
+            ll_parser.parse_token(get_analyzer().parse('1+2'))
+        with self.assertRaises(parser.errors.InvalidParseTreeError):
+            ll_parser.parse_token(get_analyzer().parse('1+2$3'))
+
+
+class LLTransformTest(ut.TestCase):
+    def test_parse_left_recursive(self):
+        tokens = get_analyzer().parse('1+2*3+4(5)$')
+        cfg_sys = get_left_recursive_cfg()
+        transform = cfg_sys.to_ll1_form()
+        ll_parser = parser.ll.LLParser(cfg_system=transform.cfg, epsilon_terminal=Terminal(name='[e]'))
+        parse_tree = ll_parser.parse_token(tokens).restore_origin(transform)
+
+        # the restored tree is left associative, and only uses original productions
+        self.assertEqual(
+            get_tree_str(parse_tree.entries[0]),
+            '[[[[[[int]]] + [[[int]] * [int]]] + [[int ( [[[int]]] )]]] $]',
+        )
+        node_list = [parse_tree.entries[0]]
+        while len(node_list) > 0:
+            node = node_list.pop()
+            if isinstance(node.node_type, NonTerminal):
+                self.assertIn(node.production, cfg_sys.production_list)
+                self.assertEqual([n.node_type for n in node.pointers], node.production.target.pieces)
+                node_list.extend(node.pointers)
+        self.assertEqual([n.node_type.name for n in parse_tree.leaves], [t.token_type for t in tokens])
+
+    def test_indirect_left_recursion(self):
+        # S = A $, A = B + | int, B = A * | (
+        production_list = [
+            Production(source=non_terminal_s, target=Derivation(pieces=[non_terminal_e, terminal_eof])),
+            Production(source=non_terminal_e, target=Derivation(pieces=[non_terminal_t, terminal_add])),
+            Production(source=non_terminal_e, target=Derivation(pieces=[terminal_int])),
+            Production(source=non_terminal_t, target=Derivation(pieces=[non_terminal_e, terminal_mul])),
+            Production(source=non_terminal_t, target=Derivation(pieces=[terminal_left_para])),
+        ]
+        transform = CFGSystem(production_list, entry=non_terminal_s).to_ll1_form()
+        tokens = get_analyzer().parse('1*+*+$')
+        ll_parser = parser.ll.LLParser(cfg_system=transform.cfg, epsilon_terminal=Terminal(name='[e]'))
+        parse_tree = ll_parser.parse_token(tokens).restore_origin(transform)
+        self.assertEqual(get_tree_str(parse_tree.entries[0]), '[[[[[[int] *] +] *] +] $]')
+
+    def test_long_chain(self):
+        # S = N0 $, Ni = Ni + | Ni+1, Nk = int. Far deeper than the python recursion limit
+        chain_len = 3000
+        non_terminals = [NonTerminal(name=f'N{i}') for i in range(chain_len + 1)]
+        production_list = [
+            Production(source=non_terminal_s, target=Derivation(pieces=[non_terminals[0], terminal_eof])),
+        ]
+        for i in range(chain_len):
+            production_list.append(
+                Production(source=non_terminals[i], target=Derivation(pieces=[non_terminals[i], terminal_add])))
+            production_list.append(
+                Production(source=non_terminals[i], target=Derivation(pieces=[non_terminals[i + 1]])))
+        production_list.append(Production(source=non_terminals[-1], target=Derivation(pieces=[terminal_int])))
+
+        transform = CFGSystem(production_list, entry=non_terminal_s).to_ll1_form()
+        # every Ni gets a tail Ni' = + Ni' | epsilon, no left recursion remains
+        self.assertEqual(len(transform.cfg.production_list), len(production_list) + chain_len)
+        for prod in transform.cfg.production_list:
+            self.assertNotEqual((prod.target.pieces or [None])[0], prod.source)
+
+    def test_hidden_left_recursion(self):
+        # S = U S + | int, U = epsilon | *
+        production_list = [
+            Production(source=non_terminal_s, target=Derivation(pieces=[non_terminal_u, non_terminal_s, terminal_add])),
+            Production(source=non_terminal_s, target=Derivation(pieces=[terminal_int])),
+            Production(source=non_terminal_u, target=Derivation(pieces=None)),
+            Production(source=non_terminal_u, target=Derivation(pieces=[terminal_mul])),
+        ]
+        with self.assertRaises(RuntimeError):
+            CFGSystem(production_list, entry=non_terminal_s).to_ll1_form()
+
+
+class CLRParserTest(ut.TestCase):
+    def test_parse(self):
+        tokens = get_analyzer().parse('5*(1+2*3)+4$')
+        lr_parser = parser.lr.CLRParser(cfg_sys=get_lr_cfg(), epsilon_terminal=Terminal(name='[e]'))
+        parse_tree = lr_parser.parse(tokens)
+        self.assertTrue(parse_tree.is_valid_for_bottom_up())
+        self.assertEqual(parse_tree.entries[0].node_type, non_terminal_s)
+        self.assertEqual(get_leaves(parse_tree.entries[0]), [t.content for t in tokens])
+
+    def test_canonical_collection(self):
+        # S = E $, E = T T, T = + T | int
+        stack_automaton = parser.lr.StackAutomaton(CFGSystem(production_list=[
+            Production(source=non_terminal_s, target=Derivation(pieces=[non_terminal_e, terminal_eof])),
+            Production(source=non_terminal_e, target=Derivation(pieces=[non_terminal_t, non_terminal_t])),
+            Production(source=non_terminal_t, target=Derivation(pieces=[terminal_add, non_terminal_t])),
+            Production(source=non_terminal_t, target=Derivation(pieces=[terminal_int])),
+        ], entry=non_terminal_s))
+        # the 10 canonical LR(1) states of the textbook grammar, plus the state after shifting $
+        self.assertEqual(len(stack_automaton.states), 11)
+        self.assertIs(stack_automaton.states[0], stack_automaton.start_state)
+
+        stack_items = stack_automaton.match_stack([terminal_add, terminal_add, terminal_int])
+        self.assertEqual([item.piece for item in stack_items], [terminal_add, terminal_add, terminal_int])
+        # states reached by the same pieces but with different lookaheads are not merged
+        self.assertIsNot(stack_items[0].state, stack_automaton.match_stack([non_terminal_t, terminal_add])[1].state)
+        self.assertIsNone(stack_automaton.match_stack([terminal_int, terminal_int, terminal_int]))
+
+    def test_parse_left_recursive(self):
+        tokens = get_analyzer().parse('1+2*3+4(5)$')
+        lr_parser = parser.lr.CLRParser(cfg_sys=get_left_recursive_cfg(), epsilon_terminal=Terminal(name='[e]'))
+        parse_tree = lr_parser.parse(tokens)
+        self.assertEqual(
+            get_tree_str(parse_tree.entries[0]),
+            '[[[[[[int]]] + [[[int]] * [int]]] + [[int ( [[[int]]] )]]] $]',
+        )
+
+    def test_parse_long_input(self):
+        lr_parser = parser.lr.CLRParser(cfg_sys=get_left_recursive_cfg(), epsilon_terminal=Terminal(name='[e]'))
+        tokens = get_analyzer().parse('1+' * 2000 + '1$')
+        token_count = len(tokens)
+        for _ in range(2):
+            parse_tree = lr_parser.parse(tokens)
+            self.assertEqual(len(parse_tree.entries), 1)
+            self.assertEqual([n.node_content for n in parse_tree.leaves], tokens)
+        self.assertEqual(len(tokens), token_count)
+
+    def test_parse_iter(self):
+        lr_parser = parser.lr.CLRParser(cfg_sys=get_left_recursive_cfg(), epsilon_terminal=Terminal(name='[e]'))
+        tokens = get_analyzer().parse('1+2*3+4(5)$')
+        pulled: list[la.TokenPair] = []
+
+        def token_generator(token_list):
+            for token in token_list:
+                pulled.append(token)
+                yield token
+
+        parse_tree = lr_parser.parse_iter(token_generator(tokens))
+        self.assertEqual(get_tree_str(parse_tree.entries[0]), get_tree_str(lr_parser.parse(tokens).entries[0]))
+        self.assertEqual([n.node_content for n in parse_tree.leaves], tokens)
+
+        # tokens after the unexpected lookahead ')' are never pulled
+        pulled.clear()
+        tokens = get_analyzer().parse('1+2)+3+4$')
+        with self.assertRaises(parser.lr.parser_lr.ShiftStateError):
+            lr_parser.parse_iter(token_generator(tokens))
+        self.assertEqual([t.content for t in pulled], ['1', '+', '2', ')'])
+
+
+class LALRParserTest(ut.TestCase):
+    def test_parse(self):
+        tokens = get_analyzer().parse('1+2*3+4(5)$')
+        lr_parser = parser.lr.LALRParser(cfg_sys=get_left_recursive_cfg(), epsilon_terminal=Terminal(name='[e]'))
+        self.assertEqual(lr_parser.reduce_conflicts, [])
+        parse_tree = lr_parser.parse(tokens)
+        self.assertEqual(
+            get_tree_str(parse_tree.entries[0]),
+            '[[[[[[int]]] + [[[int]] * [int]]] + [[int ( [[[int]]] )]]] $]',
+        )
+
+    def test_states_merged(self):
+        cfg_sys = get_left_recursive_cfg()
+        self.assertLess(
+            len(parser.lr.LALRAutomaton(cfg_sys).states),
+            len(parser.lr.StackAutomaton(cfg_sys).states),
+        )
+        # every state of LR(0) automaton is reached by a distinct kernel core
+        lalr_automaton = parser.lr.LALRAutomaton(cfg_sys)
+        kernel_cores = {
+            frozenset(item.core for item in state.items[:state.kernel_size]) for state in lalr_automaton.states
+        }
+        self.assertEqual(len(kernel_cores), len(lalr_automaton.states))
+
+    def test_merge_conflict(self):
+        # S = ( E + | ( T * | ) T + | ) E *, E = int, T = int. LR(1) but not LALR(1).
+        production_list = [
+            Production(source=non_terminal_s, target=Derivation(pieces=[non_terminal_u, terminal_eof])),
+        ]
+        for first, middle, last in [
+            (terminal_left_para, non_terminal_e, terminal_add),
+            (terminal_left_para, non_terminal_t, terminal_mul),
+            (terminal_right_para, non_terminal_t, terminal_add),
+            (terminal_right_para, non_terminal_e, terminal_mul),
+        ]:
+            production_list.append(Production(source=non_terminal_u, target=Derivation(pieces=[first, middle, last])))
+        production_list.append(Production(source=non_terminal_e, target=Derivation(pieces=[terminal_int])))
+        production_list.append(Production(source=non_terminal_t, target=Derivation(pieces=[terminal_int])))
+
+        clr_parser = parser.lr.CLRParser(cfg_sys=CFGSystem(production_list, entry=non_terminal_s))
+        self.assertEqual(clr_parser.stack_automaton.find_reduce_conflicts(), [])
+        clr_parser.parse(get_analyzer().parse('(1*$'))
+
+        lalr_parser = parser.lr.LALRParser(cfg_sys=CFGSystem(production_list, entry=non_terminal_s))
+        self.assertEqual(len(lalr_parser.reduce_conflicts), 1)
+        self.assertEqual(len(lalr_parser.reduce_conflicts[0][1]), 2)
+        with self.assertRaises(parser.lr.parser_lr.ReduceReduceConflict):
+            lalr_parser.parse(get_analyzer().parse('(1*$'))
+
+
+    def test_entry_ends_with_non_terminal(self):
+        # S = E F, E = E + int | int, F = $. Reductions at the end of entry production are made on the end of input.
+        cfg_sys = CFGSystem(production_list=[
+            Production(source=non_terminal_s, target=Derivation(pieces=[non_terminal_e, non_terminal_f])),
+            Production(source=non_terminal_e, target=Derivation(pieces=[non_terminal_e, terminal_add, terminal_int])),
+            Production(source=non_terminal_e, target=Derivation(pieces=[terminal_int])),
+            Production(source=non_terminal_f, target=Derivation(pieces=[terminal_eof])),
+        ], entry=non_terminal_s)
+        lalr_parser = parser.lr.LALRParser(cfg_sys=cfg_sys)
+        parse_tree = lalr_parser.parse(get_analyzer().parse('1+2$'))
+        self.assertEqual(get_tree_str(parse_tree.entries[0]), '[[[int] + int] [$]]')
+        # F = $ is reduced on the end of input (terminal id 0)
+        self.assertIn(lalr_parser.parse_table.reduce_action(3), [row[0] for row in lalr_parser.parse_table.action])
+
+
+class LRParseTableTest(ut.TestCase):
+    def test_table(self):
+        cfg_sys = get_lr_cfg()
+        lr_parser = parser.lr.CLRParser(cfg_sys=cfg_sys)
+        parse_table = lr_parser.parse_table
+        self.assertEqual(len(parse_table.action), len(lr_parser.stack_automaton.states))
+        self.assertEqual(parse_table.conflicts, {})
+        self.assertEqual(cfg_sys.production_list[parse_table.entry_production].source, non_terminal_s)
+
+        # int is shifted at start state, T = int is reduced on + after that
+        shift_action = parse_table.action[parse_table.start_state][cfg_sys.symbols.get_terminal_id('int')]
+        self.assertGreater(shift_action, 0)
+        reduce_action = parse_table.action[shift_action - 1][cfg_sys.symbols.get_terminal_id('+')]
+        self.assertEqual(cfg_sys.production_list[-reduce_action - 1].target.pieces, [terminal_int])
+        self.assertEqual(parse_table.action[shift_action - 1][cfg_sys.symbols.get_terminal_id('(')], 0)
+
+        with self.assertRaises(parser.errors.ParseErrorBase):
+            lr_parser.parse(get_analyzer().parse('1(2)$'))
+        with self.assertRaises(parser.errors.ParseErrorBase):
+            lr_parser.parse([la.TokenPair('unknown', '?')])
+        with self.assertRaises(parser.errors.ParseErrorBase):
+            lr_parser.parse(get_analyzer().parse('1$1'))
+
+    def test_shift_reduce_conflict(self):
+        # S = E $, E = E + E | int
+        lr_parser = parser.lr.CLRParser(cfg_sys=CFGSystem(production_list=[
+            Production(source=non_terminal_s, target=Derivation(pieces=[non_terminal_e, terminal_eof])),
+            Production(source=non_terminal_e, target=Derivation(pieces=[non_terminal_e, terminal_add, non_terminal_e])),
+            Production(source=non_terminal_e, target=Derivation(pieces=[terminal_int])),
+        ], entry=non_terminal_s))
+        self.assertEqual(len(lr_parser.parse_table.conflicts), 1)
+        # resolved as reduce, that is left associative
+        parse_tree = lr_parser.parse(get_analyzer().parse('1+2+3$'))
+        self.assertEqual(get_tree_str(parse_tree.entries[0]), '[[[[int] + [int]] + [int]] $]')
+
+
+class LRPrecedenceTest(ut.TestCase):
+    def test_parse(self):
+        precedence = parser.lr.PrecedenceTable([
+            (parser.lr.ASSOC_LEFT, [terminal_add]),
+            (parser.lr.ASSOC_LEFT, [terminal_mul]),
+        ])
+        for parser_class in (parser.lr.CLRParser, parser.lr.LALRParser, parser.lr.SLRParser):
+            lr_parser = parser_class(cfg_sys=get_flat_cfg(), precedence=precedence)
+            self.assertEqual(lr_parser.parse_table.conflicts, {})
+            parse_tree = lr_parser.parse(get_analyzer().parse('1+2*3+(4)$'))
+            self.assertEqual(
+                get_tree_str(parse_tree.entries[0]),
+                '[[[[int] + [[int] * [int]]] + [( [int] )]] $]',
+            )
+
+    def test_associativity(self):
+        precedence = parser.lr.PrecedenceTable().declare(parser.lr.ASSOC_RIGHT, ['+']).declare('left', ['*'])
+        lr_parser = parser.lr.LALRParser(cfg_sys=get_flat_cfg(), precedence=precedence)
+        parse_tree = lr_parser.parse(get_analyzer().parse('1+2*3*4+5$'))
+        self.assertEqual(
+            get_tree_str(parse_tree.entries[0]),
+            '[[[int] + [[[[int] * [int]] * [int]] + [int]]] $]',
+        )
+
+        precedence = parser.lr.PrecedenceTable([(parser.lr.ASSOC_NONASSOC, ['+']), (parser.lr.ASSOC_LEFT, ['*'])])
+        lr_parser = parser.lr.LALRParser(cfg_sys=get_flat_cfg(), precedence=precedence)
+        self.assertEqual(get_tree_str(lr_parser.parse(get_analyzer().parse('1+2*3$')).entries[0]),
+                         '[[[int] + [[int] * [int]]] $]')
+        with self.assertRaises(parser.lr.parser_lr.ShiftStateError):
+            lr_parser.parse(get_analyzer().parse('1+2+3$'))
+
+        with self.assertRaises(ValueError):
+            parser.lr.PrecedenceTable([('middle', ['+'])])
+
+    def test_production_precedence(self):
+        cfg_sys = get_flat_cfg()
+        unary_production = Production(source=non_terminal_e, target=Derivation(pieces=[terminal_add, non_terminal_e]))
+        precedence = parser.lr.PrecedenceTable([
+            (parser.lr.ASSOC_LEFT, ['+']),
+            (parser.lr.ASSOC_LEFT, ['*']),
+        ])
+
+        # unary + takes the precedence of binary +
+        lr_parser = parser.lr.CLRParser(cfg_sys=cfg_sys, precedence=precedence)
+        parse_tree = lr_parser.parse(get_analyzer().parse('+1*2$'))
+        self.assertEqual(get_tree_str(parse_tree.entries[0]), '[[+ [[int] * [int]]] $]')
+
+        # %prec UPLUS
+        precedence.declare(parser.lr.ASSOC_RIGHT, ['UPLUS']).set_production_precedence(unary_production, 'UPLUS')
+        lr_parser = parser.lr.CLRParser(cfg_sys=cfg_sys, precedence=precedence)
+        parse_tree = lr_parser.parse(get_analyzer().parse('+1*2$'))
+        self.assertEqual(get_tree_str(parse_tree.entries[0]), '[[[+ [int]] * [int]] $]')
+
+        # conflicts are left to the default resolution without declarations
+        self.assertGreater(len(parser.lr.CLRParser(cfg_sys=cfg_sys).parse_table.conflicts), 0)
+
+
+class LRUnitProductionTest(ut.TestCase):
+    def test_skip(self):
+        tokens = get_analyzer().parse('1+2*3+4(5)$')
+        full_tree = parser.lr.CLRParser(cfg_sys=get_left_recursive_cfg()).parse(tokens)
+        for parser_class in (parser.lr.CLRParser, parser.lr.LALRParser, parser.lr.SLRParser):
+            lr_parser = parser_class(cfg_sys=get_left_recursive_cfg(), skip_unit_productions=True)
+            parse_tree = lr_parser.parse(tokens)
+            # E -> T and T -> F are skipped
+            self.assertEqual(get_tree_str(parse_tree.entries[0]), '[[[[int] + [[int] * [int]]] + [int ( [int] )]] $]')
+            self.assertEqual([n.node_content for n in parse_tree.leaves], tokens)
+            self.assertEqual(
+                [prod.source for prod in parse_tree.entries[0].pointers[0].pointers[0].pointers[0].skipped_units],
+                [non_terminal_t, non_terminal_e],
+            )
+
+            # skipped nodes are restored on request
+            parse_tree.restore_unit_chains()
+            self.assertEqual(get_tree_str(parse_tree.entries[0]), get_tree_str(full_tree.entries[0]))
+            restored_node = parse_tree.entries[0].pointers[0].pointers[0].pointers[0]
+            self.assertEqual(restored_node.node_type, non_terminal_e)
+            self.assertEqual(restored_node.pointers[0].production.source, non_terminal_t)
+            self.assertIsNone(restored_node.pointers[0].pointers[0].skipped_units)
+
+    def test_skip_right_recursive(self):
+        tokens = get_analyzer().parse('5*(1+2*3)+4$')
+        full_tree = parser.lr.CLRParser(cfg_sys=get_lr_cfg()).parse(tokens)
+        lr_parser = parser.lr.LALRParser(cfg_sys=get_lr_cfg(), skip_unit_productions=True)
+        self.assertIsNone(parser.lr.LALRParser(cfg_sys=get_lr_cfg()).parse_table.unit_sources)
+        parse_tree = lr_parser.parse(tokens)
+        self.assertEqual(
+            get_tree_str(parse_tree.entries[0]),
+            '[[[int * [( [[int] + [int * [int]]] )]] + [int]] $]',
+        )
+        self.assertEqual(get_tree_str(parse_tree.restore_unit_chains().entries[0]), get_tree_str(full_tree.entries[0]))
+
+
+    def test_restore_origin(self):
+        tokens = get_analyzer().parse('5*(1+2*3)+4$')
+        full_tree = parser.lr.CLRParser(cfg_sys=get_lr_cfg(), epsilon_terminal=Terminal(name='[e]')).parse(tokens)
+        for transform in (get_lr_cfg().eliminate_epsilon(), get_lr_cfg().to_cnf()):
+            for parser_class in (parser.lr.CLRParser, parser.lr.LALRParser):
+                for skip_unit_productions in (False, True):
+                    lr_parser = parser_class(
+                        cfg_sys=transform.cfg,
+                        epsilon_terminal=Terminal(name='[e]'),
+                        skip_unit_productions=skip_unit_productions,
+                    )
+                    parse_tree = lr_parser.parse(tokens).restore_unit_chains().restore_origin(transform)
+                    self.assertEqual(get_tree_str(parse_tree.entries[0]), get_tree_str(full_tree.entries[0]))
+
+                    node_list = [parse_tree.entries[0]]
+                    while len(node_list) > 0:
+                        node = node_list.pop()
+                        if isinstance(node.node_type, NonTerminal):
+                            self.assertIn(node.production, get_lr_cfg().production_list)
+                            node_list.extend(node.pointers)
+                    self.assertEqual([n.node_content for n in parse_tree.leaves], tokens)
+
+
+class SLRParserTest(ut.TestCase):
+    def test_parse(self):
+        tokens = get_analyzer().parse('1+2*3+4(5)$')
+        lr_parser = parser.lr.SLRParser(cfg_sys=get_left_recursive_cfg(), epsilon_terminal=Terminal(name='[e]'))
+        self.assertEqual(len(lr_parser.stack_automaton.states), len(parser.lr.LALRAutomaton(lr_parser.cfg_sys).states))
+        parse_tree = lr_parser.parse(tokens)
+        self.assertEqual(
+            get_tree_str(parse_tree.entries[0]),
+            '[[[[[[int]]] + [[[int]] * [int]]] + [[int ( [[[int]]] )]]] $]',
+        )
+
+    def test_follow_lookahead(self):
+        # S = E + T | T, E = * T | int, T = E. LALR(1) but not SLR(1), since + is in FOLLOW(T).
+        production_list = [
+            Production(source=non_terminal_s, target=Derivation(pieces=[non_terminal_u, terminal_eof])),
+            Production(source=non_terminal_u, target=Derivation(pieces=[non_terminal_e, terminal_add, non_terminal_t])),
+            Production(source=non_terminal_u, target=Derivation(pieces=[non_terminal_t])),
+            Production(source=non_terminal_e, target=Derivation(pieces=[terminal_mul, non_terminal_t])),
+            Production(source=non_terminal_e, target=Derivation(pieces=[terminal_int])),
+            Production(source=non_terminal_t, target=Derivation(pieces=[non_terminal_e])),
+        ]
+        tokens = get_analyzer().parse('*1+2$')
+        lalr_parser = parser.lr.LALRParser(cfg_sys=CFGSystem(production_list, entry=non_terminal_s))
+        self.assertEqual(get_tree_str(lalr_parser.parse(tokens).entries[0]), '[[[* [[int]]] + [[int]]] $]')
+        slr_parser = parser.lr.SLRParser(cfg_sys=CFGSystem(production_list, entry=non_terminal_s))
+        with self.assertRaises(parser.errors.ParseErrorBase):
+            slr_parser.parse(tokens)
+
+
+class GLRParserTest(ut.TestCase):
+    def test_parse_ambiguous(self):
+        glr_parser = parser.lr.GLRParser(cfg_sys=get_flat_cfg(), epsilon_terminal=Terminal(name='[e]'))
+        # count of binary trees with n operators is the n-th Catalan number
+        for expr, count in [('1', 1), ('1+2', 1), ('1+2*3', 2), ('1+2*3+4', 5), ('1+2*3+4*5', 14), ('+1*+2', 2)]:
+            forest = glr_parser.parse_forest(get_analyzer().parse(expr + '$'))
+            self.assertEqual(forest.count_trees(), count)
+            self.assertEqual(forest.is_ambiguous(), count > 1)
+
+        tokens = get_analyzer().parse('1+2*3+4$')
+        parse_tree = glr_parser.parse(tokens)
+        self.assertEqual(get_leaves(parse_tree.entries[0]), [t.content for t in tokens])
+        self.assertEqual([leaf.node_content for leaf in parse_tree.leaves], tokens)
+        node_list = [parse_tree.entries[0]]
+        while len(node_list) > 0:
+            node = node_list.pop()
+            if isinstance(node.node_type, NonTerminal):
+                self.assertEqual([n.node_type for n in node.pointers], node.production.target.pieces)
+                node_list.extend(node.pointers)
+
+    def test_forest_shared(self):
+        glr_parser = parser.lr.GLRParser(cfg_sys=get_flat_cfg())
+        forest = glr_parser.parse_forest(get_analyzer().parse('+'.join(['1'] * 31) + '$'))
+        self.assertEqual(forest.count_trees(), 3814986502092304)
+        # one node per (piece, start, end)
+        nodes = forest.get_nodes()
+        self.assertEqual(len(nodes), len({(node.piece, node.start, node.end) for node in nodes}))
+        self.assertLess(len(nodes), 1000)
+
+    def test_parse_unambiguous(self):
+        tokens = get_analyzer().parse('1+2*3+4(5)$')
+        for canonical in [False, True]:
+            glr_parser = parser.lr.GLRParser(
+                cfg_sys=get_left_recursive_cfg(), epsilon_terminal=Terminal(name='[e]'), canonical=canonical,
+            )
+            forest = glr_parser.parse_forest(tokens)
+            self.assertFalse(forest.is_ambiguous())
+            self.assertEqual(
+                get_tree_str(forest.to_parse_tree().entries[0]),
+                '[[[[[[int]]] + [[[int]] * [int]]] + [[int ( [[[int]]] )]]] $]',
+            )
+
+    def test_parse_epsilon(self):
+        glr_parser = parser.lr.GLRParser(cfg_sys=get_ll_cfg(), epsilon_terminal=Terminal(name='[e]'))
+        parse_tree = glr_parser.parse(get_analyzer().parse('1*2+3$'))
+        self.assertEqual(get_tree_str(parse_tree.entries[0]), '[[[int [* [int [[e]]]]] [+ [[int [[e]]] [[e]]]]] $]')
+
+    def test_precedence(self):
+        precedence = parser.lr.PrecedenceTable([
+            (parser.lr.ASSOC_LEFT, [terminal_add]),
+            (parser.lr.ASSOC_LEFT, [terminal_mul]),
+        ])
+        glr_parser = parser.lr.GLRParser(cfg_sys=get_flat_cfg(), precedence=precedence)
+        forest = glr_parser.parse_forest(get_analyzer().parse('1+2*3+4$'))
+        self.assertEqual(forest.count_trees(), 1)
+        self.assertEqual(get_tree_str(forest.to_parse_tree().entries[0]), '[[[[int] + [[int] * [int]]] + [int]] $]')
+
+    def test_reduce_conflict(self):
+        # S = ( E + | ( T * | ) T + | ) E *, E = int, T = int. Reduce-Reduce conflict in LALR(1) table.
+        production_list = [
+            Production(source=non_terminal_s, target=Derivation(pieces=[non_terminal_u, terminal_eof])),
+        ]
+        for first, middle, last in [
+            (terminal_left_para, non_terminal_e, terminal_add),
+            (terminal_left_para, non_terminal_t, terminal_mul),
+            (terminal_right_para, non_terminal_t, terminal_add),
+            (terminal_right_para, non_terminal_e, terminal_mul),
+        ]:
+            production_list.append(Production(source=non_terminal_u, target=Derivation(pieces=[first, middle, last])))
+        production_list.append(Production(source=non_terminal_e, target=Derivation(pieces=[terminal_int])))
+        production_list.append(Production(source=non_terminal_t, target=Derivation(pieces=[terminal_int])))
+
+        glr_parser = parser.lr.GLRParser(cfg_sys=CFGSystem(production_list, entry=non_terminal_s))
+        self.assertEqual(len(glr_parser.reduce_conflicts), 1)
+        self.assertEqual(get_tree_str(glr_parser.parse(get_analyzer().parse('(1*$')).entries[0]), '[[( [int] *] $]')
+        self.assertEqual(get_tree_str(glr_parser.parse(get_analyzer().parse(')1*$')).entries[0]), '[[) [int] *] $]')
+
+        conflict = parser.lr.parser_lr.ReduceReduceConflict(glr_parser.reduce_conflicts[0][1], 'LALR')
+        self.assertIn('Reduce-Reduce', str(conflict))
+
+    def test_parse_error(self):
+        glr_parser = parser.lr.GLRParser(cfg_sys=get_flat_cfg())
+        with self.assertRaises(parser.lr.NoViableStackError):
+            glr_parser.parse(get_analyzer().parse('1+*2$'))
+        with self.assertRaises(parser.lr.NoViableStackError):
+            glr_parser.parse(get_analyzer().parse('1+2'))
+        with self.assertRaises(parser.lr.NoViableStackError):
+            glr_parser.parse(get_analyzer().parse('1+2$$'))
+
+
+class ParserCacheTest(ut.TestCase):
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self.cache = parser.ParserCache(self._temp_dir.name)
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def test_fingerprint(self):
+        self.assertEqual(get_lr_cfg().fingerprint(), get_lr_cfg().fingerprint())
+        self.assertNotEqual(get_lr_cfg().fingerprint(), get_left_recursive_cfg().fingerprint())
+        cfg_sys = get_lr_cfg()
+        self.assertNotEqual(
+            CFGSystem(list(reversed(cfg_sys.production_list)), entry=non_terminal_s).fingerprint(),
+            cfg_sys.fingerprint(),
+        )
+
+    def test_lr_cache(self):
+        tokens = get_analyzer().parse('1+2*3+4(5)$')
+        generated_parser = parser.lr.LALRParser(cfg_sys=get_left_recursive_cfg(), cache=self.cache)
+        cached_parser = parser.lr.LALRParser(cfg_sys=get_left_recursive_cfg(), cache=self.cache)
+
+        # tables are loaded without generating the automaton
+        self.assertIsNone(cached_parser._stack_automaton)
+        self.assertEqual(cached_parser.parse_table.action, generated_parser.parse_table.action)
+        self.assertEqual(cached_parser.parse_table.goto, generated_parser.parse_table.goto)
+        self.assertEqual(
+            get_tree_str(cached_parser.parse(tokens).entries[0]),
+            get_tree_str(generated_parser.parse(tokens).entries[0]),
+        )
+        self.assertEqual(len(cached_parser.stack_automaton.states), len(generated_parser.parse_table.action))
+
+        # different parser type and options are cached separately
+        file_count = len(list(Path(self._temp_dir.name).iterdir()))
+        self.assertIsNotNone(parser.lr.CLRParser(cfg_sys=get_left_recursive_cfg(), cache=self.cache)._stack_automaton)
+        self.assertIsNotNone(parser.lr.LALRParser(
+            cfg_sys=get_left_recursive_cfg(), skip_unit_productions=True, cache=self.cache)._stack_automaton)
+        self.assertEqual(len(list(Path(self._temp_dir.name).iterdir())), file_count + 2)
+
+    def test_lr_cache_precedence(self):
+        precedence = parser.lr.PrecedenceTable([(parser.lr.ASSOC_LEFT, ['+']), (parser.lr.ASSOC_LEFT, ['*'])])
+        parser.lr.CLRParser(cfg_sys=get_flat_cfg(), precedence=precedence, cache=self.cache)
+        self.assertIsNone(
+            parser.lr.CLRParser(cfg_sys=get_flat_cfg(), precedence=precedence, cache=self.cache)._stack_automaton)
+
+        precedence = parser.lr.PrecedenceTable([(parser.lr.ASSOC_RIGHT, ['+']), (parser.lr.ASSOC_LEFT, ['*'])])
+        lr_parser = parser.lr.CLRParser(cfg_sys=get_flat_cfg(), precedence=precedence, cache=self.cache)
+        self.assertIsNotNone(lr_parser._stack_automaton)
+        self.assertEqual(get_tree_str(lr_parser.parse(get_analyzer().parse('1+2+3$')).entries[0]),
+                         '[[[int] + [[int] + [int]]] $]')
+
+    def test_glr_cache(self):
+        lalr_parser = parser.lr.GLRParser(cfg_sys=get_lr_cfg(), cache=self.cache)
+        canonical_parser = parser.lr.GLRParser(cfg_sys=get_lr_cfg(), canonical=True, cache=self.cache)
+        self.assertIsNotNone(canonical_parser._stack_automaton)
+        self.assertLess(len(lalr_parser.parse_table.action), len(canonical_parser.parse_table.action))
+        self.assertEqual(len(canonical_parser.parse_table.action), len(canonical_parser.stack_automaton.states))
+
+        cached_parser = parser.lr.GLRParser(cfg_sys=get_lr_cfg(), canonical=True, cache=self.cache)
+        self.assertIsNone(cached_parser._stack_automaton)
+        self.assertEqual(len(cached_parser.parse_table.action), len(cached_parser.stack_automaton.states))
+
+    def test_invalid_file(self):
+        generated_parser = parser.lr.CLRParser(cfg_sys=get_lr_cfg(), cache=self.cache)
+        key = self.cache.make_key(get_lr_cfg(), 'lr_table', generated_parser._get_cache_params())
+        cache_path = self.cache.get_path(key)
+        raw = cache_path.read_bytes()
+
+        # corrupted body, truncated file, and file of other format version are all ignored
+        for invalid_raw in (raw[:-1] + bytes([raw[-1] ^ 1]), raw[:20], raw[:4] + b'\xff\xff' + raw[6:]):
+            cache_path.write_bytes(invalid_raw)
+            self.assertIsNone(self.cache.load(get_lr_cfg(), 'lr_table', generated_parser._get_cache_params()))
+            lr_parser = parser.lr.CLRParser(cfg_sys=get_lr_cfg(), cache=self.cache)
+            self.assertIsNotNone(lr_parser._stack_automaton)
+            # the valid tables are stored again
+            self.assertEqual(cache_path.read_bytes(), raw)
+
+        # tables inconsistent with the CFG are rejected
+        data = generated_parser.parse_table.dump()
+        data['action'][0][1] = len(data['action']) + 1
+        with self.assertRaises(ValueError):
+            parser.lr.LRParseTable.load(get_lr_cfg(), data)
+
+    def test_ll_cache(self):
+        tokens = get_analyzer().parse('5*(1+2*3)+4$')
+        generated_parser = parser.ll.LLParser(cfg_system=get_ll_cfg(), cache=self.cache)
+        cached_parser = parser.ll.LLParser(cfg_system=get_ll_cfg(), cache=self.cache)
+        self.assertEqual(cached_parser.parse_table.parse_dict, generated_parser.parse_table.parse_dict)
+        self.assertEqual(
+            get_tree_str(cached_parser.parse_token(tokens).entries[0]),
+            get_tree_str(generated_parser.parse_token(tokens).entries[0]),
+        )
+
+    def test_analysis(self):
+        cfg_sys = get_ll_cfg()
+        self.assertFalse(self.cache.load_analysis(cfg_sys))
+        self.cache.store_analysis(cfg_sys)
+
+        cached_cfg = get_ll_cfg()
+        self.assertTrue(self.cache.load_analysis(cached_cfg))
+        self.assertEqual(cached_cfg.first_sets, cfg_sys.first_sets)
+        self.assertEqual(cached_cfg.follow_sets, cfg_sys.follow_sets)
+        self.assertEqual(cached_cfg.nullable_set, cfg_sys.nullable_set)
+        self.assertFalse(self.cache.load_analysis(get_lr_cfg()))
+
+    def test_analysis_not_generated(self):
+        tokens = get_analyzer().parse('1+2*3+4(5)$')
+        parser.lr.LALRParser(cfg_sys=get_left_recursive_cfg(), cache=self.cache)
+        parser.ll.LLParser(cfg_system=get_ll_cfg(), cache=self.cache)
+
+        with (mock.patch.object(CFGSystem, 'generate_first_set', side_effect=AssertionError) as first_mock,
+              mock.patch.object(CFGSystem, 'generate_follow_set', side_effect=AssertionError) as follow_mock):
+            lr_parser = parser.lr.LALRParser(cfg_sys=get_left_recursive_cfg(), cache=self.cache)
+            lr_parser.parse(tokens)
+            self.assertGreater(len(lr_parser.stack_automaton.states), 0)
+            self.assertGreater(len(lr_parser.cfg_sys.follow_sets), 0)
+            parser.ll.LLParser(cfg_system=get_ll_cfg(), cache=self.cache).parse_token(get_analyzer().parse('1+2$'))
+        first_mock.assert_not_called()
+        follow_mock.assert_not_called()
+
+
+@ut.skipIf(parser.cyk.parser_cyk.np is None, 'CYKParser requires numpy')
+class CYKParserTest(ut.TestCase):
+    def setUp(self):
+        # E = E + E | E * E | ( E ) | int, ambiguous
+        self.cfg_sys = CFGSystem(production_list=[
+            Production(source=non_terminal_e, target=Derivation(pieces=[non_terminal_e, terminal_add, non_terminal_e])),
+            Production(source=non_terminal_e, target=Derivation(pieces=[non_terminal_e, terminal_mul, non_terminal_e])),
+            Production(source=non_terminal_e,
+                       target=Derivation(pieces=[terminal_left_para, non_terminal_e, terminal_right_para])),
+            Production(source=non_terminal_e, target=Derivation(pieces=[terminal_int])),
+        ], entry=non_terminal_e)
+        self.cyk_parser = parser.cyk.CYKParser(cfg_system=self.cfg_sys, epsilon_terminal=Terminal(name='[e]'))
+
+    def test_parse_ambiguous(self):
+        tokens = get_analyzer().parse('5*(1+2*3)+4')
+        parse_tree = self.cyk_parser.parse(tokens)
+        self.assertEqual(parse_tree.entries[0].node_type, non_terminal_e)
+        self.assertEqual(get_leaves(parse_tree.entries[0]), [t.content for t in tokens])
+
+        # only productions of the original CFG in the restored tree
+        node_list = [parse_tree.entries[0]]
+        while len(node_list) > 0:
+            node = node_list.pop()
+            if isinstance(node.node_type, NonTerminal):
+                self.assertIn(node.production, self.cfg_sys.production_list)
+                self.assertEqual([n.node_type for n in node.pointers], node.production.target.pieces)
+                node_list.extend(node.pointers)
+
+    def test_recognize(self):
+        self.assertTrue(self.cyk_parser.recognize(get_analyzer().parse('(1)*2')))
+        self.assertFalse(self.cyk_parser.recognize(get_analyzer().parse('(1)*')))
+        self.assertFalse(self.cyk_parser.recognize([]))
+        with self.assertRaises(parser.cyk.NotRecognizedError):
+            self.cyk_parser.parse(get_analyzer().parse('1+(2'))
+
+    def test_nullable_entry(self):
+        # S = ( S ) S | epsilon
+        cyk_parser = parser.cyk.CYKParser(cfg_system=CFGSystem(production_list=[
+            Production(source=non_terminal_s, target=Derivation(
+                pieces=[terminal_left_para, non_terminal_s, terminal_right_para, non_terminal_s])),
+            Production(source=non_terminal_s, target=Derivation(pieces=None)),
+        ], entry=non_terminal_s), epsilon_terminal=Terminal(name='[e]'))
+        self.assertTrue(cyk_parser.recognize([]))
+        parse_tree = cyk_parser.parse(get_analyzer().parse('(()())()'))
+        self.assertEqual(get_tree_str(parse_tree.entries[0]), '[( [( [[e]] ) [( [[e]] ) [[e]]]] ) [( [[e]] ) [[e]]]]')
+
+
+if __name__ == '__main__':
+    ut.main()